@@ -0,0 +1,177 @@
+import io
+import os
+import gzip
+import queue
+import calendar
+import zipfile
+import threading
+
+# === SETTINGS ===
+# Inputs can stay compressed: events/events_England.json.gz or .zst, or
+# events.zip / data.zip as downloaded, instead of the extracted folders.
+# A zip member is addressed as "<archive>::<member>", e.g.
+# "./events.zip::events_England.json".
+MEMBER_SEP = "::"
+COMPRESSED_SUFFIXES = (".gz", ".zst")
+PREFETCH_BYTES = 1 << 20  # Decompressed bytes per block handed to the parser
+PREFETCH_BLOCKS = 4  # Blocks decompressed ahead of the parser
+
+def split_member(path):
+    """(archive, member) of an archive member path, or (path, None)."""
+    if MEMBER_SEP in path:
+        archive, member = path.split(MEMBER_SEP, 1)
+        return archive, member
+    return path, None
+
+def name(path):
+    """File name of path without folders or a .gz/.zst suffix, e.g. events_England.json."""
+    base = os.path.basename(split_member(path)[1] or path)
+    for suffix in COMPRESSED_SUFFIXES:
+        if base.endswith(suffix):
+            return base[:-len(suffix)]
+    return base
+
+def folder_archive(folder):
+    # ./events -> ./events.zip, ./data -> ./data.zip
+    return os.path.normpath(folder) + ".zip"
+
+def zip_members(archive, keep):
+    """Members of a zip archive whose file name passes keep(), as member paths, in archive order."""
+    with zipfile.ZipFile(archive) as z:
+        return [f"{archive}{MEMBER_SEP}{info.filename}" for info in z.infolist()
+                if not info.is_dir() and keep(name(info.filename))]
+
+def list_files(folder, keep):
+    """Files in folder whose name passes keep(), falling back to <folder>.zip.
+
+    Plain, .gz and .zst files in the folder are listed (in directory order);
+    a name present there is not looked up in the archive again.
+    """
+    found, names = [], set()
+    if os.path.isdir(folder):
+        for f in os.listdir(folder):
+            if keep(name(f)) and name(f) not in names:
+                found.append(os.path.join(folder, f))
+                names.add(name(f))
+    archive = folder_archive(folder)
+    if os.path.exists(archive):
+        found += [m for m in zip_members(archive, keep) if name(m) not in names]
+    return found
+
+def resolve(path):
+    """Where path's data is: path itself, path.gz / path.zst, or a member of <folder>.zip."""
+    if MEMBER_SEP in path or os.path.exists(path):
+        return path
+    for suffix in COMPRESSED_SUFFIXES:
+        if os.path.exists(path + suffix):
+            return path + suffix
+    archive = folder_archive(os.path.dirname(path) or ".")
+    if os.path.exists(archive):
+        members = zip_members(archive, lambda f: f == os.path.basename(path))
+        if members:
+            return members[0]
+    raise FileNotFoundError(f"{path} not found (nor compressed, nor in {archive})")
+
+def signature(path):
+    """Name, size and mtime of path's data, to tell when it changed."""
+    path = resolve(path)
+    archive, member = split_member(path)
+    if member is not None:
+        with zipfile.ZipFile(archive) as z:
+            info = z.getinfo(member)
+        # The archive's mtime changes with any member, so a member goes by its own CRC and timestamp
+        return {"name": name(path), "size": [info.file_size, info.CRC],
+                "mtime_ns": calendar.timegm(info.date_time) * 1_000_000_000}
+    st = os.stat(path)
+    return {"name": name(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def open_binary(path):
+    """Decompressed byte stream of path, read as it is decompressed."""
+    path = resolve(path)
+    archive, member = split_member(path)
+    if member is not None:
+        z = zipfile.ZipFile(archive)
+        try:
+            f = z.open(member)
+        finally:
+            # The open member keeps its own handle on the archive
+            z.close()
+        return f
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(f"Reading {path} needs the zstandard package (pip install zstandard)") from None
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+class PrefetchReader(io.RawIOBase):
+    """Read a stream in a background thread, PREFETCH_BLOCKS blocks ahead.
+
+    zlib and zstd release the GIL while they decompress, so the next
+    blocks are decompressed while the caller parses the current one.
+    """
+
+    def __init__(self, raw, block_bytes=PREFETCH_BYTES, blocks=PREFETCH_BLOCKS):
+        self.raw = raw
+        self.block_bytes = block_bytes
+        self.blocks = queue.Queue(blocks)
+        self.block = memoryview(b"")
+        self.eof = False
+        self.stopping = False
+        self.thread = threading.Thread(target=self._fill, daemon=True)
+        self.thread.start()
+
+    def _put(self, item):
+        while not self.stopping:
+            try:
+                self.blocks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _fill(self):
+        try:
+            while True:
+                block = self.raw.read(self.block_bytes)
+                if not self._put(block) or not block:
+                    return
+        except Exception as exc:
+            self._put(exc)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.block:
+            if self.eof:
+                return 0
+            item = self.blocks.get()
+            if isinstance(item, Exception):
+                raise item
+            if not item:
+                self.eof = True
+                return 0
+            self.block = memoryview(item)
+        n = min(len(b), len(self.block))
+        b[:n] = self.block[:n]
+        self.block = self.block[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.stopping = True
+            self.thread.join()
+            self.raw.close()
+        super().close()
+
+def open_text(path, encoding="utf-8"):
+    """Text stream of path; compressed data is decompressed ahead of the reader."""
+    path = resolve(path)
+    if MEMBER_SEP not in path and not path.endswith(COMPRESSED_SUFFIXES):
+        return open(path, encoding=encoding)
+    raw = io.BufferedReader(PrefetchReader(open_binary(path)), PREFETCH_BYTES)
+    return io.TextIOWrapper(raw, encoding=encoding)
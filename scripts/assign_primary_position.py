@@ -1,11 +1,12 @@
+import numpy as np
 import pandas as pd
-from math import dist
+import argparse
+import instrumentation
 import os
-import codecs
-import json
-import re
+import player_table
 
 # File paths
+EVENTS_DIR = "./events"
 POSITIONS_FILE = "./positions/player_positions.csv"
 PLAYERS_FILE = "./data/players.json"
 OUTPUT_FILE = "./positions/player_primary_positions.csv"
@@ -46,108 +47,107 @@ CATEGORY_TO_ROLES = {
     "fw": {"st", "rw", "lw"},
 }
 
-ROLE_MAP = {
-    "GK": "gk", "GKP": "gk",
-    "DF": "df", "DEF": "df",
-    "MD": "md", "MID": "md",
-    "FW": "fw", "FWD": "fw"
-}
-
-def clean_name(name):
-    if not isinstance(name, str):
-        return ""
-    if "\\u" in name:
-        try:
-            name = codecs.decode(name, "unicode_escape")
-        except:
-            pass
-    name = re.sub(r'[\uE000-\uF8FF\u200B-\u200F\u2060-\u206F]', '', name)
-    return name.strip()
-
-# Load player info
-with open(PLAYERS_FILE, "r", encoding="utf-8") as f:
-    players_raw = json.load(f)
-
-player_id_to_type = {}
-player_id_to_name = {}
-
-for p in players_raw:
-    pid = p["wyId"]
-    name = p.get("shortName") or f'{p.get("firstName", "")} {p.get("lastName", "")}'.strip()
-    if "\\u" in name:
-        try:
-            name = codecs.decode(name, "unicode_escape")
-        except:
-            pass
-    name = re.sub(r'[\uE000-\uF8FF\u200B-\u200F\u2060-\u206F]', '', name).strip()
-    player_id_to_name[pid] = name
-
-    role_obj = p.get("role", {})
-    raw_code = role_obj.get("code3") or role_obj.get("code2") or ""
-    player_id_to_type[pid] = ROLE_MAP.get(raw_code.upper(), "unknown")
-
-# Load position data
-df = pd.read_csv(POSITIONS_FILE, encoding="utf-8")
-
-records = []
-
-for player_id, group in df.groupby("playerId"):
-    name = clean_name(group["name"].iloc[0])
-    total = group["count"].sum()
-    if total == 0:
-        continue
-
-    sum_x = sum_y = 0
-    for _, row in group.iterrows():
-        role = row["role"]
-        count = row["count"]
-        if role not in ROLE_CENTERS:
-            continue
-        x, y = ROLE_CENTERS[role]
-        sum_x += x * count
-        sum_y += y * count
-
-    centroid = (sum_x / total, sum_y / total)
-
-    # Raw best-fit (regardless of role category)
-    raw_best_fit = min(ROLE_CENTERS.items(), key=lambda item: dist(centroid, item[1]))[0]
-
-    # Category-based best-fit
-    category = player_id_to_type.get(player_id, "unknown")
-    allowed_roles = CATEGORY_TO_ROLES.get(category, ROLE_CENTERS.keys())
-
-    if raw_best_fit in allowed_roles:
-        best_fit = raw_best_fit
-    else:
-        # ✅ Reverted: compare centroid directly with allowed role centroids
-        best_fit = min(
-            ((role, ROLE_CENTERS[role]) for role in allowed_roles if role in ROLE_CENTERS),
-            key=lambda item: dist(centroid, item[1])
-        )[0]
-
-    records.append({
-        "playerId": player_id,
-        "name": name,
-        "category": category,
-        "best_fit_role": best_fit,
-        "raw_best_fit_role": raw_best_fit
+def load_role_counts(positions_file=POSITIONS_FILE):
+    """(playerIds, names, roles, counts) rows of a player_positions.csv."""
+    df = pd.read_csv(positions_file, encoding="utf-8")
+    return df["playerId"].to_numpy(), df["name"].tolist(), df["role"].to_numpy(dtype=object), df["count"].to_numpy()
+
+def best_fit_roles(player_ids, names, roles, counts, player_id_to_type):
+    """One record per player from long (player, role, count) rows.
+
+    The rows are folded into a player x role count matrix; centroids and
+    best-fit roles for all players are then computed as array operations.
+    Players come out sorted by playerId.
+    """
+    ids, first_row, player_index = np.unique(player_ids, return_index=True, return_inverse=True)
+    role_labels, role_index = np.unique(np.asarray(roles, dtype=object).astype(str), return_inverse=True)
+    matrix = np.zeros((len(ids), len(role_labels)), dtype=np.int64)
+    np.add.at(matrix, (player_index, role_index), np.asarray(counts, dtype=np.int64))
+
+    # Count-weighted centroid; counts of roles without a center only add to the total
+    role_names = list(ROLE_CENTERS)
+    centers = np.array([ROLE_CENTERS[r] for r in role_names])
+    label_centers = np.array([ROLE_CENTERS.get(r, (0, 0)) for r in role_labels], dtype=np.int64).reshape(-1, 2)
+    totals = matrix.sum(axis=1)
+    has_counts = totals > 0
+    matrix, totals, ids, first_row = matrix[has_counts], totals[has_counts], ids[has_counts], first_row[has_counts]
+    centroid_x = (matrix @ label_centers[:, 0]) / totals
+    centroid_y = (matrix @ label_centers[:, 1]) / totals
+
+    # Distance to every role center; argmin keeps the first of equally close roles
+    distances = np.hypot(centroid_x[:, None] - centers[:, 0], centroid_y[:, None] - centers[:, 1])
+    raw_best_fit = distances.argmin(axis=1)
+
+    # Category-based best-fit: nearest center among the roles allowed for the category
+    categories = [player_id_to_type.get(pid, "unknown") for pid in ids.tolist()]
+    allowed = np.array([
+        [role in CATEGORY_TO_ROLES.get(category, ROLE_CENTERS) for role in role_names]
+        for category in categories
+    ], dtype=bool).reshape(len(ids), len(role_names))
+    best_fit = np.where(allowed, distances, np.inf).argmin(axis=1)
+
+    role_names = np.array(role_names, dtype=object)
+    return pd.DataFrame({
+        "playerId": ids,
+        "name": [names[i] for i in first_row.tolist()],
+        "category": categories,
+        "best_fit_role": role_names[best_fit],
+        "raw_best_fit_role": role_names[raw_best_fit],
     })
 
-# Save final assignments
-out_df = pd.DataFrame(records)
-out_df = out_df.sort_values(by="name")
-os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-out_df.to_csv(OUTPUT_FILE, index=False, encoding="utf-8")
-
-# Diagnostic summary
-total = len(out_df)
-unknown_count = sum(out_df["category"] == "unknown")
-percent = round(100 * unknown_count / total, 2)
-print(f"Saved player primary positions to {OUTPUT_FILE}")
-print(f"{unknown_count}/{total} players ({percent}%) had unknown role categories.")
-
-# Print count of players per best_fit_role
-print("\nBest-fit role distribution:")
-role_counts = out_df["best_fit_role"].value_counts().sort_index()
-for role, count in role_counts.items():
-    print(f"{role:4s}: {count}")
+def assign_primary_positions(players, positions_file=POSITIONS_FILE, output_file=OUTPUT_FILE, positions=None):
+    """Write player_primary_positions.csv.
+
+    Role counts are read from positions_file, or taken straight from a
+    scanned player_positions.PositionsAccumulator when one is given, so the
+    long positions CSV is not needed.
+    """
+    player_id_to_type = {pid: category.lower() for pid, category in player_table.role_map(players).items()}
+
+    if positions is not None:
+        player_ids, roles, counts = positions.role_counts()
+        names = [positions.player_id_to_name.get(pid, f"Unknown ({pid})") for pid in player_ids.tolist()]
+    else:
+        player_ids, names, roles, counts = load_role_counts(positions_file)
+
+    out_df = best_fit_roles(player_ids, names, roles, counts, player_id_to_type)
+
+    # Save final assignments
+    out_df = out_df.sort_values(by="name")
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    out_df.to_csv(output_file, index=False, encoding="utf-8")
+
+    # Diagnostic summary
+    total = len(out_df)
+    unknown_count = sum(out_df["category"] == "unknown")
+    percent = round(100 * unknown_count / total, 2)
+    print(f"Saved player primary positions to {output_file}")
+    print(f"{unknown_count}/{total} players ({percent}%) had unknown role categories.")
+
+    # Print count of players per best_fit_role
+    print("\nBest-fit role distribution:")
+    role_counts = out_df["best_fit_role"].value_counts().sort_index()
+    for role, count in role_counts.items():
+        print(f"{role:4s}: {count}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Assign every player a primary position.")
+    parser.add_argument("--from-events", action="store_true",
+                        help="count roles from the events directly instead of reading player_positions.csv")
+    args = parser.parse_args()
+
+    # Load player info
+    players = player_table.load_players(PLAYERS_FILE)
+
+    positions = None
+    if args.from_events:
+        import event_scan
+        from player_positions import PositionsAccumulator
+        positions = PositionsAccumulator(players)
+        event_scan.scan_events([positions], EVENTS_DIR)
+
+    with instrumentation.stage("assign"):
+        assign_primary_positions(players, positions=positions)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import instrumentation
+
+# === SETTINGS ===
+DATA_DIR = "./"
+EVENTS_DIR = os.path.join(DATA_DIR, "events")
+DATA_FILES = [os.path.join(DATA_DIR, "data/players.json"), os.path.join(DATA_DIR, "data/teams.json")]
+WORKSPACE_DIR = os.path.join(DATA_DIR, "cache/benchmark")  # Fixed-size copy of the inputs the stages run on
+RESULTS_DIR = os.path.join(DATA_DIR, "benchmarks")  # One <label>.json per run, compared across commits
+
+BENCH_EVENTS = 50000  # Events in the fixed-size input, taken in file order from events/
+BENCH_PLAYERS = 3000  # Rows in the normalization stage's component matrices
+NORMALIZATION_ROUNDS = 100  # Times the normalization stage rates them
+BENCH_REPEATS = 3  # Each job runs this many times in a fresh process; the fastest run counts
+REGRESSION_THRESHOLD = 0.10  # Flag a stage 10% slower (or 10% more memory) than the baseline
+MIN_COMPARED_SECONDS = 0.05  # Stages faster than this are too noisy to flag on time
+
+# Rating modules benchmarked, as (module, accumulator class) in run_ratings order
+RATING_MODULES = [
+    ("passing_rating", "PassingAccumulator"),
+    ("long_passing_rating", "LongPassingAccumulator"),
+    ("crossing_rating", "CrossingAccumulator"),
+    ("tackling_rating", "TacklingAccumulator"),
+    ("creativity_rating", "CreativityAccumulator"),
+    ("pace_rating", "PaceAccumulator"),
+]
+
+# === FIXED-SIZE INPUT ===
+def build_workspace(n_events=BENCH_EVENTS, workspace=WORKSPACE_DIR):
+    """Copy the first n_events events (files in name order) and the data files into workspace.
+
+    Every stage runs inside the workspace, so runs on different commits
+    read the same events.
+    """
+    import archives
+    import event_scan
+    event_files = sorted(event_scan.list_event_files(EVENTS_DIR), key=archives.name)
+    events = []
+    for path in event_files:
+        for e in event_scan.iter_file_events(path):
+            events.append(e)
+            if len(events) == n_events:
+                break
+        if len(events) == n_events:
+            break
+    if len(events) < n_events:
+        raise ValueError(f"Only {len(events)} events in {EVENTS_DIR}, {n_events} needed (see --events)")
+
+    shutil.rmtree(workspace, ignore_errors=True)
+    for folder in ("events", "data", "ratings", "positions"):
+        os.makedirs(os.path.join(workspace, folder))
+    with open(os.path.join(workspace, "events/events_Benchmark.json"), "w", encoding="utf-8") as f:
+        json.dump(events, f)
+    for path in DATA_FILES:
+        with archives.open_binary(path) as src, open(os.path.join(workspace, "data", os.path.basename(path)), "wb") as dst:
+            shutil.copyfileobj(src, dst)
+    return [archives.name(p) for p in event_files]
+
+def load_events():
+    import event_scan
+    return list(event_scan.iter_file_events("./events/events_Benchmark.json"))
+
+# === JOBS ===
+# A job runs in its own fresh process and returns one (stage, items, seconds,
+# peak RSS) record per stage it times. Untimed setup (such as reading the
+# events to feed an accumulator) counts towards the peak RSS but not the time.
+
+class Stages:
+    def __init__(self):
+        self.records = []
+
+    def timed(self, stage, work, items=None):
+        """Time work(); it returns the number of items handled unless items is given."""
+        start = time.perf_counter()
+        result = work()
+        seconds = time.perf_counter() - start
+        self.records.append((stage, result if items is None else items, seconds, instrumentation.peak_rss_mb()))
+
+def job_players(stages):
+    import archives
+    import event_scan
+    import player_table
+    with archives.open_text(event_scan.PLAYERS_FILE) as f:
+        players_raw = json.load(f)
+    stages.timed("players_compile", lambda: len(player_table.build_table(players_raw)["wy_id"]))
+    event_scan.load_players()  # Compiled once; scripts then load the cached table
+    player_table._loaded.clear()
+    stages.timed("players_load", lambda: len(event_scan.load_players()["wy_id"]))
+
+def job_parse(stages):
+    stages.timed("events_parse", lambda: len(load_events()))
+
+def feed(accumulator, events):
+    add = accumulator.add
+    for e in events:
+        add(e)
+    return len(events)
+
+def job_positions(stages):
+    import event_scan
+    from player_positions import PositionsAccumulator
+    from assign_primary_position import assign_primary_positions
+    players = event_scan.load_players()
+    events = load_events()
+    acc = PositionsAccumulator(players)
+    stages.timed("accumulate_positions", lambda: feed(acc, events))
+    events.clear()
+    n_players = len(acc.player_codes)
+    stages.timed("write_positions", acc.write, n_players)
+    stages.timed("positions_assign", lambda: assign_primary_positions(players, positions=acc), n_players)
+
+def job_rating(stages, module_name, class_name):
+    import importlib
+    import event_scan
+    module = importlib.import_module(module_name)
+    players = event_scan.load_players()
+    primary_position = event_scan.load_primary_positions()
+    events = load_events()
+    acc = getattr(module, class_name)(players)
+    name = module_name[:-len("_rating")]
+    stages.timed(f"accumulate_{name}", lambda: feed(acc, events))
+    events.clear()
+    stages.timed(f"write_{name}", lambda: acc.write(primary_position), len(acc.stats))
+
+def job_normalization(stages):
+    import normalization
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(BENCH_PLAYERS, 7))
+    games = rng.integers(1, 38, size=BENCH_PLAYERS)
+    roles = rng.choice(["GK", "DF", "MD", "FW"], size=BENCH_PLAYERS)
+
+    def work():
+        # One round takes about a millisecond, too little to time reliably
+        for _ in range(NORMALIZATION_ROUNDS):
+            scores = normalization.weighted_zscore_score(values, np.ones(7), games, 5)
+            normalization.scale(scores, 80, 10)
+            z = normalization.role_blended_zscores(values[:, 0], roles, 0.3)
+            normalization.bayesian_shrink(normalization.scale(z, 65, 10), games, 5, 65)
+        return BENCH_PLAYERS * NORMALIZATION_ROUNDS
+    stages.timed("normalization", work)
+
+def job_figures(stages):
+    import event_reader
+    import event_store
+    import player_event_plotter
+    columns, meta = event_reader.open_indexed_store("./events")
+    # The player with the most events (playerId 0 holds events without a player)
+    counts = np.diff(columns["player_index_offsets"])
+    counts[columns["player_index_ids"] == 0] = 0
+    player_id = int(columns["player_index_ids"][np.argmax(counts)])
+    events = player_event_plotter.store_player_events(columns, meta, event_store.player_rows(columns, player_id))
+    event_groups = player_event_plotter.group_events(events)
+    tasks = player_event_plotter.event_figure_tasks("benchmark", event_groups)
+    tasks += player_event_plotter.summary_plot_tasks("benchmark", event_groups)
+    player_event_plotter._use_agg()
+    stages.timed("figures_render", lambda: player_event_plotter.render_figures(tasks, workers=1, force=True), len(events))
+
+def list_jobs():
+    # Positions run first: the rating jobs read the primary positions they write
+    jobs = [(job_players, ()), (job_parse, ()), (job_positions, ())]
+    jobs += [(job_rating, rating) for rating in RATING_MODULES]
+    jobs += [(job_normalization, ()), (job_figures, ())]
+    return jobs
+
+def _run_job(job, args, workspace):
+    os.chdir(workspace)
+    stages = Stages()
+    # Stages print their usual progress; keep the benchmark output readable
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            job(stages, *args)
+        finally:
+            sys.stdout = stdout
+    return stages.records
+
+def run_benchmarks(workspace=WORKSPACE_DIR, repeats=BENCH_REPEATS):
+    """Run every job `repeats` times; per stage keep the fastest time and the largest peak RSS."""
+    workspace = os.path.abspath(workspace)
+    results = {}
+    # spawn, so every job starts from a fresh interpreter and its peak RSS is its own
+    context = multiprocessing.get_context("spawn")
+    for job, args in list_jobs():
+        for _ in range(repeats):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                records = pool.submit(_run_job, job, args, workspace).result()
+            for stage, items, seconds, rss in records:
+                best = results.setdefault(stage, {"items": items, "seconds": seconds, "peak_rss_mb": rss})
+                best["seconds"] = min(best["seconds"], seconds)
+                best["peak_rss_mb"] = max(best["peak_rss_mb"], rss)
+        print(f"  {job.__name__[len('job_'):]}{'/' + args[0] if args else ''} done")
+    for r in results.values():
+        r["items_per_sec"] = r["items"] / r["seconds"] if r["seconds"] > 0 else 0.0
+    return results
+
+# === RESULTS ===
+def default_label():
+    try:
+        label = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        label = ""
+    return label or time.strftime("%Y%m%d-%H%M%S")
+
+def save_results(label, run, results_dir=RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"{label}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=1)
+    return path
+
+def load_results(label, results_dir=RESULTS_DIR):
+    with open(os.path.join(results_dir, f"{label}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+def latest_label(exclude, results_dir=RESULTS_DIR):
+    """Label of the most recently saved run other than exclude, or None."""
+    if not os.path.isdir(results_dir):
+        return None
+    runs = [f for f in os.listdir(results_dir) if f.endswith(".json") and f[:-len(".json")] != exclude]
+    if not runs:
+        return None
+    return max(runs, key=lambda f: os.path.getmtime(os.path.join(results_dir, f)))[:-len(".json")]
+
+def find_regressions(run, baseline, threshold=REGRESSION_THRESHOLD):
+    """[(stage, metric, baseline value, new value)] for every stage over the threshold."""
+    regressions = []
+    for stage, new in run["stages"].items():
+        old = baseline["stages"].get(stage)
+        if old is None:
+            continue
+        if max(old["seconds"], new["seconds"]) >= MIN_COMPARED_SECONDS and new["seconds"] > old["seconds"] * (1 + threshold):
+            regressions.append((stage, "seconds", old["seconds"], new["seconds"]))
+        if new["peak_rss_mb"] > old["peak_rss_mb"] * (1 + threshold):
+            regressions.append((stage, "peak_rss_mb", old["peak_rss_mb"], new["peak_rss_mb"]))
+    return regressions
+
+def print_table(run, baseline=None):
+    print(f"{'stage':<26}{'items':>9}{'seconds':>10}{'items/s':>12}{'peak MB':>9}{'vs base':>9}")
+    for stage, r in run["stages"].items():
+        delta = ""
+        old = (baseline or {}).get("stages", {}).get(stage)
+        if old and old["seconds"] > 0:
+            delta = f"{r['seconds'] / old['seconds'] - 1:+.0%}"
+        print(f"{stage:<26}{r['items']:>9}{r['seconds']:>10.3f}{r['items_per_sec']:>12.0f}{r['peak_rss_mb']:>9.0f}{delta:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Time every pipeline stage on a fixed-size event input.")
+    parser.add_argument("--events", type=int, default=BENCH_EVENTS, help=f"events in the benchmark input (default: {BENCH_EVENTS})")
+    parser.add_argument("--repeats", type=int, default=BENCH_REPEATS, help=f"runs per stage, fastest counts (default: {BENCH_REPEATS})")
+    parser.add_argument("--label", help="name the results are saved under (default: git describe)")
+    parser.add_argument("--baseline", help="saved run to compare against (default: the latest other run)")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help=f"relative slowdown or memory growth flagged as a regression (default: {REGRESSION_THRESHOLD})")
+    args = parser.parse_args()
+
+    label = args.label or default_label()
+    print(f"Preparing a {args.events}-event input in {WORKSPACE_DIR} ...")
+    source_files = build_workspace(args.events)
+
+    print(f"Running benchmarks ({args.repeats} runs per stage)...")
+    run = {
+        "label": label,
+        "events": args.events,
+        "source_files": source_files,
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "stages": run_benchmarks(repeats=args.repeats),
+    }
+
+    baseline_label = args.baseline or latest_label(label)
+    baseline = None
+    if baseline_label is not None:
+        baseline = load_results(baseline_label)
+        if (baseline["events"], baseline["source_files"]) != (run["events"], run["source_files"]):
+            print(f"Baseline '{baseline_label}' ran on a different input; not comparing.")
+            baseline = None
+
+    print()
+    print_table(run, baseline)
+    print(f"\nSaved results to {save_results(label, run)}")
+
+    if baseline is not None:
+        regressions = find_regressions(run, baseline, args.threshold)
+        for stage, metric, old, new in regressions:
+            print(f"REGRESSION {stage}: {metric} {old:.3f} -> {new:.3f} ({new / old - 1:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against '{baseline_label}' (threshold {args.threshold:.0%}).")
+
+if __name__ == "__main__":
+    main()
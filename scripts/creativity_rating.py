@@ -1,10 +1,13 @@
 import os
-import json
 import math
-import codecs
-import pandas as pd
-from collections import defaultdict
+import event_scan
+import player_table
+import instrumentation
+import normalization
+import wyscout_tags
+import numpy as np
 from statistics import mean, stdev
+from player_stats import PlayerStats
 
 # === SETTINGS ===
 DATA_DIR = "./"
@@ -51,6 +54,17 @@ DUEL_EVENTS = {
     "Air duel",
 }
 
+# === TAG BITMASKS ===
+SUCCESS_BIT = wyscout_tags.bit(SUCCESS_TAG_ID)
+THROUGH_BIT = wyscout_tags.bit(901)
+GOAL_BIT = wyscout_tags.bit(GOAL_TAG)
+ASSIST_BIT = wyscout_tags.bit(ASSIST_TAG)
+KEY_PASS_BIT = wyscout_tags.bit(KEY_PASS_TAG)
+COUNTERATTACK_BIT = wyscout_tags.bit(COUNTERATTACK_TAG)
+OPPORTUNITY_BIT = wyscout_tags.bit(OPPORTUNITY_TAG)
+FEINT_BIT = wyscout_tags.bit(FEINT_TAG)
+ANTICIPATED_BIT = wyscout_tags.bit(ANTICIPATED_TAG)
+
 # === UTILS ===
 def smooth_ratio(success, total, prior_mean=0.4, prior_weight=20):
     return (success + prior_mean * prior_weight) / (total + prior_weight)
@@ -67,219 +81,227 @@ def csv_escape(s):
     s = str(s)
     return f'"{s.replace("\"", "\"\"")}"' if "," in s or '"' in s else s
 
-# === Load Players ===
-print("Loading players...")
-with open(PLAYERS_FILE, encoding="utf-8") as f:
-    players_raw = json.load(f)
-
-players = {}
-for p in players_raw:
-    pid = p["wyId"]
-    name = p.get("shortName") or f'{p.get("firstName", "")} {p.get("lastName", "")}'
-    if "\\u" in name:
-        try:
-            name = codecs.decode(name, "unicode_escape")
-        except Exception:
-            pass
-    players[pid] = name
-
-print(f"Loaded {len(players)} players.")
-
-# === Load Positions ===
-print("Loading primary positions...")
-position_df = pd.read_csv(PRIMARY_POS_FILE)
-primary_position = dict(zip(position_df.playerId, position_df.best_fit_role))
-
-# === Initialize Stats ===
-print("Processing event files...")
-stats = defaultdict(lambda: {
-    "matches": set(),
-    "acceleration_total": 0,
-    "acceleration_success": 0,
-    "launch_total": 0,
-    "launch_success": 0,
-    "smartpass_total": 0,
-    "smartpass_success": 0,
-    "throughball_total": 0,
-    "throughball_success": 0,
-    "shots": 0,
-    "goals": 0,
-    "assists": 0,
-    "keypasses": 0,
-    "counterattacks": 0,
-    "opportunities": 0,
-    "feints": 0,
-    "anticipated": 0,
-    "duels_total": 0,
-    "per_match_metrics": defaultdict(lambda: defaultdict(int)),
-})
-
-event_files = [f for f in os.listdir(EVENTS_DIR) if f.startswith("events_") and f.endswith(".json")]
-
-for file in event_files:
-    with open(os.path.join(EVENTS_DIR, file), encoding="utf-8") as f:
-        events = json.load(f)
-
-    for e in events:
+class CreativityAccumulator:
+    def __init__(self, players):
+        self.players = player_table.name_map(players)
+        self.known_ids = players["wy_id"]
+        self.stats = PlayerStats(
+            ["acceleration_total", "acceleration_success", "launch_total", "launch_success",
+             "smartpass_total", "smartpass_success", "throughball_total", "throughball_success",
+             "shots", "goals", "assists", "keypasses", "counterattacks", "opportunities",
+             "feints", "anticipated", "duels_total"],
+            ["actions_per_match"],
+        )
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+
+    def add(self, e):
         pid = e.get("playerId")
         mid = e.get("matchId")
-        if pid not in players or not mid:
-            continue
+        if pid not in self.players or not mid:
+            return
 
         ename = e.get("eventName")
         sname = e.get("subEventName")
-        tags = {t["id"] for t in e.get("tags", [])}
+        tags = wyscout_tags.event_tag_mask(e)
 
-        s = stats[pid]
-        s["matches"].add(mid)
-        pm = s["per_match_metrics"][mid]
+        st = self.stats
+        counts = st.counts
+        p = st.player(pid)
+        row = st.pair(p, st.see(p, mid))
+        actions = 0  # Per-match metrics only count towards the match total
 
         # === Acceleration ===
         if ename == "Others on the ball" and sname == "Acceleration":
-            s["acceleration_total"] += 1
-            pm["acceleration"] += 1
-            if SUCCESS_TAG_ID in tags:
-                s["acceleration_success"] += 1
+            counts["acceleration_total"][p] += 1
+            actions += 1
+            if tags & SUCCESS_BIT:
+                counts["acceleration_success"][p] += 1
 
         # === Launch ===
         if ename == "Pass" and sname == "Launch":
-            s["launch_total"] += 1
-            pm["launch"] += 1
-            if SUCCESS_TAG_ID in tags:
-                s["launch_success"] += 1
+            counts["launch_total"][p] += 1
+            actions += 1
+            if tags & SUCCESS_BIT:
+                counts["launch_success"][p] += 1
 
         # === Smart Pass ===
         if ename == "Pass" and sname == "Smart pass":
-            s["smartpass_total"] += 1
-            pm["smartpass"] += 1
-            if SUCCESS_TAG_ID in tags:
-                s["smartpass_success"] += 1
+            counts["smartpass_total"][p] += 1
+            actions += 1
+            if tags & SUCCESS_BIT:
+                counts["smartpass_success"][p] += 1
 
         # === Through Ball ===
-        if 901 in tags:
-            s["throughball_total"] += 1
-            pm["throughball"] += 1
-            if SUCCESS_TAG_ID in tags:
-                s["throughball_success"] += 1
+        if tags & THROUGH_BIT:
+            counts["throughball_total"][p] += 1
+            actions += 1
+            if tags & SUCCESS_BIT:
+                counts["throughball_success"][p] += 1
 
         # === Shot, Goal, Assist ===
         if ename == "Shot":
-            s["shots"] += 1
-            pm["shots"] += 1
-            if GOAL_TAG in tags:
-                s["goals"] += 1
-                pm["goals"] += 1
+            counts["shots"][p] += 1
+            actions += 1
+            if tags & GOAL_BIT:
+                counts["goals"][p] += 1
+                actions += 1
 
-        if ASSIST_TAG in tags:
-            s["assists"] += 1
-            pm["assists"] += 1
+        if tags & ASSIST_BIT:
+            counts["assists"][p] += 1
+            actions += 1
 
-        if KEY_PASS_TAG in tags:
-            s["keypasses"] += 1
-            pm["keypasses"] += 1
+        if tags & KEY_PASS_BIT:
+            counts["keypasses"][p] += 1
+            actions += 1
 
-        if COUNTERATTACK_TAG in tags:
-            s["counterattacks"] += 1
-            pm["counterattacks"] += 1
+        if tags & COUNTERATTACK_BIT:
+            counts["counterattacks"][p] += 1
+            actions += 1
 
-        if OPPORTUNITY_TAG in tags:
-            s["opportunities"] += 1
-            pm["opportunities"] += 1
+        if tags & OPPORTUNITY_BIT:
+            counts["opportunities"][p] += 1
+            actions += 1
 
-        if FEINT_TAG in tags:
-            s["feints"] += 1
-            pm["feints"] += 1
+        if tags & FEINT_BIT:
+            counts["feints"][p] += 1
+            actions += 1
 
-        if ANTICIPATED_TAG in tags:
-            s["anticipated"] += 1
-            pm["anticipated"] += 1
+        if tags & ANTICIPATED_BIT:
+            counts["anticipated"][p] += 1
+            actions += 1
 
         if sname in DUEL_EVENTS:
-            s["duels_total"] += 1
-            pm["duels"] += 1
-
-# === Rating Calculation ===
-print("Calculating creativity ratings...")
-ratings = {}
-output_lines = ["Player,PrimaryPosition,Games," + ",".join(WEIGHTS.keys()) + ",Rating"]
-
-component_values = defaultdict(list)
-player_components = {}
-
-for pid, s in stats.items():
-    games = len(s["matches"])
-    if games < 3:
-        continue
-
-    acc_pg = s["acceleration_total"] / games
-    acc_acc = smooth_ratio(s["acceleration_success"], s["acceleration_total"])
-    launch_pg = s["launch_total"] / games
-    launch_acc = smooth_ratio(s["launch_success"], s["launch_total"])
-    smart_pg = s["smartpass_total"] / games
-    smart_acc = smooth_ratio(s["smartpass_success"], s["smartpass_total"])
-    through_pg = s["throughball_total"] / games
-    through_acc = smooth_ratio(s["throughball_success"], s["throughball_total"])
-    shots_pg = s["shots"] / games
-    goals_pg = s["goals"] / games
-    assists_pg = s["assists"] / games
-    keypasses_pg = s["keypasses"] / games
-    counter_pg = s["counterattacks"] / games
-    opportunities_pg = s["opportunities"] / games
-    feints_pg = s["feints"] / games
-    anticipated_rate = (s["anticipated"] / s["duels_total"]) if s["duels_total"] > 0 else 0
-
-    match_metric_totals = {m: sum(v.values()) for m, v in s["per_match_metrics"].items()}
-    consistency = calculate_consistency(match_metric_totals)
-
-    components = {
-        "acceleration_pg": acc_pg,
-        "acceleration_acc": acc_acc,
-        "launch_pg": launch_pg,
-        "launch_acc": launch_acc,
-        "smartpass_pg": smart_pg,
-        "smartpass_acc": smart_acc,
-        "throughball_pg": through_pg,
-        "throughball_acc": through_acc,
-        "shots_pg": shots_pg,
-        "goals_pg": goals_pg,
-        "assists_pg": assists_pg,
-        "keypasses_pg": keypasses_pg,
-        "counterattacks_pg": counter_pg,
-        "opportunities_pg": opportunities_pg,
-        "feints_pg": feints_pg,
-        "anticipated_rate": anticipated_rate,
-        "consistency": consistency,
-    }
-
-    for k in components:
-        component_values[k].append(components[k])
-    player_components[pid] = (components, games)
-
-# === Normalize and score ===
-component_means = {k: mean(v) for k, v in component_values.items()}
-component_stdevs = {k: stdev(v) if len(v) > 1 else 1 for k, v in component_values.items()}
-
-for pid, (components, games) in player_components.items():
-    prior_games = 15
-    shrinkage = games / (games + prior_games)
-    z_components = {
-        k: ((components[k] - component_means[k]) / (component_stdevs[k] or 1)) * shrinkage
-        for k in WEIGHTS
-    }
-
-    score = sum(WEIGHTS[k] * z_components[k] for k in WEIGHTS)
-    score = max(0.0, min(100.0, 65 + score * 10))
-
-    output_lines.append(",".join([
-        csv_escape(players[pid]),
-        primary_position.get(pid, "Unknown"),
-        str(games),
-    ] + [f"{components[k]:.3f}" for k in WEIGHTS] + [f"{score:.2f}"]))
-
-# === Output ===
-print("Writing to output...")
-os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    f.write("\n".join(output_lines))
-
-print("Done. Output saved to", OUTPUT_FILE)
+            counts["duels_total"][p] += 1
+            actions += 1
+
+        st.match_counts["actions_per_match"][row] += actions
+
+    def add_columns(self, chunk):
+        """add() for a chunk of store rows (see event_store.EventChunk)."""
+        rows = np.flatnonzero(chunk.known_player(self.known_ids) & (chunk.match_id != 0))
+        st = self.stats
+        codes = st.players(chunk.player_id[rows].tolist())
+        pair_rows = st.pairs(codes, st.see_all(codes, chunk.match_id[rows].tolist()))
+        success = chunk.tagged(SUCCESS_BIT)[rows]
+        shot = chunk.is_event("Shot")[rows]
+        goal = shot & chunk.tagged(GOAL_BIT)[rows]
+        totals = {
+            "acceleration_total": (chunk.is_event("Others on the ball") & chunk.is_sub_event("Acceleration"))[rows],
+            "launch_total": (chunk.is_event("Pass") & chunk.is_sub_event("Launch"))[rows],
+            "smartpass_total": (chunk.is_event("Pass") & chunk.is_sub_event("Smart pass"))[rows],
+            "throughball_total": chunk.tagged(THROUGH_BIT)[rows],
+            "shots": shot,
+            "goals": goal,
+            "assists": chunk.tagged(ASSIST_BIT)[rows],
+            "keypasses": chunk.tagged(KEY_PASS_BIT)[rows],
+            "counterattacks": chunk.tagged(COUNTERATTACK_BIT)[rows],
+            "opportunities": chunk.tagged(OPPORTUNITY_BIT)[rows],
+            "feints": chunk.tagged(FEINT_BIT)[rows],
+            "anticipated": chunk.tagged(ANTICIPATED_BIT)[rows],
+            "duels_total": chunk.is_sub_event(*DUEL_EVENTS)[rows],
+        }
+        # Per-match metrics only count towards the match total
+        actions = np.zeros(len(rows), dtype=np.int64)
+        for name, hit in totals.items():
+            st.count(name, codes[hit])
+            actions += hit
+        for name, total in [("acceleration_success", "acceleration_total"), ("launch_success", "launch_total"),
+                            ("smartpass_success", "smartpass_total"), ("throughball_success", "throughball_total")]:
+            st.count(name, codes[totals[total] & success])
+        st.count("actions_per_match", pair_rows, actions)
+
+    def write(self, primary_position, output_file=OUTPUT_FILE):
+        players, stats = self.players, self.stats
+
+        # === Rating Calculation ===
+        print("Calculating creativity ratings...")
+        output_lines = ["Player,PrimaryPosition,Games," + ",".join(WEIGHTS.keys()) + ",Rating"]
+
+        player_components = {}
+
+        for pid, s in stats.items():
+            games = s["games"]
+            if games < 3:
+                continue
+
+            acc_pg = s["acceleration_total"] / games
+            acc_acc = smooth_ratio(s["acceleration_success"], s["acceleration_total"])
+            launch_pg = s["launch_total"] / games
+            launch_acc = smooth_ratio(s["launch_success"], s["launch_total"])
+            smart_pg = s["smartpass_total"] / games
+            smart_acc = smooth_ratio(s["smartpass_success"], s["smartpass_total"])
+            through_pg = s["throughball_total"] / games
+            through_acc = smooth_ratio(s["throughball_success"], s["throughball_total"])
+            shots_pg = s["shots"] / games
+            goals_pg = s["goals"] / games
+            assists_pg = s["assists"] / games
+            keypasses_pg = s["keypasses"] / games
+            counter_pg = s["counterattacks"] / games
+            opportunities_pg = s["opportunities"] / games
+            feints_pg = s["feints"] / games
+            anticipated_rate = (s["anticipated"] / s["duels_total"]) if s["duels_total"] > 0 else 0
+
+            consistency = calculate_consistency(s["actions_per_match"])
+
+            components = {
+                "acceleration_pg": acc_pg,
+                "acceleration_acc": acc_acc,
+                "launch_pg": launch_pg,
+                "launch_acc": launch_acc,
+                "smartpass_pg": smart_pg,
+                "smartpass_acc": smart_acc,
+                "throughball_pg": through_pg,
+                "throughball_acc": through_acc,
+                "shots_pg": shots_pg,
+                "goals_pg": goals_pg,
+                "assists_pg": assists_pg,
+                "keypasses_pg": keypasses_pg,
+                "counterattacks_pg": counter_pg,
+                "opportunities_pg": opportunities_pg,
+                "feints_pg": feints_pg,
+                "anticipated_rate": anticipated_rate,
+                "consistency": consistency,
+            }
+
+            player_components[pid] = (components, games)
+
+        # === Normalize and score ===
+        prior_games = 15
+        values = normalization.component_matrix([c for c, _ in player_components.values()], list(WEIGHTS))
+        games_played = np.array([g for _, g in player_components.values()])
+        scores = normalization.weighted_zscore_score(values, list(WEIGHTS.values()), games_played, prior_games)
+        scores = normalization.scale(scores, 65, 10)
+
+        for (pid, (components, games)), score in zip(player_components.items(), scores.tolist()):
+            output_lines.append(",".join([
+                csv_escape(players[pid]),
+                primary_position.get(pid, "Unknown"),
+                str(games),
+            ] + [f"{components[k]:.3f}" for k in WEIGHTS] + [f"{score:.2f}"]))
+
+        # === Output ===
+        print("Writing to output...")
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(output_lines))
+
+def main():
+    print("Loading players...")
+    acc = CreativityAccumulator(event_scan.load_players(PLAYERS_FILE))
+    print(f"Loaded {len(acc.players)} players.")
+
+    # === Load Positions ===
+    print("Loading primary positions...")
+    primary_position = event_scan.load_primary_positions(PRIMARY_POS_FILE)
+
+    print("Processing event files...")
+    event_scan.scan_events([acc], EVENTS_DIR)
+
+    with instrumentation.stage("write"):
+        acc.write(primary_position)
+    print("Done. Output saved to", OUTPUT_FILE)
+
+if __name__ == "__main__":
+    main()
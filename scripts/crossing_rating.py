@@ -1,10 +1,12 @@
 import os
-import json
 import math
-import codecs
-import pandas as pd
-from collections import defaultdict
-from statistics import mean, stdev
+import event_scan
+import player_table
+import instrumentation
+import normalization
+import wyscout_tags
+import numpy as np
+from player_stats import PlayerStats
 
 # === SETTINGS ===
 DATA_DIR = "./"
@@ -17,6 +19,10 @@ OUTPUT_FILE = os.path.join(DATA_DIR, "ratings/player_crossing_rating.csv")
 SUCCESS_TAG_ID = 1801
 KEY_PASS_TAG_ID = 302
 
+# Tag bitmasks (see wyscout_tags)
+SUCCESS_BIT = wyscout_tags.bit(SUCCESS_TAG_ID)
+KEY_PASS_BIT = wyscout_tags.bit(KEY_PASS_TAG_ID)
+
 # === CROSS TYPES ===
 VALID_CROSS_TYPES = {
     ("Pass", "Cross"),
@@ -38,18 +44,12 @@ MAX_GAME_BONUS = 0.25
 MIN_GAME_PENALTY = -0.2
 GAMES_FOR_MAX_EFFECT = 30
 PRIOR_WEIGHT_K = 15  # For Bayesian smoothing
+ANCHOR_WEIGHT = 0.2  # Pull of the global distribution in role-wise normalization
 
 SMOOTH_PRIORS = {
     "cross_acc": (0.4, 20),
 }
 
-ROLE_MAP = {
-    "GK": "GK", "GKP": "GK",
-    "DF": "DF", "DEF": "DF",
-    "MD": "MD", "MID": "MD",
-    "FW": "FW", "FWD": "FW",
-}
-
 def smooth_ratio(success, total, prior_mean, prior_weight):
     return (success + prior_mean * prior_weight) / (total + prior_weight)
 
@@ -70,172 +70,157 @@ def csv_escape(s):
     s = str(s)
     return f'"{s.replace("\"", "\"\"")}"' if "," in s or '"' in s else s
 
-# === Load players ===
-print("Loading players...")
-with open(PLAYERS_FILE, encoding="utf-8") as f:
-    players_raw = json.load(f)
-
-players = {}
-player_roles = {}
-for p in players_raw:
-    pid = p["wyId"]
-    name = p.get("shortName") or f'{p.get("firstName", "")} {p.get("lastName", "")}'
-    if "\\u" in name:
-        try:
-            name = codecs.decode(name, "unicode_escape")
-        except Exception:
-            pass
-    players[pid] = name
-    role = p.get("role", {}).get("code3") or p.get("role", {}).get("code2") or "Unknown"
-    role = ROLE_MAP.get(role.upper(), "Unknown")
-    player_roles[pid] = role
-
-print(f"Loaded {len(players)} players.")
-
-# === Load primary positions for visual only ===
-print("Loading primary positions...")
-position_df = pd.read_csv(PRIMARY_POS_FILE)
-primary_position = dict(zip(position_df.playerId, position_df.best_fit_role))
-
-# === Initialize stats ===
-stats = defaultdict(lambda: {
-    "matches": set(),
-    "cross_total": 0,
-    "cross_success": 0,
-    "cross_keypasses": 0,
-    "crosses_per_match": defaultdict(int),
-    "cross_success_per_match": defaultdict(int),
-})
-
-# === Parse events ===
-print("Processing event files...")
-event_files = [f for f in os.listdir(EVENTS_DIR) if f.startswith("events_") and f.endswith(".json")]
-
-for ef in event_files:
-    with open(os.path.join(EVENTS_DIR, ef), encoding="utf-8") as f:
-        events = json.load(f)
-
-    for e in events:
+class CrossingAccumulator:
+    def __init__(self, players):
+        self.players = player_table.name_map(players)
+        self.known_ids = players["wy_id"]
+        self.player_roles = player_table.role_map(players)
+        self.stats = PlayerStats(
+            ["cross_total", "cross_success", "cross_keypasses"],
+            ["crosses_per_match", "cross_success_per_match"],
+        )
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+
+    def add(self, e):
         event_name = e.get("eventName")
         sub_event = e.get("subEventName")
         if (event_name, sub_event) not in VALID_CROSS_TYPES:
-            continue
+            return
 
         pid = e.get("playerId")
         mid = e.get("matchId")
-        if pid not in players or not mid:
-            continue
-
-        tags = [t.get("id") for t in e.get("tags", [])]
-        success = SUCCESS_TAG_ID in tags
-        is_key_pass = KEY_PASS_TAG_ID in tags
-
-        s = stats[pid]
-        s["matches"].add(mid)
-        s["cross_total"] += 1
-        s["crosses_per_match"][mid] += 1
+        if pid not in self.players or not mid:
+            return
+
+        tags = wyscout_tags.event_tag_mask(e)
+        success = tags & SUCCESS_BIT
+        is_key_pass = tags & KEY_PASS_BIT
+
+        st = self.stats
+        p = st.player(pid)
+        row = st.pair(p, st.see(p, mid))
+        st.counts["cross_total"][p] += 1
+        st.match_counts["crosses_per_match"][row] += 1
         if success:
-            s["cross_success"] += 1
-            s["cross_success_per_match"][mid] += 1
+            st.counts["cross_success"][p] += 1
+            st.match_counts["cross_success_per_match"][row] += 1
         if is_key_pass:
-            s["cross_keypasses"] += 1
-
-# === Calculate raw ratings ===
-print("Calculating raw crossing ratings...")
-raw_ratings = {}
-games_played = {}
-intermediate_metrics = {}
-
-for pid, s in stats.items():
-    games = len(s["matches"])
-    if games == 0 or s["cross_total"] == 0:
-        continue
-
-    acc = smooth_ratio(s["cross_success"], s["cross_total"], *SMOOTH_PRIORS["cross_acc"])
-    crosses_pg = s["cross_total"] / games
-    keypasses_pg = s["cross_keypasses"] / games
-    turnover = 1 - acc
-    consistency = calculate_consistency(s["crosses_per_match"], s["cross_success_per_match"])
-
-    if games < 5:
-        game_bonus = MIN_GAME_PENALTY
-    elif games >= GAMES_FOR_MAX_EFFECT:
-        game_bonus = MAX_GAME_BONUS
-    else:
-        game_bonus = MAX_GAME_BONUS * (games / GAMES_FOR_MAX_EFFECT)
-
-    rating = (
-        WEIGHTS["cross_accuracy"] * acc +
-        WEIGHTS["crosses_per_game"] * (crosses_pg / 5) +
-        WEIGHTS["key_passes_per_game"] * (keypasses_pg / 2) +
-        WEIGHTS["consistency"] * consistency +
-        WEIGHTS["turnover_rate"] * turnover +
-        game_bonus
-    )
-
-    raw_ratings[pid] = rating
-    games_played[pid] = games
-    intermediate_metrics[pid] = (acc, crosses_pg, keypasses_pg, consistency, turnover)
-
-# === Role-wise normalization with light global anchoring ===
-print("Normalizing ratings by role with light global anchoring...")
-ANCHOR_WEIGHT = 0.2
-
-all_ratings = list(raw_ratings.values())
-global_mean = mean(all_ratings)
-global_std = stdev(all_ratings)
-
-role_groups = defaultdict(list)
-for pid, rating in raw_ratings.items():
-    role = player_roles.get(pid, "Unknown")
-    role_groups[role].append((pid, rating))
-
-normalized_ratings = {}
-
-for role, players_in_role in role_groups.items():
-    ratings = [r for _, r in players_in_role]
-    if len(ratings) < 2:
-        for pid, r in players_in_role:
-            normalized_ratings[pid] = 65.0
-        continue
-
-    role_mean = mean(ratings)
-    role_std = stdev(ratings)
-
-    blend_mean = (1 - ANCHOR_WEIGHT) * role_mean + ANCHOR_WEIGHT * global_mean
-    blend_std = (1 - ANCHOR_WEIGHT) * role_std + ANCHOR_WEIGHT * global_std
-
-    for pid, r in players_in_role:
-        z = (r - blend_mean) / blend_std if blend_std > 0 else 0
-        target_mean = 65
-        norm_score = target_mean + 10 * z
-        norm_score = max(0.0, min(100.0, norm_score))
-        normalized_ratings[pid] = norm_score
-
-# === Final output ===
-print("Writing to output file...")
-output_lines = ["Player,PrimaryPosition,Games,CrossAccuracy,CrossesPerGame,KeyPassesPerGame,Consistency,TurnoverRate,Rating"]
-
-for pid, base_score in normalized_ratings.items():
-    name = players[pid]
-    primary_pos = primary_position.get(pid, "Unknown")
-    games = games_played[pid]
-    acc, crosses_pg, keypasses_pg, consistency, turnover = intermediate_metrics[pid]
-
-    smoothed_rating = (games * base_score + PRIOR_WEIGHT_K * 65) / (games + PRIOR_WEIGHT_K)
-
-    output_lines.append(",".join([
-        csv_escape(name), primary_pos, str(games),
-        f"{acc:.3f}",
-        f"{crosses_pg:.3f}",
-        f"{keypasses_pg:.3f}",
-        f"{consistency:.3f}",
-        f"{turnover:.3f}",
-        f"{smoothed_rating:.3f}"
-    ]))
-
-os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    f.write("\n".join(output_lines))
-
-print("Done. Output saved to", OUTPUT_FILE)
+            st.counts["cross_keypasses"][p] += 1
+
+    def add_columns(self, chunk):
+        """add() for a chunk of store rows (see event_store.EventChunk)."""
+        is_cross = np.zeros(len(chunk), dtype=bool)
+        for event_name, sub_event in VALID_CROSS_TYPES:
+            is_cross |= chunk.is_event(event_name) & chunk.is_sub_event(sub_event)
+        rows = np.flatnonzero(is_cross & chunk.known_player(self.known_ids) & (chunk.match_id != 0))
+        success = chunk.tagged(SUCCESS_BIT)[rows]
+
+        st = self.stats
+        codes = st.players(chunk.player_id[rows].tolist())
+        pair_rows = st.pairs(codes, st.see_all(codes, chunk.match_id[rows].tolist()))
+        st.count("cross_total", codes)
+        st.count("crosses_per_match", pair_rows)
+        st.count("cross_success", codes[success])
+        st.count("cross_success_per_match", pair_rows[success])
+        st.count("cross_keypasses", codes[chunk.tagged(KEY_PASS_BIT)[rows]])
+
+    def write(self, primary_position, output_file=OUTPUT_FILE):
+        players, player_roles = self.players, self.player_roles
+
+        # === Calculate raw ratings ===
+        print("Calculating raw crossing ratings...")
+        raw_ratings = {}
+        games_played = {}
+        intermediate_metrics = {}
+
+        for pid, s in self.stats.items():
+            games = s["games"]
+            if games == 0 or s["cross_total"] == 0:
+                continue
+
+            acc = smooth_ratio(s["cross_success"], s["cross_total"], *SMOOTH_PRIORS["cross_acc"])
+            crosses_pg = s["cross_total"] / games
+            keypasses_pg = s["cross_keypasses"] / games
+            turnover = 1 - acc
+            consistency = calculate_consistency(s["crosses_per_match"], s["cross_success_per_match"])
+
+            if games < 5:
+                game_bonus = MIN_GAME_PENALTY
+            elif games >= GAMES_FOR_MAX_EFFECT:
+                game_bonus = MAX_GAME_BONUS
+            else:
+                game_bonus = MAX_GAME_BONUS * (games / GAMES_FOR_MAX_EFFECT)
+
+            rating = (
+                WEIGHTS["cross_accuracy"] * acc +
+                WEIGHTS["crosses_per_game"] * (crosses_pg / 5) +
+                WEIGHTS["key_passes_per_game"] * (keypasses_pg / 2) +
+                WEIGHTS["consistency"] * consistency +
+                WEIGHTS["turnover_rate"] * turnover +
+                game_bonus
+            )
+
+            raw_ratings[pid] = rating
+            games_played[pid] = games
+            intermediate_metrics[pid] = (acc, crosses_pg, keypasses_pg, consistency, turnover)
+
+        # === Role-wise normalization with light global anchoring ===
+        print("Normalizing ratings by role with light global anchoring...")
+        pids = list(raw_ratings)
+        roles = [player_roles.get(pid, "Unknown") for pid in pids]
+        z = normalization.role_blended_zscores(list(raw_ratings.values()), roles, ANCHOR_WEIGHT)
+        base_scores = normalization.scale(z, 65, 10)
+        games = np.array([games_played[pid] for pid in pids])
+        smoothed_ratings = normalization.bayesian_shrink(base_scores, games, PRIOR_WEIGHT_K, 65).tolist()
+
+        # Players are listed role group by role group, in order of first appearance
+        role_order = {}
+        for role in roles:
+            role_order.setdefault(role, len(role_order))
+        order = sorted(range(len(pids)), key=lambda i: role_order[roles[i]])
+
+        # === Final output ===
+        print("Writing to output file...")
+        output_lines = ["Player,PrimaryPosition,Games,CrossAccuracy,CrossesPerGame,KeyPassesPerGame,Consistency,TurnoverRate,Rating"]
+
+        for i in order:
+            pid = pids[i]
+            name = players[pid]
+            primary_pos = primary_position.get(pid, "Unknown")
+            acc, crosses_pg, keypasses_pg, consistency, turnover = intermediate_metrics[pid]
+
+            output_lines.append(",".join([
+                csv_escape(name), primary_pos, str(games_played[pid]),
+                f"{acc:.3f}",
+                f"{crosses_pg:.3f}",
+                f"{keypasses_pg:.3f}",
+                f"{consistency:.3f}",
+                f"{turnover:.3f}",
+                f"{smoothed_ratings[i]:.3f}"
+            ]))
+
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(output_lines))
+
+def main():
+    print("Loading players...")
+    acc = CrossingAccumulator(event_scan.load_players(PLAYERS_FILE))
+    print(f"Loaded {len(acc.players)} players.")
+
+    # === Load primary positions for visual only ===
+    print("Loading primary positions...")
+    primary_position = event_scan.load_primary_positions(PRIMARY_POS_FILE)
+
+    # === Parse events ===
+    print("Processing event files...")
+    event_scan.scan_events([acc], EVENTS_DIR)
+
+    with instrumentation.stage("write"):
+        acc.write(primary_position)
+    print("Done. Output saved to", OUTPUT_FILE)
+
+if __name__ == "__main__":
+    main()
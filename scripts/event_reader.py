@@ -1,63 +1,192 @@
 import json
-import glob
 import os
 import csv
+import argparse
+import numpy as np
+import archives
+import event_scan
+import event_store
+import instrumentation
+import player_names
+import player_table
+
+EVENT_STORE_DIR = './events_store'
+TEAMS_FILE = './data/teams.json'
+CSV_FIELDS = ['eventName', 'subEventName', 'startX', 'startY', 'endX', 'endY', 'tags']
 
 def find_player_id_by_shortname(short_name, players_file='./data/players.json'):
-    with open(players_file, 'r', encoding='utf-8') as f:
-        players = json.load(f)
-    for player in players:
-        player_short = player.get('shortName') or player.get('short_name') or player.get('shortname') or ''
-        if player_short.strip().lower() == short_name.strip().lower():
-            return player.get('wyId') or player.get('playerId') or player.get('id') or player.get('player_id')
-    return None
+    index = player_names.load_index(players_file)
+    player_id, _ = player_names.resolve(index, short_name)
+    return player_id
+
+def open_indexed_store(events_folder='./events', store_folder=EVENT_STORE_DIR):
+    # The store carries a playerId index; (re)build it when the event files changed
+    event_files = event_scan.list_event_files(events_folder)
+    if not event_store.is_fresh(event_files, store_folder):
+        print(f"Indexing events into {store_folder} (only needed once per data update)...")
+        event_store.convert_events(event_files, store_folder, event_scan.iter_file_events)
+    return event_store.open_store(store_folder)
+
+def iter_player_events(player_id, events_folder='./events', store_folder=EVENT_STORE_DIR):
+    columns, meta = open_indexed_store(events_folder, store_folder)
+    rows = event_store.player_rows(columns, player_id)
+    yield from event_store.build_events(columns, meta, rows)
+
+def event_csv_row(event):
+    positions = event.get('positions', [])
+    start_x = positions[0].get('x', "") if len(positions) >= 1 else ""
+    start_y = positions[0].get('y', "") if len(positions) >= 1 else ""
+    end_x = positions[1].get('x', "") if len(positions) >= 2 else ""
+    end_y = positions[1].get('y', "") if len(positions) >= 2 else ""
+
+    # Extract all tag IDs (no filtering)
+    tag_ids = [str(tag.get('id')) for tag in event.get('tags', []) if tag.get('id') is not None]
+    tag_str = ", ".join(tag_ids)
+
+    return {
+        'eventName': event.get('eventName', ''),
+        'subEventName': event.get('subEventName', ''),
+        'startX': start_x,
+        'startY': start_y,
+        'endX': end_x,
+        'endY': end_y,
+        'tags': tag_str
+    }
 
 def extract_player_events_csv(short_name, players_file='./data/players.json', events_folder='./events', output_folder='./player_events_output'):
-    player_id = find_player_id_by_shortname(short_name, players_file)
+    index = player_names.load_index(players_file)
+    player_id, suggestions = player_names.resolve(index, short_name)
     if player_id is None:
+        if player_names.ambiguous(index, short_name, suggestions):
+            print(player_names.ambiguity_text(index, short_name, suggestions))
+            return
         print(f"Player with short name '{short_name}' not found in {players_file}")
+        if suggestions:
+            print(f"Did you mean: {player_names.suggestion_text(index, suggestions)}?")
         return
 
     print(f"Found player '{short_name}' with ID {player_id}")
 
     os.makedirs(output_folder, exist_ok=True)
-    output_file = os.path.join(output_folder, f"{short_name}_events.csv")
+    output_file = os.path.join(output_folder, f"{player_names.file_stem(index, player_id)}_events.csv")
 
     total_events = 0
     with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['eventName', 'subEventName', 'startX', 'startY', 'endX', 'endY', 'tags']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDS)
         writer.writeheader()
 
-        for filepath in glob.glob(f"{events_folder}/events_*.json"):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                events = json.load(f)
-
-            for event in events:
-                if event.get('playerId') == player_id:
-                    positions = event.get('positions', [])
-                    start_x = positions[0]['x'] if len(positions) >= 1 else ""
-                    start_y = positions[0]['y'] if len(positions) >= 1 else ""
-                    end_x = positions[1]['x'] if len(positions) >= 2 else ""
-                    end_y = positions[1]['y'] if len(positions) >= 2 else ""
-
-                    # Extract all tag IDs (no filtering)
-                    tag_ids = [str(tag.get('id')) for tag in event.get('tags', []) if tag.get('id') is not None]
-                    tag_str = ", ".join(tag_ids)
-
-                    writer.writerow({
-                        'eventName': event.get('eventName', ''),
-                        'subEventName': event.get('subEventName', ''),
-                        'startX': start_x,
-                        'startY': start_y,
-                        'endX': end_x,
-                        'endY': end_y,
-                        'tags': tag_str
-                    })
-                    total_events += 1
+        for event in iter_player_events(player_id, events_folder):
+            writer.writerow(event_csv_row(event))
+            total_events += 1
 
     print(f"Extracted {total_events} events for player '{short_name}' into {output_file}")
 
+def find_team_id(team, teams_file=TEAMS_FILE):
+    if str(team).isdigit():
+        return int(team)
+    with archives.open_text(teams_file) as f:
+        teams = json.load(f)
+    # Team names are escaped like player names; typed ones are matched like typed player names
+    wanted = player_names.fold_query(team)
+    for t in teams:
+        names = {player_names.fold(player_table.clean_name(t.get(key, ''))) for key in ('name', 'officialName')}
+        if wanted in names:
+            return t['wyId']
+    return None
+
+def select_players(players, columns, index, short_names=None, team_id=None, role=None):
+    """Map playerId -> short name for every player matching all given filters."""
+    selected = player_table.name_map(players)
+
+    if short_names:
+        wanted = set()
+        for n in short_names:
+            player_id, suggestions = player_names.resolve(index, n)
+            if player_id is None and player_names.ambiguous(index, n, suggestions):
+                print(player_names.ambiguity_text(index, n, suggestions))
+            elif player_id is None:
+                print(f"Player with short name '{n}' not found")
+                if suggestions:
+                    print(f"  Did you mean: {player_names.suggestion_text(index, suggestions)}?")
+            else:
+                wanted.add(player_id)
+        selected = {pid: name for pid, name in selected.items() if pid in wanted}
+
+    if team_id is not None:
+        # Players who appear in the team's events, so mid-season moves are covered
+        team_rows = columns['team_id'] == team_id
+        team_players = set(np.unique(columns['player_id'][team_rows]).tolist())
+        selected = {pid: name for pid, name in selected.items() if pid in team_players}
+
+    if role:
+        category = player_table.role_category(role)
+        roles = player_table.role_map(players)
+        selected = {pid: name for pid, name in selected.items() if roles[pid] == category}
+
+    return selected
+
+def extract_players_events_csv(short_names=None, team=None, role=None, players_file='./data/players.json', events_folder='./events', output_folder='./player_events_output'):
+    """Write <name>_events.csv for many players from one pass over the player index.
+
+    The index keeps each player's rows together, so every output file is
+    written in a single buffered run and all selected players together
+    cost at most one pass over the events. Players whose short names
+    clash get <name>_<wyId>_events.csv (see player_names.file_stem), so
+    none overwrites another's file.
+    """
+    players = player_table.load_players(players_file)
+    columns, meta = open_indexed_store(events_folder)
+
+    team_id = None
+    if team is not None:
+        team_id = find_team_id(team)
+        if team_id is None:
+            print(f"Team '{team}' not found in {TEAMS_FILE}")
+            return
+
+    index = player_names.load_index(players_file)
+    selected = select_players(players, columns, index, short_names, team_id, role)
+    if not selected:
+        print("No players matched the selection.")
+        return
+
+    os.makedirs(output_folder, exist_ok=True)
+    total_events = written = 0
+    for player_id in sorted(selected):
+        rows = event_store.player_rows(columns, player_id)
+        if len(rows) == 0:
+            continue
+        output_file = os.path.join(output_folder, f"{player_names.file_stem(index, player_id)}_events.csv")
+        with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            for start in range(0, len(rows), event_store.CHUNK_ROWS):
+                chunk = rows[start:start + event_store.CHUNK_ROWS]
+                writer.writerows(event_csv_row(e) for e in event_store.build_events(columns, meta, chunk))
+        total_events += len(rows)
+        written += 1
+
+    stage = instrumentation.current()
+    stage.count("kept", total_events)
+    if len(selected) > written:
+        stage.skip("player_without_events", len(selected) - written)
+
+    print(f"Extracted {total_events} events for {written} players into {output_folder} ({len(selected) - written} selected players had no events)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Export per-player event CSVs.")
+    parser.add_argument('--names', nargs='+', help="player short names to export")
+    parser.add_argument('--team', help="export every player of this team (name or wyId)")
+    parser.add_argument('--role', help="only players with this role (e.g. GK, DF, MD, FW)")
+    args = parser.parse_args()
+
+    if args.names or args.team or args.role:
+        with instrumentation.stage("export_players"):
+            extract_players_events_csv(args.names, args.team, args.role)
+    else:
+        short_name_input = input("Enter player short name (exact match): ")
+        with instrumentation.stage("export_player"):
+            extract_player_events_csv(short_name_input)
+
 if __name__ == "__main__":
-    short_name_input = input("Enter player short name (exact match): ")
-    extract_player_events_csv(short_name_input)
+    main()
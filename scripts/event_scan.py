@@ -0,0 +1,220 @@
+import os
+import json
+import pandas as pd
+import archives
+import event_store
+import instrumentation
+import player_table
+from concurrent.futures import ProcessPoolExecutor
+
+# === SETTINGS ===
+DATA_DIR = "./"
+EVENTS_DIR = os.path.join(DATA_DIR, "events")
+PLAYERS_FILE = os.path.join(DATA_DIR, "data/players.json")
+PRIMARY_POS_FILE = os.path.join(DATA_DIR, "positions/player_primary_positions.csv")
+EVENT_STORE_DIR = os.path.join(DATA_DIR, "events_store")
+
+READ_CHUNK_CHARS = 1 << 16  # Characters read per refill while streaming events
+SCAN_WORKERS = os.cpu_count() or 1  # Processes used by scan_events; 1 scans in this process
+
+def list_event_files(events_dir=EVENTS_DIR):
+    """events_*.json files in events_dir, also compressed or inside <events_dir>.zip (see archives)."""
+    return archives.list_files(events_dir, lambda f: f.startswith("events_") and f.endswith(".json"))
+
+def iter_json_array(f, chunk_chars=READ_CHUNK_CHARS):
+    """Yield the items of a top-level JSON array one at a time.
+
+    Only the current item and one read chunk are held in memory, so the
+    cost does not grow with the file size.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def skip(buf, pos, chars):
+        while pos < len(buf) and buf[pos] in chars:
+            pos += 1
+        return pos
+
+    # Find the opening bracket
+    while True:
+        pos = skip(buf, pos, " \t\r\n\ufeff")
+        if pos < len(buf) or eof:
+            break
+        buf, pos = f.read(chunk_chars), 0
+        eof = not buf
+    if buf[pos:pos + 1] != "[":
+        raise ValueError("Expected a JSON array of events")
+    pos += 1
+
+    while True:
+        pos = skip(buf, pos, " \t\r\n,")
+        if pos == len(buf):
+            if eof:
+                raise ValueError("Unterminated JSON array of events")
+            buf, pos = f.read(chunk_chars), 0
+            eof = not buf
+            continue
+        if buf[pos] == "]":
+            return
+
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+            # A number cut by the buffer end still decodes, so only trust an
+            # item once the next delimiter has been read
+            complete = eof or (end < len(buf) and buf[end] in " \t\r\n,]")
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+
+        if not complete:
+            # Item continues past the buffer: drop what was consumed and read more
+            more = f.read(chunk_chars)
+            eof = not more
+            buf, pos = buf[pos:] + more, 0
+            continue
+
+        yield item
+        pos = end
+
+def iter_file_events(path):
+    with archives.open_text(path) as f:
+        yield from iter_json_array(f)
+
+def load_players(players_file=PLAYERS_FILE):
+    """Compiled players table (see player_table), shared by every accumulator."""
+    return player_table.load_players(players_file)
+
+def load_primary_positions(primary_pos_file=PRIMARY_POS_FILE):
+    position_df = pd.read_csv(primary_pos_file)
+    return dict(zip(position_df.playerId, position_df.best_fit_role))
+
+def list_scan_units(events_dir=EVENTS_DIR, store_dir=EVENT_STORE_DIR):
+    """Independent pieces of work, one per event file, in file order.
+
+    A unit is ("json", path) or, when the columnar store is fresh,
+    ("store", store_dir, start_row, stop_row) covering the same file.
+    """
+    event_files = list_event_files(events_dir)
+    if event_store.is_fresh(event_files, store_dir):
+        print(f"Reading events from {store_dir}")
+        meta = event_store.read_meta(store_dir)
+        return [("store", store_dir, f["start"], f["stop"]) for f in meta["files"]]
+    return [("json", path) for path in event_files]
+
+def iter_unit_events(unit, skip_matches=None):
+    """Events of one scan unit, leaving out those whose matchId is in skip_matches."""
+    if unit[0] == "store":
+        _, store_dir, start, stop = unit
+        yield from event_store.iter_events(store_dir, start, stop, skip_matches)
+    elif skip_matches:
+        stage = instrumentation.current()
+        for e in iter_file_events(unit[1]):
+            if e.get("matchId") not in skip_matches:
+                yield e
+            else:
+                stage.skip("match_already_counted")
+    else:
+        yield from iter_file_events(unit[1])
+
+def iter_events(events_dir=EVENTS_DIR, store_dir=EVENT_STORE_DIR):
+    """Yield every event, from the columnar store when it matches the JSON files."""
+    for unit in list_scan_units(events_dir, store_dir):
+        yield from iter_unit_events(unit)
+
+def unit_name(unit):
+    if unit[0] == "store":
+        return f"{os.path.basename(os.path.normpath(unit[1]))}[{unit[2]}:{unit[3]}]"
+    return archives.name(unit[1])
+
+def skip_counts(accumulators):
+    """Events each accumulator left out, by reason, for accumulators that count them."""
+    counts = {}
+    for acc in accumulators:
+        if hasattr(acc, "skip_counts"):
+            for reason, n in acc.skip_counts().items():
+                key = f"{type(acc).__name__}.{reason}"
+                counts[key] = counts.get(key, 0) + n
+    return counts
+
+def _scan_unit(args):
+    # Runs in a worker: scan one unit into the given (empty) accumulators
+    unit, accumulators, skip_matches = args
+    mark = instrumentation.mark()
+    with instrumentation.stage("scan_file", unit_name(unit)) as stage:
+        if stage.enabled:
+            skipped_before = skip_counts(accumulators)
+        n_events = 0
+        if unit[0] == "store":
+            # Accumulators that can read the store's columns get them as they are,
+            # the others one dict per event
+            column_adders = [acc.add_columns for acc in accumulators if hasattr(acc, "add_columns")]
+            adders = [acc.add for acc in accumulators if not hasattr(acc, "add_columns")]
+            _, store_dir, start, stop = unit
+            for chunk in event_store.iter_chunks(store_dir, start, stop, skip_matches):
+                for add_columns in column_adders:
+                    add_columns(chunk)
+                if adders:
+                    for e in chunk.events():
+                        for add in adders:
+                            add(e)
+                n_events += len(chunk)
+        else:
+            adders = [acc.add for acc in accumulators]
+            for e in iter_unit_events(unit, skip_matches):
+                for add in adders:
+                    add(e)
+                n_events += 1
+        if stage.enabled:
+            stage.count("seen", n_events + sum(stage.skipped.values()))
+            stage.count("kept", n_events)
+            for reason, n in skip_counts(accumulators).items():
+                if n - skipped_before.get(reason, 0):
+                    stage.skip(reason, n - skipped_before.get(reason, 0))
+    # Records travel back with the results when this ran in a worker
+    return accumulators, n_events, instrumentation.collect(mark)
+
+def scan_units(accumulators, units, workers=None, skip_matches=None):
+    """Hand every event of the given scan units to all accumulators.
+
+    With more than one worker, units are scanned in a process pool into
+    copies of the (still empty) accumulators, which must then also be
+    picklable and have a ``merge(other)`` method. Partial results are
+    merged in unit order, so the output matches a serial scan exactly.
+    Events of matches in skip_matches are left out. Accumulators with an
+    ``add_columns(chunk)`` method read store units as column chunks (see
+    event_store.EventChunk) instead of event dicts. Returns the number of
+    events scanned.
+    """
+    workers = min(workers or SCAN_WORKERS, len(units))
+    total_events = 0
+
+    with instrumentation.stage("scan") as stage:
+        if workers <= 1:
+            for unit in units:
+                _, n_events, records = _scan_unit((unit, accumulators, skip_matches))
+                instrumentation.extend(records)
+                total_events += n_events
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # map() yields in submission order, whichever worker finishes first
+                tasks = [(unit, accumulators, skip_matches) for unit in units]
+                for parts, n_events, records in pool.map(_scan_unit, tasks):
+                    for acc, part in zip(accumulators, parts):
+                        acc.merge(part)
+                    instrumentation.extend(records)
+                    total_events += n_events
+        stage.count("kept", total_events)
+
+    return total_events
+
+def scan_events(accumulators, events_dir=EVENTS_DIR, store_dir=EVENT_STORE_DIR, workers=None):
+    """Read the events once and hand every event to all accumulators.
+
+    An accumulator is any object with an ``add(event)`` method; see
+    scan_units for running on several workers. Returns the total number
+    of events seen.
+    """
+    return scan_units(accumulators, list_scan_units(events_dir, store_dir), workers)
@@ -0,0 +1,325 @@
+import os
+import json
+import numpy as np
+import archives
+import wyscout_tags
+import instrumentation
+from array import array
+
+# === SETTINGS ===
+META_FILE = "meta.json"
+STORE_VERSION = 4  # Bump when the column layout changes
+CHUNK_ROWS = 65536  # Rows handed to accumulators (or turned back into event dicts) at a time
+
+# Values an event does not have: ids are flagged in the "missing" column,
+# coordinates (0-100 in Wyscout) hold COORD_MISSING
+MISSING_PLAYER = 1
+MISSING_TEAM = 2
+MISSING_MATCH = 4
+COORD_MISSING = 255
+
+# Fixed-width columns, one .npy file each
+COLUMN_DTYPES = {
+    "player_id": np.int32,
+    "match_id": np.int32,
+    "team_id": np.int32,
+    "missing": np.uint8,         # MISSING_* flags of ids the event does not have
+    "event_name": np.uint8,      # code into meta["event_names"]
+    "sub_event_name": np.uint8,  # code into meta["sub_event_names"]
+    "n_positions": np.uint8,
+    "start_x": np.uint8,
+    "start_y": np.uint8,
+    "end_x": np.uint8,
+    "end_y": np.uint8,
+    "event_sec": np.float64,
+}
+# Tags are variable length: tag_ids[tag_offsets[i]:tag_offsets[i + 1]] belong to row i.
+# tag_mask holds the same tags as one wyscout_tags bitmask per row.
+TAG_COLUMNS = {
+    "tag_offsets": np.int64,
+    "tag_ids": np.uint16,
+    "tag_mask": np.uint64,
+}
+# Inverted index: rows of player_index_ids[k] are
+# player_index_rows[player_index_offsets[k]:player_index_offsets[k + 1]]
+INDEX_COLUMNS = {
+    "player_index_ids": np.int32,
+    "player_index_offsets": np.int64,
+    "player_index_rows": np.int64,
+}
+# array.array typecodes matching COLUMN_DTYPES, used while converting
+ARRAY_TYPECODES = {
+    "player_id": "i",
+    "match_id": "i",
+    "team_id": "i",
+    "missing": "B",
+    "event_name": "B",
+    "sub_event_name": "B",
+    "n_positions": "B",
+    "start_x": "B",
+    "start_y": "B",
+    "end_x": "B",
+    "end_y": "B",
+    "event_sec": "d",
+}
+
+def file_signature(path):
+    return archives.signature(path)
+
+def read_meta(store_dir):
+    meta_path = os.path.join(store_dir, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, encoding="utf-8") as f:
+        return json.load(f)
+
+def is_fresh(event_files, store_dir):
+    """True if the store was converted from exactly these files, unchanged."""
+    meta = read_meta(store_dir)
+    if meta is None or meta.get("version") != STORE_VERSION:
+        return False
+    stored = [{k: f[k] for k in ("name", "size", "mtime_ns")} for f in meta["files"]]
+    return stored == [file_signature(p) for p in event_files]
+
+def coordinate(position, key):
+    value = position.get(key)
+    if value is None:
+        return COORD_MISSING
+    if not 0 <= value < COORD_MISSING:
+        raise ValueError(f"Coordinate {key}={value} does not fit the store's uint8 columns")
+    return value
+
+def convert_events(event_files, store_dir, iter_file_events):
+    """Convert events_*.json files into the columnar store in store_dir.
+
+    ``iter_file_events(path)`` yields the event dicts in a file. Columns are
+    collected in typed buffers, so memory stays at a few bytes per event.
+    """
+    columns = {k: array(ARRAY_TYPECODES[k]) for k in COLUMN_DTYPES}
+    tag_counts = array("q")
+    tag_ids = array("H")
+    event_names, sub_event_names = {}, {}
+    files = []
+    n_rows = 0
+
+    for path in event_files:
+        with instrumentation.stage("convert_file", archives.name(path)) as stage:
+            signature = file_signature(path)
+            start = n_rows
+            for e in iter_file_events(path):
+                positions = e.get("positions") or []
+                start_pos = positions[0] if len(positions) >= 1 else {}
+                end_pos = positions[1] if len(positions) >= 2 else {}
+                tags = [t["id"] for t in e.get("tags", []) if t.get("id") is not None]
+
+                player_id, match_id, team_id = e.get("playerId"), e.get("matchId"), e.get("teamId")
+                columns["player_id"].append(player_id or 0)
+                columns["match_id"].append(match_id or 0)
+                columns["team_id"].append(team_id or 0)
+                columns["missing"].append((player_id is None) * MISSING_PLAYER | (team_id is None) * MISSING_TEAM
+                                          | (match_id is None) * MISSING_MATCH)
+                columns["event_name"].append(event_names.setdefault(e.get("eventName", ""), len(event_names)))
+                columns["sub_event_name"].append(sub_event_names.setdefault(e.get("subEventName", ""), len(sub_event_names)))
+                columns["n_positions"].append(min(len(positions), 2))
+                columns["start_x"].append(coordinate(start_pos, "x"))
+                columns["start_y"].append(coordinate(start_pos, "y"))
+                columns["end_x"].append(coordinate(end_pos, "x"))
+                columns["end_y"].append(coordinate(end_pos, "y"))
+                columns["event_sec"].append(e.get("eventSec", 0.0))
+                tag_counts.append(len(tags))
+                tag_ids.extend(tags)
+                n_rows += 1
+
+            signature.update({"start": start, "stop": n_rows})
+            files.append(signature)
+            stage.count("seen", n_rows - start)
+            print(f"Converted {archives.name(path)}: {n_rows - start} events")
+
+    if len(event_names) > 256 or len(sub_event_names) > 256:
+        raise ValueError("Too many distinct event names for uint8 codes")
+
+    os.makedirs(store_dir, exist_ok=True)
+    for name, dtype in COLUMN_DTYPES.items():
+        np.save(os.path.join(store_dir, f"{name}.npy"), np.frombuffer(columns[name], dtype=dtype))
+    tag_offsets = np.zeros(n_rows + 1, dtype=TAG_COLUMNS["tag_offsets"])
+    np.cumsum(tag_counts, out=tag_offsets[1:])
+    np.save(os.path.join(store_dir, "tag_offsets.npy"), tag_offsets)
+    tag_ids = np.frombuffer(tag_ids, dtype=TAG_COLUMNS["tag_ids"])
+    np.save(os.path.join(store_dir, "tag_ids.npy"), tag_ids)
+    np.save(os.path.join(store_dir, "tag_mask.npy"), wyscout_tags.encode_tag_column(tag_offsets, tag_ids))
+
+    for name, values in zip(INDEX_COLUMNS, build_player_index(np.frombuffer(columns["player_id"], dtype=np.int32))):
+        np.save(os.path.join(store_dir, f"{name}.npy"), values)
+
+    # Meta goes last so a half-written store is never considered fresh
+    meta = {
+        "version": STORE_VERSION,
+        "rows": n_rows,
+        "files": files,
+        "event_names": list(event_names),
+        "sub_event_names": list(sub_event_names),
+    }
+    with open(os.path.join(store_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=1)
+    return meta
+
+def open_store(store_dir):
+    """Memory-map every column. Returns (columns, meta)."""
+    meta = read_meta(store_dir)
+    if meta is None or meta.get("version") != STORE_VERSION:
+        raise FileNotFoundError(f"No event store (version {STORE_VERSION}) at {store_dir}")
+    columns = {
+        name: np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode="r")
+        for name in list(COLUMN_DTYPES) + list(TAG_COLUMNS) + list(INDEX_COLUMNS)
+    }
+    return columns, meta
+
+def build_player_index(player_ids):
+    """Group row numbers by player id, keeping each player's rows in event order."""
+    rows = np.argsort(player_ids, kind="stable")
+    ids, counts = np.unique(player_ids[rows], return_counts=True)
+    offsets = np.zeros(len(ids) + 1, dtype=INDEX_COLUMNS["player_index_offsets"])
+    np.cumsum(counts, out=offsets[1:])
+    return (
+        ids.astype(INDEX_COLUMNS["player_index_ids"]),
+        offsets,
+        rows.astype(INDEX_COLUMNS["player_index_rows"]),
+    )
+
+def player_rows(columns, player_id):
+    """Store rows of one player's events, found through the inverted index."""
+    ids = columns["player_index_ids"]
+    k = int(np.searchsorted(ids, player_id))
+    if k == len(ids) or ids[k] != player_id:
+        return np.empty(0, dtype=INDEX_COLUMNS["player_index_rows"])
+    offsets = columns["player_index_offsets"]
+    return columns["player_index_rows"][offsets[k]:offsets[k + 1]]
+
+def build_events(columns, meta, rows):
+    """Rebuild Wyscout-shaped event dicts for the given row indices.
+
+    Ids and coordinates the event did not have are left out again.
+    """
+    rows = np.asarray(rows)
+    event_names = meta["event_names"]
+    sub_event_names = meta["sub_event_names"]
+    cols = {name: columns[name][rows].tolist() for name in COLUMN_DTYPES}
+    tag_offsets = columns["tag_offsets"]
+    tag_starts = tag_offsets[rows].tolist()
+    tag_stops = tag_offsets[rows + 1].tolist()
+    tag_ids = columns["tag_ids"]
+    tag_masks = columns["tag_mask"][rows].tolist()
+
+    events = []
+    for i in range(len(rows)):
+        n = cols["n_positions"][i]
+        positions = [
+            {"x": cols["start_x"][i], "y": cols["start_y"][i]},
+            {"x": cols["end_x"][i], "y": cols["end_y"][i]},
+        ][:n]
+        for position in positions:
+            if position["x"] == COORD_MISSING:
+                del position["x"]
+            if position["y"] == COORD_MISSING:
+                del position["y"]
+        missing = cols["missing"][i]
+        events.append({
+            "eventName": event_names[cols["event_name"][i]],
+            "subEventName": sub_event_names[cols["sub_event_name"][i]],
+            "playerId": None if missing & MISSING_PLAYER else cols["player_id"][i],
+            "matchId": None if missing & MISSING_MATCH else cols["match_id"][i],
+            "teamId": None if missing & MISSING_TEAM else cols["team_id"][i],
+            "positions": positions,
+            "eventSec": cols["event_sec"][i],
+            "tags": [{"id": t} for t in tag_ids[tag_starts[i]:tag_stops[i]].tolist()],
+            "tagMask": tag_masks[i],
+        })
+    return events
+
+class EventChunk:
+    """A run of stored rows as columns, for accumulators that read them directly.
+
+    Every column of COLUMN_DTYPES and tag_mask is an attribute holding the
+    rows' values. Accumulators with an ``add_columns(chunk)`` method get
+    these instead of one dict per event (see event_scan.scan_units); the
+    masks below stand in for the checks ``add(event)`` makes on a dict.
+    """
+
+    def __init__(self, columns, meta, rows):
+        self.columns, self.meta, self.rows = columns, meta, rows
+        for name in list(COLUMN_DTYPES) + ["tag_mask"]:
+            setattr(self, name, columns[name][rows])
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def has_player(self):
+        return self.missing & MISSING_PLAYER == 0
+
+    @property
+    def has_match(self):
+        return self.missing & MISSING_MATCH == 0
+
+    def known_player(self, player_ids):
+        """Rows whose playerId is among player_ids."""
+        return self.has_player & np.isin(self.player_id, player_ids)
+
+    def _named(self, column, names, key):
+        codes = [i for i, name in enumerate(self.meta[key]) if name in names]
+        return np.isin(column, codes)
+
+    def is_event(self, *names):
+        """Rows whose eventName is one of names."""
+        return self._named(self.event_name, names, "event_names")
+
+    def is_sub_event(self, *names):
+        """Rows whose subEventName is one of names."""
+        return self._named(self.sub_event_name, names, "sub_event_names")
+
+    def tagged(self, mask):
+        """Rows with any tag of a wyscout_tags mask (e.g. wyscout_tags.bit(1801))."""
+        return self.tag_mask & np.uint64(mask) != 0
+
+    def events(self):
+        """The rows as event dicts, for accumulators without add_columns."""
+        return build_events(self.columns, self.meta, self.rows)
+
+def iter_chunks(store_dir, start=0, stop=None, skip_matches=None):
+    """Yield stored rows as EventChunks of up to CHUNK_ROWS, in original order.
+
+    start/stop select a row range, e.g. one file's rows from meta["files"].
+    Rows whose match_id is in skip_matches are left out.
+    """
+    columns, meta = open_store(store_dir)
+    stop = meta["rows"] if stop is None else stop
+    skip = None
+    if skip_matches:
+        skip = np.fromiter((m for m in skip_matches if m is not None), dtype=COLUMN_DTYPES["match_id"])
+    stage = instrumentation.current()
+    for chunk_start in range(start, stop, CHUNK_ROWS):
+        rows = np.arange(chunk_start, min(chunk_start + CHUNK_ROWS, stop))
+        if skip is not None:
+            n_rows = len(rows)
+            has_match = columns["missing"][rows] & MISSING_MATCH == 0
+            rows = rows[~(has_match & np.isin(columns["match_id"][rows], skip))]
+            stage.skip("match_already_counted", n_rows - len(rows))
+        yield EventChunk(columns, meta, rows)
+
+def iter_events(store_dir, start=0, stop=None, skip_matches=None):
+    """Yield stored events as dicts, in original file and event order (see iter_chunks)."""
+    for chunk in iter_chunks(store_dir, start, stop, skip_matches):
+        yield from chunk.events()
+
+def main():
+    import event_scan
+    event_files = event_scan.list_event_files(event_scan.EVENTS_DIR)
+    if is_fresh(event_files, event_scan.EVENT_STORE_DIR):
+        print(f"Event store at {event_scan.EVENT_STORE_DIR} is up to date.")
+        return
+    print(f"Converting {len(event_files)} event files into {event_scan.EVENT_STORE_DIR} ...")
+    meta = convert_events(event_files, event_scan.EVENT_STORE_DIR, event_scan.iter_file_events)
+    print(f"Stored {meta['rows']} events.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import time
+import atexit
+import resource
+import tracemalloc
+
+# === SETTINGS ===
+# Set FOOTBALL_PROFILE=<file> to have any script append one JSON line per run
+# to that file, with a record per stage. FOOTBALL_PROFILE_ALLOCATIONS=1 also
+# traces Python allocations per stage (this slows the run down noticeably).
+PROFILE_ENV = "FOOTBALL_PROFILE"
+ALLOCATIONS_ENV = "FOOTBALL_PROFILE_ALLOCATIONS"
+
+PROFILE_FILE = os.environ.get(PROFILE_ENV)
+ENABLED = bool(PROFILE_FILE)
+TRACE_ALLOCATIONS = ENABLED and os.environ.get(ALLOCATIONS_ENV) == "1"
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+class NullStage:
+    """Stand-in used while instrumentation is off: every call does nothing."""
+    enabled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def count(self, name, n=1):
+        pass
+
+    def skip(self, reason, n=1):
+        pass
+
+NULL_STAGE = NullStage()
+
+class Stage:
+    """One timed stage. Use as a context manager; stages nest."""
+    enabled = True
+
+    def __init__(self, name, file=None):
+        self.name = name
+        self.file = file
+        self.counts = {}
+        self.skipped = {}
+        self.child_peak = 0
+
+    def count(self, name, n=1):
+        """Add n to a counter such as "seen" or "kept"."""
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def skip(self, reason, n=1):
+        """Record n events left out, by reason."""
+        self.skipped[reason] = self.skipped.get(reason, 0) + n
+
+    def __enter__(self):
+        self.parent = _stack[-1] if _stack else None
+        self.path = f"{self.parent.path}/{self.name}" if self.parent else self.name
+        _stack.append(self)
+        if TRACE_ALLOCATIONS:
+            self.start_bytes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        _stack.pop()
+        record = {
+            "stage": self.path,
+            "pid": os.getpid(),
+            "wall_seconds": round(seconds, 6),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+        if self.file is not None:
+            record["file"] = self.file
+        if self.counts:
+            record["events"] = dict(self.counts)
+        if self.skipped:
+            record["skipped"] = dict(self.skipped)
+        if TRACE_ALLOCATIONS:
+            current, peak = tracemalloc.get_traced_memory()
+            # A child stage resets the peak, so take the largest one it saw too
+            peak = max(peak, self.child_peak)
+            record["allocated_net_bytes"] = current - self.start_bytes
+            record["allocated_peak_bytes"] = max(peak - self.start_bytes, 0)
+            if self.parent is not None:
+                self.parent.child_peak = max(self.parent.child_peak, peak)
+        if exc[0] is not None:
+            record["error"] = exc[0].__name__
+        _records.append(record)
+        return False
+
+_stack = []
+_records = []
+
+def stage(name, file=None):
+    """Context manager timing one stage; a shared no-op when instrumentation is off."""
+    if not ENABLED:
+        return NULL_STAGE
+    return Stage(name, file)
+
+def current():
+    """The innermost open stage, for code that counts into its caller's stage."""
+    return _stack[-1] if _stack else NULL_STAGE
+
+def mark():
+    """Position in this process's records, for collect(since=...)."""
+    return len(_records)
+
+def collect(since=0):
+    """Take the records made since a mark(), e.g. to send them back from a worker."""
+    records = _records[since:]
+    del _records[since:]
+    return records
+
+def extend(records):
+    """Add records made in another process."""
+    _records.extend(records)
+
+def _write_run():
+    if not _records:
+        return
+    run = {
+        "script": os.path.basename(sys.argv[0]),
+        "argv": sys.argv[1:],
+        "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "stages": collect(),
+    }
+    directory = os.path.dirname(PROFILE_FILE)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(PROFILE_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run) + "\n")
+
+if ENABLED:
+    if TRACE_ALLOCATIONS and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    # Worker processes leave through os._exit, so only the main process writes
+    atexit.register(_write_run)
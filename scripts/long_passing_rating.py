@@ -1,9 +1,13 @@
 import os
-import json
 import math
-import codecs
-import pandas as pd
-from collections import defaultdict
+import event_scan
+import event_store
+import player_table
+import instrumentation
+import normalization
+import wyscout_tags
+import numpy as np
+from player_stats import PlayerStats
 
 # === SETTINGS ===
 DATA_DIR = "./"
@@ -21,6 +25,12 @@ THROUGH_PASS_TAG_ID = 901
 ASSIST_TAG_ID = 302
 FREE_KICK_TAG_ID = 801
 
+# Tag bitmasks (see wyscout_tags)
+PASS_BIT = wyscout_tags.bit(PASS_TAG_ID)
+THROUGH_PASS_BIT = wyscout_tags.bit(THROUGH_PASS_TAG_ID)
+FREE_KICK_BIT = wyscout_tags.bit(FREE_KICK_TAG_ID)
+ASSIST_BIT = wyscout_tags.bit(ASSIST_TAG_ID)
+
 WEIGHTS = {
     "long_pass_accuracy": 0.6,
     "long_THROUGH_PASS_accuracy": 0.35,
@@ -63,156 +73,179 @@ def csv_escape(s):
     s = str(s)
     return f'"{s.replace("\"", "\"\"")}"' if "," in s or '"' in s else s
 
-# === Load players ===
-print("Loading players...")
-with open(PLAYERS_FILE, encoding="utf-8") as f:
-    players_raw = json.load(f)
-
-players = {}
-for p in players_raw:
-    pid = p["wyId"]
-    name = p.get("shortName") or f'{p.get("firstName", "")} {p.get("lastName", "")}'.strip()
-    if "\\u" in name:
-        try:
-            name = codecs.decode(name, "unicode_escape")
-        except Exception:
-            pass
-    players[pid] = name
-
-print("Loading primary positions...")
-position_df = pd.read_csv(PRIMARY_POS_FILE)
-primary_position = dict(zip(position_df.playerId, position_df.best_fit_role))
-
-# === Initialize stats ===
-stats = defaultdict(lambda: {
-    "matches": set(),
-    "long_total": 0,
-    "long_success": 0,
-    "long_assists": 0,
-    "long_through_total": 0,
-    "long_through_success": 0,
-    "freekick_total": 0,
-    "freekick_success": 0,
-    "long_pass_attempts_per_match": defaultdict(int),
-    "long_pass_success_per_match": defaultdict(int),
-})
-
-# === Parse events ===
-print("Processing event files...")
-event_files = [f for f in os.listdir(EVENTS_DIR) if f.startswith("events_") and f.endswith(".json")]
-
-for ef in event_files:
-    with open(os.path.join(EVENTS_DIR, ef), encoding="utf-8") as f:
-        events = json.load(f)
-
-    for e in events:
+class LongPassingAccumulator:
+    def __init__(self, players):
+        self.players = player_table.name_map(players)
+        self.known_ids = players["wy_id"]
+        self.stats = PlayerStats(
+            ["long_total", "long_success", "long_assists", "long_through_total",
+             "long_through_success", "freekick_total", "freekick_success"],
+            ["long_pass_attempts_per_match", "long_pass_success_per_match"],
+        )
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+
+    def add(self, e):
         if e.get("eventName") != "Pass":
-            continue
+            return
 
         pid = e.get("playerId")
         mid = e.get("matchId")
-        if pid not in players or not mid:
-            continue
+        if pid not in self.players or not mid:
+            return
 
         positions = e.get("positions", [])
         if len(positions) < 2:
-            continue
+            return
         x1, y1 = positions[0].get("x", 0), positions[0].get("y", 0)
         x2, y2 = positions[1].get("x", 0), positions[1].get("y", 0)
         dist = calculate_distance(x1, y1, x2, y2)
 
-        tags = [t.get("id") for t in e.get("tags", [])]
-        success = PASS_TAG_ID in tags
-        is_freekick = FREE_KICK_TAG_ID in tags
-        is_through = THROUGH_PASS_TAG_ID in tags
-        is_assist = ASSIST_TAG_ID in tags
+        tags = wyscout_tags.event_tag_mask(e)
+        success = tags & PASS_BIT
+        is_freekick = tags & FREE_KICK_BIT
+        is_through = tags & THROUGH_PASS_BIT
+        is_assist = tags & ASSIST_BIT
 
-        s = stats[pid]
-        s["matches"].add(mid)
+        st = self.stats
+        counts = st.counts
+        p = st.player(pid)
+        m = st.see(p, mid)
 
         if is_freekick:
-            s["freekick_total"] += 1
+            counts["freekick_total"][p] += 1
             if success:
-                s["freekick_success"] += 1
+                counts["freekick_success"][p] += 1
 
         if dist >= LONG_PASS_THRESHOLD_YARDS:
-            s["long_total"] += 1
-            s["long_pass_attempts_per_match"][mid] += 1
+            row = st.pair(p, m)
+            counts["long_total"][p] += 1
+            st.match_counts["long_pass_attempts_per_match"][row] += 1
             if success:
-                s["long_success"] += 1
-                s["long_pass_success_per_match"][mid] += 1
+                counts["long_success"][p] += 1
+                st.match_counts["long_pass_success_per_match"][row] += 1
 
             if is_through:
-                s["long_through_total"] += 1
+                counts["long_through_total"][p] += 1
                 if success:
-                    s["long_through_success"] += 1
+                    counts["long_through_success"][p] += 1
 
             if is_assist:
-                s["long_assists"] += 1
-
-# === Calculate raw ratings ===
-print("Calculating long pass ratings...")
-raw_ratings = {}
-games_played = {}
-
-for pid, s in stats.items():
-    games = len(s["matches"])
-    if games == 0 or s["long_total"] == 0:
-        continue
-
-    long_acc = smooth_ratio(s["long_success"], s["long_total"], *SMOOTH_PRIORS["long_pass_acc"])
-    through_acc = smooth_ratio(s["long_through_success"], s["long_through_total"], *SMOOTH_PRIORS["long_THROUGH_PASS_acc"])
-    freekick_acc = smooth_ratio(s["freekick_success"], s["freekick_total"], *SMOOTH_PRIORS["freekick_acc"])
-    assists_pg = s["long_assists"] / games
-    turnover = 1 - long_acc
-    consistency = calculate_consistency(s["long_pass_attempts_per_match"], s["long_pass_success_per_match"])
-
-    rating = (
-        WEIGHTS["long_pass_accuracy"] * long_acc +
-        WEIGHTS["long_THROUGH_PASS_accuracy"] * through_acc +
-        WEIGHTS["long_pass_assists"] * assists_pg +
-        WEIGHTS["freekick_accuracy"] * freekick_acc +
-        WEIGHTS["consistency"] * consistency +
-        WEIGHTS["turnover_rate"] * turnover
-    )
-
-    raw_ratings[pid] = rating
-    games_played[pid] = games
-
-# === Apply Bayesian smoothing and write output ===
-mean_rating = sum(raw_ratings.values()) / len(raw_ratings) if raw_ratings else 0
-output_lines = ["Player,PrimaryPosition,Games,LongPassAcc,LongthroughPassAcc,LongPassAssistsPerGame,FreeKickAcc,Consistency,TurnoverRate,Rating"]
-
-for pid, raw in raw_ratings.items():
-    s = stats[pid]
-    name = players[pid]
-    pos = primary_position.get(pid, "Unknown")
-    games = games_played[pid]
-
-    long_acc = smooth_ratio(s["long_success"], s["long_total"], *SMOOTH_PRIORS["long_pass_acc"])
-    through_acc = smooth_ratio(s["long_through_success"], s["long_through_total"], *SMOOTH_PRIORS["long_THROUGH_PASS_acc"])
-    freekick_acc = smooth_ratio(s["freekick_success"], s["freekick_total"], *SMOOTH_PRIORS["freekick_acc"])
-    assists_pg = s["long_assists"] / games if games else 0
-    turnover = 1 - long_acc
-    consistency = calculate_consistency(s["long_pass_attempts_per_match"], s["long_pass_success_per_match"])
-
-    smoothed_rating = (games * raw + PRIOR_WEIGHT_K * mean_rating) / (games + PRIOR_WEIGHT_K)
-    smoothed_rating = min(100.000, max(0.000, smoothed_rating * 100))
-
-    output_lines.append(",".join([
-        csv_escape(name), pos, str(games),
-        f"{long_acc:.3f}",
-        f"{through_acc:.3f}",
-        f"{assists_pg:.3f}",
-        f"{freekick_acc:.3f}",
-        f"{consistency:.3f}",
-        f"{turnover:.3f}",
-        f"{smoothed_rating:.3f}"
-    ]))
-
-print(f"Writing output to {OUTPUT_FILE} ...")
-os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    f.write("\n".join(output_lines))
-
-print("Done.")
+                counts["long_assists"][p] += 1
+
+    def add_columns(self, chunk):
+        """add() for a chunk of store rows (see event_store.EventChunk)."""
+        rows = np.flatnonzero(chunk.is_event("Pass") & chunk.known_player(self.known_ids)
+                              & (chunk.match_id != 0) & (chunk.n_positions >= 2))
+        # A coordinate the event does not have counts as 0, as in add()
+        x1, y1, x2, y2 = (np.where(c[rows] == event_store.COORD_MISSING, 0, c[rows]).tolist()
+                          for c in (chunk.start_x, chunk.start_y, chunk.end_x, chunk.end_y))
+        long = np.array([calculate_distance(*c) >= LONG_PASS_THRESHOLD_YARDS for c in zip(x1, y1, x2, y2)], dtype=bool)
+        success = chunk.tagged(PASS_BIT)[rows]
+        freekick = chunk.tagged(FREE_KICK_BIT)[rows]
+
+        st = self.stats
+        codes = st.players(chunk.player_id[rows].tolist())
+        ms = st.see_all(codes, chunk.match_id[rows].tolist())
+        st.count("freekick_total", codes[freekick])
+        st.count("freekick_success", codes[freekick & success])
+
+        pair_rows = st.pairs(codes[long], ms[long])
+        success = success[long]
+        through = chunk.tagged(THROUGH_PASS_BIT)[rows][long]
+        codes = codes[long]
+        st.count("long_total", codes)
+        st.count("long_pass_attempts_per_match", pair_rows)
+        st.count("long_success", codes[success])
+        st.count("long_pass_success_per_match", pair_rows[success])
+        st.count("long_through_total", codes[through])
+        st.count("long_through_success", codes[through & success])
+        st.count("long_assists", codes[chunk.tagged(ASSIST_BIT)[rows][long]])
+
+    def write(self, primary_position, output_file=OUTPUT_FILE):
+        players, stats = self.players, dict(self.stats.items())
+
+        # === Calculate raw ratings ===
+        print("Calculating long pass ratings...")
+        raw_ratings = {}
+        games_played = {}
+
+        for pid, s in stats.items():
+            games = s["games"]
+            if games == 0 or s["long_total"] == 0:
+                continue
+
+            long_acc = smooth_ratio(s["long_success"], s["long_total"], *SMOOTH_PRIORS["long_pass_acc"])
+            through_acc = smooth_ratio(s["long_through_success"], s["long_through_total"], *SMOOTH_PRIORS["long_THROUGH_PASS_acc"])
+            freekick_acc = smooth_ratio(s["freekick_success"], s["freekick_total"], *SMOOTH_PRIORS["freekick_acc"])
+            assists_pg = s["long_assists"] / games
+            turnover = 1 - long_acc
+            consistency = calculate_consistency(s["long_pass_attempts_per_match"], s["long_pass_success_per_match"])
+
+            rating = (
+                WEIGHTS["long_pass_accuracy"] * long_acc +
+                WEIGHTS["long_THROUGH_PASS_accuracy"] * through_acc +
+                WEIGHTS["long_pass_assists"] * assists_pg +
+                WEIGHTS["freekick_accuracy"] * freekick_acc +
+                WEIGHTS["consistency"] * consistency +
+                WEIGHTS["turnover_rate"] * turnover
+            )
+
+            raw_ratings[pid] = rating
+            games_played[pid] = games
+
+        # === Apply Bayesian smoothing and write output ===
+        pids = list(raw_ratings)
+        raw = np.array(list(raw_ratings.values()), dtype=np.float64)
+        mean_rating = raw.mean() if len(raw) else 0
+        games = np.array([games_played[pid] for pid in pids])
+        smoothed_ratings = normalization.scale(normalization.bayesian_shrink(raw, games, PRIOR_WEIGHT_K, mean_rating), 0, 100).tolist()
+        output_lines = ["Player,PrimaryPosition,Games,LongPassAcc,LongthroughPassAcc,LongPassAssistsPerGame,FreeKickAcc,Consistency,TurnoverRate,Rating"]
+
+        for pid, smoothed_rating in zip(pids, smoothed_ratings):
+            s = stats[pid]
+            name = players[pid]
+            pos = primary_position.get(pid, "Unknown")
+            games = games_played[pid]
+
+            long_acc = smooth_ratio(s["long_success"], s["long_total"], *SMOOTH_PRIORS["long_pass_acc"])
+            through_acc = smooth_ratio(s["long_through_success"], s["long_through_total"], *SMOOTH_PRIORS["long_THROUGH_PASS_acc"])
+            freekick_acc = smooth_ratio(s["freekick_success"], s["freekick_total"], *SMOOTH_PRIORS["freekick_acc"])
+            assists_pg = s["long_assists"] / games if games else 0
+            turnover = 1 - long_acc
+            consistency = calculate_consistency(s["long_pass_attempts_per_match"], s["long_pass_success_per_match"])
+
+            output_lines.append(",".join([
+                csv_escape(name), pos, str(games),
+                f"{long_acc:.3f}",
+                f"{through_acc:.3f}",
+                f"{assists_pg:.3f}",
+                f"{freekick_acc:.3f}",
+                f"{consistency:.3f}",
+                f"{turnover:.3f}",
+                f"{smoothed_rating:.3f}"
+            ]))
+
+        print(f"Writing output to {output_file} ...")
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(output_lines))
+
+def main():
+    print("Loading players...")
+    acc = LongPassingAccumulator(event_scan.load_players(PLAYERS_FILE))
+
+    print("Loading primary positions...")
+    primary_position = event_scan.load_primary_positions(PRIMARY_POS_FILE)
+
+    # === Parse events ===
+    print("Processing event files...")
+    event_scan.scan_events([acc], EVENTS_DIR)
+
+    with instrumentation.stage("write"):
+        acc.write(primary_position)
+    print("Done.")
+
+if __name__ == "__main__":
+    main()
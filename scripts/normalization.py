@@ -0,0 +1,77 @@
+import numpy as np
+
+# Shared final-stage maths for the rating modules. Every function works on
+# whole arrays: one row per player and, for matrices, one column per
+# rating component.
+
+def component_matrix(rows, keys):
+    """Stack per-player component dicts into a players x components array."""
+    return np.array([[row[k] for k in keys] for row in rows], dtype=np.float64).reshape(len(rows), len(keys))
+
+def zscores(values):
+    """Column-wise z-scores using the sample standard deviation.
+
+    A column with fewer than two values or without spread is divided by 1.
+    Works on a single column (1-d array) as well.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    means = values.mean(axis=0)
+    if len(values) > 1:
+        stds = values.std(axis=0, ddof=1)
+        stds = np.where(stds == 0, 1.0, stds)
+    else:
+        stds = 1.0
+    return (values - means) / stds
+
+def games_shrinkage(games, prior_games):
+    """Per-player factor games / (games + prior_games) pulling scores toward 0."""
+    games = np.asarray(games, dtype=np.float64)
+    return games / (games + prior_games)
+
+def weighted_zscore_score(values, weights, games=None, prior_games=None):
+    """Weighted sum of component z-scores per player.
+
+    ``weights`` holds one weight per column. With games and prior_games,
+    each player's z-scores are first shrunk by games_shrinkage.
+    """
+    z = zscores(values)
+    if games is not None:
+        z = z * games_shrinkage(games, prior_games)[:, None]
+    return (z * np.asarray(weights, dtype=np.float64)).sum(axis=1)
+
+def role_blended_zscores(values, roles, anchor_weight, min_group_size=2):
+    """z-scores against a blend of the player's role group and all players.
+
+    Each role's mean and sample stdev are mixed with the global ones as
+    (1 - anchor_weight) * role + anchor_weight * global. Players in roles
+    with fewer than min_group_size members, or whose blended stdev is 0,
+    get 0.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return values
+    _, group = np.unique(np.asarray(roles, dtype=object).astype(str), return_inverse=True)
+    counts = np.bincount(group)
+
+    global_mean = values.mean()
+    global_std = values.std(ddof=1) if len(values) > 1 else 0.0
+    role_mean = np.bincount(group, weights=values) / counts
+    squares = np.bincount(group, weights=(values - role_mean[group]) ** 2)
+    role_std = np.sqrt(squares / np.maximum(counts - 1, 1))
+
+    blend_mean = (1 - anchor_weight) * role_mean + anchor_weight * global_mean
+    blend_std = (1 - anchor_weight) * role_std + anchor_weight * global_std
+
+    usable = (counts >= min_group_size) & (blend_std > 0)
+    safe_std = np.where(usable, blend_std, 1.0)
+    z = (values - blend_mean[group]) / safe_std[group]
+    return np.where(usable[group], z, 0.0)
+
+def bayesian_shrink(values, games, prior_weight, prior_mean):
+    """Shrink each player's value toward prior_mean, by prior_weight pseudo-games."""
+    games = np.asarray(games, dtype=np.float64)
+    return (games * np.asarray(values, dtype=np.float64) + prior_weight * prior_mean) / (games + prior_weight)
+
+def scale(z, target_mean, spread, low=0.0, high=100.0):
+    """Map z-scores onto target_mean + spread * z, clamped to [low, high]."""
+    return np.clip(target_mean + spread * np.asarray(z, dtype=np.float64), low, high)
@@ -1,9 +1,12 @@
 import os
-import json
 import math
-import codecs
-import pandas as pd
-from collections import defaultdict
+import event_scan
+import event_store
+import numpy as np
+import player_table
+import instrumentation
+import wyscout_tags
+from player_stats import PlayerStats
 
 # === SETTINGS ===
 DATA_DIR = "./"
@@ -12,14 +15,6 @@ PLAYERS_FILE = os.path.join(DATA_DIR, "data/players.json")
 PRIMARY_POS_FILE = os.path.join(DATA_DIR, "positions/player_primary_positions.csv")
 OUTPUT_FILE = os.path.join(DATA_DIR, "ratings/player_pace_rating.csv")
 
-# === ROLE MAP ===
-ROLE_MAP = {
-    "GK": "GK", "GKP": "GK",
-    "DF": "DF", "DEF": "DF",
-    "MD": "MD", "MID": "MD",
-    "FW": "FW", "FWD": "FW",
-}
-
 # === RATING WEIGHTS ===
 WEIGHTS = {
     "accelerations": 0.65,
@@ -32,6 +27,9 @@ WEIGHTS = {
 
 CARRY_DISTANCE_THRESHOLD = 20.0  # meters
 
+# Tag bitmasks (see wyscout_tags)
+COUNTERATTACK_BIT = wyscout_tags.bit(1901)
+
 def boost(score, a=1):
     base = 100 * score / (score + 1.3)
     if score > 7:
@@ -40,136 +38,152 @@ def boost(score, a=1):
         rating = base
     return rating
 
-# === Load players ===
-print("Loading players...")
-with open(PLAYERS_FILE, encoding="utf-8") as f:
-    players_raw = json.load(f)
-
-players = {}
-player_roles = {}
-for p in players_raw:
-    pid = p["wyId"]
-    name = p.get("shortName") or f'{p.get("firstName", "")} {p.get("lastName", "")}'
-    try:
-        name = codecs.decode(name, 'unicode_escape')
-    except Exception:
-        pass
-    players[pid] = name
-    role = p.get("role", {}).get("code3") or p.get("role", {}).get("code2") or "Unknown"
-    player_roles[pid] = ROLE_MAP.get(role.upper(), "Unknown")
-
-print(f"Loaded {len(players)} players.")
-
-# === Load primary positions for display only ===
-print("Loading primary positions...")
-primary_position = {}
-try:
-    position_df = pd.read_csv(PRIMARY_POS_FILE)
-    primary_position = dict(zip(position_df.playerId, position_df.best_fit_role))
-except Exception as e:
-    print("Warning: Could not load primary positions:", e)
-
-# === Initialize stats ===
-stats = defaultdict(lambda: {
-    "matches": set(),
-    "accelerations": 0,
-    "attacking_duels": 0,
-    "carries": 0,
-    "long_carries": 0,
-    "carry_distance": [],
-    "wide_runs": 0,
-    "counterattacks": 0,
-})
-
 # === Distance Function ===
 def distance(x1, y1, x2, y2):
     dx = (x2 - x1) * 1.2  # pitch length
     dy = (y2 - y1) * 0.8  # pitch width
     return math.sqrt(dx ** 2 + dy ** 2)
 
-# === Parse events ===
-print("Processing event files...")
-event_files = [f for f in os.listdir(EVENTS_DIR) if f.startswith("events_") and f.endswith(".json")]
+class PaceAccumulator:
+    def __init__(self, players):
+        self.players = player_table.name_map(players)
+        self.known_ids = players["wy_id"]
+        self.player_roles = player_table.role_map(players)
+        self.stats = PlayerStats(
+            ["accelerations", "attacking_duels", "carries", "long_carries", "wide_runs", "counterattacks"],
+            float_counters=["carry_distance"],
+        )
 
-for ef in event_files:
-    with open(os.path.join(EVENTS_DIR, ef), encoding="utf-8") as f:
-        events = json.load(f)
+    def merge(self, other):
+        self.stats.merge(other.stats)
 
-    for e in events:
+    def add(self, e):
         pid = e.get("playerId")
         mid = e.get("matchId")
-        if pid not in players or not mid:
-            continue
+        if pid not in self.players or not mid:
+            return
 
-        stats[pid]["matches"].add(mid)
+        st = self.stats
+        counts = st.counts
+        p = st.player(pid)
+        st.see(p, mid)
         event = e.get("eventName")
         sub = e.get("subEventName")
-        tags = [t.get("id") for t in e.get("tags", [])]
+        tags = wyscout_tags.event_tag_mask(e)
 
         pos = e.get("positions", [])
         if len(pos) < 2:
-            continue
+            return
 
         x1, y1 = pos[0].get("x", 0), pos[0].get("y", 0)
         x2, y2 = pos[-1].get("x", 0), pos[-1].get("y", 0)
         dist = distance(x1, y1, x2, y2)
 
         if event == "Others on the ball" and sub == "Acceleration":
-            stats[pid]["accelerations"] += 1
+            counts["accelerations"][p] += 1
 
         if event == "Duel" and sub == "Ground attacking duel":
-            stats[pid]["attacking_duels"] += 1
+            counts["attacking_duels"][p] += 1
 
         if event == "Others on the ball" and sub == "Touch":
-            stats[pid]["carries"] += 1
-            stats[pid]["carry_distance"].append(dist)
+            counts["carries"][p] += 1
+            counts["carry_distance"][p] += dist
             if dist >= CARRY_DISTANCE_THRESHOLD:
-                stats[pid]["long_carries"] += 1
+                counts["long_carries"][p] += 1
 
             if y1 <= 20 or y1 >= 80:
-                stats[pid]["wide_runs"] += 1
-
-        if 1901 in tags:
-            stats[pid]["counterattacks"] += 1
-
-# === Calculate Ratings ===
-print("Calculating pace ratings...")
-ratings = []
-
-for pid, s in stats.items():
-    games = len(s["matches"])
-    if games == 0:
-        continue
-
-    accels_pg = s["accelerations"] / games
-    duels_pg = s["attacking_duels"] / games
-    long_carries_pg = s["long_carries"] / games
-    wide_runs_pg = s["wide_runs"] / games
-    counter_pg = s["counterattacks"] / games
-    avg_carry_dist = sum(s["carry_distance"]) / len(s["carry_distance"]) if s["carry_distance"] else 0
-
-    raw_score = (
-        WEIGHTS["accelerations"] * accels_pg +
-        WEIGHTS["attacking_duels"] * duels_pg +
-        WEIGHTS["long_carries"] * long_carries_pg +
-        WEIGHTS["wide_runs"] * wide_runs_pg +
-        WEIGHTS["counterattacks"] * counter_pg +
-        WEIGHTS["distance_gained"] * (avg_carry_dist / 20)
-    )
-
-    raw_rating = boost(raw_score)
-    raw_rating = min(100.000, max(30.000, raw_rating))
-
-    ratings.append((pid, raw_rating, games, accels_pg, long_carries_pg, duels_pg, wide_runs_pg, counter_pg, avg_carry_dist))
-
-# === Write Output ===
-print("Writing output...")
-os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    f.write("Player,PrimaryPosition,Games,Accelerations,LongCarries,Duels,WideRuns,CounterAttacks,AvgCarryDistance,RawRating\n")
-    for pid, rating, g, a, lc, d, w, c, dist in ratings:
-        name = players[pid].replace('"', "'")
-        primary_pos = primary_position.get(pid, "Unknown")
-        f.write(f"{name},{primary_pos},{g},{a:.2f},{lc:.2f},{d:.2f},{w:.2f},{c:.2f},{dist:.2f},{rating:.3f}\n")
-
-print("Done.")
+                counts["wide_runs"][p] += 1
+
+        if tags & COUNTERATTACK_BIT:
+            counts["counterattacks"][p] += 1
+
+    def add_columns(self, chunk):
+        """add() for a chunk of store rows (see event_store.EventChunk)."""
+        rows = np.flatnonzero(chunk.known_player(self.known_ids) & (chunk.match_id != 0))
+        st = self.stats
+        codes = st.players(chunk.player_id[rows].tolist())
+        st.see_all(codes, chunk.match_id[rows].tolist())
+
+        with_positions = chunk.n_positions[rows] >= 2
+        rows, codes = rows[with_positions], codes[with_positions]
+        # A coordinate the event does not have counts as 0, as in add()
+        x1, y1, x2, y2 = (np.where(c[rows] == event_store.COORD_MISSING, 0, c[rows])
+                          for c in (chunk.start_x, chunk.start_y, chunk.end_x, chunk.end_y))
+        dist = np.array([distance(*c) for c in zip(x1.tolist(), y1.tolist(), x2.tolist(), y2.tolist())], dtype=np.float64)
+        others = chunk.is_event("Others on the ball")[rows]
+        touch = others & chunk.is_sub_event("Touch")[rows]
+
+        st.count("accelerations", codes[others & chunk.is_sub_event("Acceleration")[rows]])
+        st.count("attacking_duels", codes[(chunk.is_event("Duel") & chunk.is_sub_event("Ground attacking duel"))[rows]])
+        st.count("carries", codes[touch])
+        st.count("carry_distance", codes[touch], dist[touch])
+        st.count("long_carries", codes[touch & (dist >= CARRY_DISTANCE_THRESHOLD)])
+        st.count("wide_runs", codes[touch & ((y1 <= 20) | (y1 >= 80))])
+        st.count("counterattacks", codes[chunk.tagged(COUNTERATTACK_BIT)[rows]])
+
+    def write(self, primary_position, output_file=OUTPUT_FILE):
+        players = self.players
+
+        # === Calculate Ratings ===
+        print("Calculating pace ratings...")
+        ratings = []
+
+        for pid, s in self.stats.items():
+            games = s["games"]
+            if games == 0:
+                continue
+
+            accels_pg = s["accelerations"] / games
+            duels_pg = s["attacking_duels"] / games
+            long_carries_pg = s["long_carries"] / games
+            wide_runs_pg = s["wide_runs"] / games
+            counter_pg = s["counterattacks"] / games
+            avg_carry_dist = s["carry_distance"] / s["carries"] if s["carries"] else 0
+
+            raw_score = (
+                WEIGHTS["accelerations"] * accels_pg +
+                WEIGHTS["attacking_duels"] * duels_pg +
+                WEIGHTS["long_carries"] * long_carries_pg +
+                WEIGHTS["wide_runs"] * wide_runs_pg +
+                WEIGHTS["counterattacks"] * counter_pg +
+                WEIGHTS["distance_gained"] * (avg_carry_dist / 20)
+            )
+
+            raw_rating = boost(raw_score)
+            raw_rating = min(100.000, max(30.000, raw_rating))
+
+            ratings.append((pid, raw_rating, games, accels_pg, long_carries_pg, duels_pg, wide_runs_pg, counter_pg, avg_carry_dist))
+
+        # === Write Output ===
+        print("Writing output...")
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write("Player,PrimaryPosition,Games,Accelerations,LongCarries,Duels,WideRuns,CounterAttacks,AvgCarryDistance,RawRating\n")
+            for pid, rating, g, a, lc, d, w, c, dist in ratings:
+                name = players[pid].replace('"', "'")
+                primary_pos = primary_position.get(pid, "Unknown")
+                f.write(f"{name},{primary_pos},{g},{a:.2f},{lc:.2f},{d:.2f},{w:.2f},{c:.2f},{dist:.2f},{rating:.3f}\n")
+
+def main():
+    print("Loading players...")
+    acc = PaceAccumulator(event_scan.load_players(PLAYERS_FILE))
+    print(f"Loaded {len(acc.players)} players.")
+
+    # === Load primary positions for display only ===
+    print("Loading primary positions...")
+    primary_position = {}
+    try:
+        primary_position = event_scan.load_primary_positions(PRIMARY_POS_FILE)
+    except Exception as e:
+        print("Warning: Could not load primary positions:", e)
+
+    # === Parse events ===
+    print("Processing event files...")
+    event_scan.scan_events([acc], EVENTS_DIR)
+
+    with instrumentation.stage("write"):
+        acc.write(primary_position)
+    print("Done.")
+
+if __name__ == "__main__":
+    main()
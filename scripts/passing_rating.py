@@ -1,10 +1,12 @@
 import os
-import json
-import codecs
 import math
-import pandas as pd
-from collections import defaultdict
-from statistics import mean, stdev
+import event_scan
+import player_table
+import instrumentation
+import normalization
+import wyscout_tags
+import numpy as np
+from player_stats import PlayerStats
 
 # === SETTINGS ===
 DATA_DIR = "./"
@@ -18,6 +20,12 @@ THROUGH_PASS_TAG_ID = 901
 ASSIST_TAG_ID = 302
 FREE_KICK_TAG_ID = 801
 
+# Tag bitmasks (see wyscout_tags)
+PASS_BIT = wyscout_tags.bit(PASS_TAG_ID)
+THROUGH_PASS_BIT = wyscout_tags.bit(THROUGH_PASS_TAG_ID)
+FREE_KICK_BIT = wyscout_tags.bit(FREE_KICK_TAG_ID)
+ASSIST_BIT = wyscout_tags.bit(ASSIST_TAG_ID)
+
 WEIGHTS = {
     "passing_accuracy": 0.55,
     "avg_passes_per_game": 0.32,
@@ -48,151 +56,151 @@ def csv_escape(s):
     s = str(s)
     return f'"{s.replace("\"", "\"\"")}"' if "," in s or '"' in s else s
 
-# === Load players ===
-print("Loading players...")
-with open(PLAYERS_FILE, encoding="utf-8") as f:
-    players_raw = json.load(f)
-
-players = {}
-for p in players_raw:
-    pid = p["wyId"]
-    name = p.get("shortName") or f'{p.get("firstName", "")} {p.get("lastName", "").strip()}'
-    if "\\u" in name:
-        try:
-            name = codecs.decode(name, "unicode_escape")
-        except Exception:
-            pass
-    players[pid] = name
-
-print("Loading primary positions...")
-position_df = pd.read_csv(PRIMARY_POS_FILE)
-primary_position = dict(zip(position_df.playerId, position_df.best_fit_role))
-
-# === Initialize stats ===
-stats = defaultdict(lambda: {
-    "pass_total": 0,
-    "pass_success": 0,
-    "through_pass_total": 0,
-    "through_pass_success": 0,
-    "freekick_pass_total": 0,
-    "freekick_pass_success": 0,
-    "assist_total": 0,
-    "matches": set(),
-    "pass_attempts_per_match": defaultdict(int),
-    "pass_success_per_match": defaultdict(int),
-})
-
-print("Processing event files...")
-event_files = [f for f in os.listdir(EVENTS_DIR) if f.startswith("events_") and f.endswith(".json")]
-total_events = 0
-
-for ef in event_files:
-    path = os.path.join(EVENTS_DIR, ef)
-    with open(path, encoding="utf-8") as f:
-        events = json.load(f)
-
-    for e in events:
-        total_events += 1
+class PassingAccumulator:
+    def __init__(self, players):
+        self.players = player_table.name_map(players)
+        self.known_ids = players["wy_id"]
+        self.stats = PlayerStats(
+            ["pass_total", "pass_success", "through_pass_total", "through_pass_success",
+             "freekick_pass_total", "freekick_pass_success", "assist_total"],
+            ["pass_attempts_per_match", "pass_success_per_match"],
+        )
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+
+    def add(self, e):
         if e.get("eventName") != "Pass":
-            continue
+            return
 
         pid = e.get("playerId")
         mid = e.get("matchId")
-        if pid is None or mid is None or pid not in players:
-            continue
-
-        s = stats[pid]
-        s["matches"].add(mid)
-        s["pass_total"] += 1
-        s["pass_attempts_per_match"][mid] += 1
-
-        tags = [tag.get("id") for tag in e.get("tags", [])]
-
-        if PASS_TAG_ID in tags:
-            s["pass_success"] += 1
-            s["pass_success_per_match"][mid] += 1
-
-        if THROUGH_PASS_TAG_ID in tags:
-            s["through_pass_total"] += 1
-            if PASS_TAG_ID in tags:
-                s["through_pass_success"] += 1
-
-        if FREE_KICK_TAG_ID in tags:
-            s["freekick_pass_total"] += 1
-            if PASS_TAG_ID in tags:
-                s["freekick_pass_success"] += 1
-
-        if ASSIST_TAG_ID in tags:
-            s["assist_total"] += 1
-
-print(f"Processed {total_events} events.")
-
-# === Collect raw component values ===
-print("Calculating ratings...")
-component_values = defaultdict(list)
-player_components = {}
-
-for pid, s in stats.items():
-    games_played = len(s["matches"])
-    if games_played == 0:
-        continue
-
-    raw_pass_acc = s["pass_success"] / s["pass_total"] if s["pass_total"] > 0 else 0
-    raw_through_acc = s["through_pass_success"] / s["through_pass_total"] if s["through_pass_total"] > 0 else 0
-    raw_freekick_acc = s["freekick_pass_success"] / s["freekick_pass_total"] if s["freekick_pass_total"] > 0 else 0
-    raw_assists_pg = s["assist_total"] / games_played
-    raw_avg_pg = s["pass_total"] / games_played
-    raw_consistency = calculate_consistency(s["pass_attempts_per_match"], s["pass_success_per_match"])
-    raw_turnover_rate = 1 - raw_pass_acc
-
-    components = {
-        "pass_acc": raw_pass_acc,
-        "through_acc": raw_through_acc,
-        "freekick_acc": raw_freekick_acc,
-        "assists_pg": raw_assists_pg,
-        "avg_pg": raw_avg_pg,
-        "consistency": raw_consistency,
-        "turnover_rate": raw_turnover_rate,
-    }
-
-    for k, v in components.items():
-        component_values[k].append(v)
-    player_components[pid] = (components, games_played)
-
-component_means = {k: mean(v) for k, v in component_values.items()}
-component_stdevs = {k: stdev(v) if len(v) > 1 else 1.0 for k, v in component_values.items()}
-
-key_mapping = {
-    "pass_acc": "passing_accuracy",
-    "avg_pg": "avg_passes_per_game",
-    "through_acc": "through_pass_accuracy",
-    "freekick_acc": "freekick_accuracy",
-    "assists_pg": "assists_per_game",
-    "consistency": "passing_consistency",
-    "turnover_rate": "turnover_rate",
-}
-
-output_lines = ["Player,PrimaryPosition,Games," + ",".join(component_values.keys()) + ",Rating"]
-
-for pid, (components, games_played) in player_components.items():
-    shrinkage = games_played / (games_played + PRIOR_GAMES)
-    z_components = {
-        k: ((components[k] - component_means[k]) / (component_stdevs[k] or 1.0)) * shrinkage
-        for k in components
-    }
-
-    score = sum(WEIGHTS.get(key_mapping.get(k, k), 0) * z_components[k] for k in z_components)
-    scaled_rating = min(100.0, max(0.0, 80 + score * 10))
-
-    output_lines.append(",".join([
-        csv_escape(players.get(pid, f"Player {pid}")),
-        primary_position.get(pid, "Unknown"),
-        str(games_played),
-    ] + [f"{components[k]:.3f}" for k in component_values] + [f"{scaled_rating:.2f}"]))
-
-print(f"Writing output to {OUTPUT_FILE} ...")
-os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    f.write("\n".join(output_lines))
-
-print("Done.")
+        if pid is None or mid is None or pid not in self.players:
+            return
+
+        st = self.stats
+        counts = st.counts
+        p = st.player(pid)
+        row = st.pair(p, st.see(p, mid))
+        counts["pass_total"][p] += 1
+        st.match_counts["pass_attempts_per_match"][row] += 1
+
+        tags = wyscout_tags.event_tag_mask(e)
+
+        if tags & PASS_BIT:
+            counts["pass_success"][p] += 1
+            st.match_counts["pass_success_per_match"][row] += 1
+
+        if tags & THROUGH_PASS_BIT:
+            counts["through_pass_total"][p] += 1
+            if tags & PASS_BIT:
+                counts["through_pass_success"][p] += 1
+
+        if tags & FREE_KICK_BIT:
+            counts["freekick_pass_total"][p] += 1
+            if tags & PASS_BIT:
+                counts["freekick_pass_success"][p] += 1
+
+        if tags & ASSIST_BIT:
+            counts["assist_total"][p] += 1
+
+    def add_columns(self, chunk):
+        """add() for a chunk of store rows (see event_store.EventChunk)."""
+        rows = np.flatnonzero(chunk.is_event("Pass") & chunk.has_match & chunk.known_player(self.known_ids))
+        st = self.stats
+        codes = st.players(chunk.player_id[rows].tolist())
+        pair_rows = st.pairs(codes, st.see_all(codes, chunk.match_id[rows].tolist()))
+        success = chunk.tagged(PASS_BIT)[rows]
+        through = chunk.tagged(THROUGH_PASS_BIT)[rows]
+        freekick = chunk.tagged(FREE_KICK_BIT)[rows]
+
+        st.count("pass_total", codes)
+        st.count("pass_attempts_per_match", pair_rows)
+        st.count("pass_success", codes[success])
+        st.count("pass_success_per_match", pair_rows[success])
+        st.count("through_pass_total", codes[through])
+        st.count("through_pass_success", codes[through & success])
+        st.count("freekick_pass_total", codes[freekick])
+        st.count("freekick_pass_success", codes[freekick & success])
+        st.count("assist_total", codes[chunk.tagged(ASSIST_BIT)[rows]])
+
+    def write(self, primary_position, output_file=OUTPUT_FILE):
+        players = self.players
+
+        # === Collect raw component values ===
+        print("Calculating ratings...")
+        component_keys = ["pass_acc", "through_acc", "freekick_acc", "assists_pg", "avg_pg", "consistency", "turnover_rate"]
+        player_components = {}
+
+        for pid, s in self.stats.items():
+            games_played = s["games"]
+            if games_played == 0:
+                continue
+
+            raw_pass_acc = s["pass_success"] / s["pass_total"] if s["pass_total"] > 0 else 0
+            raw_through_acc = s["through_pass_success"] / s["through_pass_total"] if s["through_pass_total"] > 0 else 0
+            raw_freekick_acc = s["freekick_pass_success"] / s["freekick_pass_total"] if s["freekick_pass_total"] > 0 else 0
+            raw_assists_pg = s["assist_total"] / games_played
+            raw_avg_pg = s["pass_total"] / games_played
+            raw_consistency = calculate_consistency(s["pass_attempts_per_match"], s["pass_success_per_match"])
+            raw_turnover_rate = 1 - raw_pass_acc
+
+            components = {
+                "pass_acc": raw_pass_acc,
+                "through_acc": raw_through_acc,
+                "freekick_acc": raw_freekick_acc,
+                "assists_pg": raw_assists_pg,
+                "avg_pg": raw_avg_pg,
+                "consistency": raw_consistency,
+                "turnover_rate": raw_turnover_rate,
+            }
+            player_components[pid] = (components, games_played)
+
+        key_mapping = {
+            "pass_acc": "passing_accuracy",
+            "avg_pg": "avg_passes_per_game",
+            "through_acc": "through_pass_accuracy",
+            "freekick_acc": "freekick_accuracy",
+            "assists_pg": "assists_per_game",
+            "consistency": "passing_consistency",
+            "turnover_rate": "turnover_rate",
+        }
+
+        # === Shrunk z-scores, weighted and scaled for all players at once ===
+        values = normalization.component_matrix([c for c, _ in player_components.values()], component_keys)
+        games = np.array([g for _, g in player_components.values()])
+        weights = [WEIGHTS.get(key_mapping.get(k, k), 0) for k in component_keys]
+        scores = normalization.weighted_zscore_score(values, weights, games, PRIOR_GAMES)
+        scaled_ratings = normalization.scale(scores, 80, 10)
+
+        output_lines = ["Player,PrimaryPosition,Games," + ",".join(component_keys) + ",Rating"]
+
+        for (pid, (components, games_played)), scaled_rating in zip(player_components.items(), scaled_ratings.tolist()):
+            output_lines.append(",".join([
+                csv_escape(players.get(pid, f"Player {pid}")),
+                primary_position.get(pid, "Unknown"),
+                str(games_played),
+            ] + [f"{components[k]:.3f}" for k in component_keys] + [f"{scaled_rating:.2f}"]))
+
+        print(f"Writing output to {output_file} ...")
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(output_lines))
+
+def main():
+    print("Loading players...")
+    acc = PassingAccumulator(event_scan.load_players(PLAYERS_FILE))
+
+    print("Loading primary positions...")
+    primary_position = event_scan.load_primary_positions(PRIMARY_POS_FILE)
+
+    print("Processing event files...")
+    total_events = event_scan.scan_events([acc], EVENTS_DIR)
+    print(f"Processed {total_events} events.")
+
+    with instrumentation.stage("write"):
+        acc.write(primary_position)
+    print("Done.")
+
+if __name__ == "__main__":
+    main()
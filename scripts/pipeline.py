@@ -0,0 +1,269 @@
+import os
+import sys
+import ast
+import json
+import types
+import inspect
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import archives
+import event_scan
+import instrumentation
+import scan_state
+import player_positions
+import assign_primary_position
+from run_ratings import RATING_ACCUMULATORS
+
+# === SETTINGS ===
+PIPELINE_STATE_FILE = os.path.join(scan_state.CACHE_DIR, "pipeline_state.json")
+PIPELINE_VERSION = 1  # Bump to make every stage run again
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+# Code that drives the counting of every stage, besides what a stage module imports itself
+COMMON_MODULES = ["scan_state"]
+WRITE_WORKERS = os.cpu_count() or 1  # Rating modules written at once
+
+# === FINGERPRINTS ===
+def file_digest(path, digests):
+    """sha256 of a file's content, reused while its size and mtime are unchanged."""
+    sig = archives.signature(path)
+    cached = digests.get(path)
+    if cached and cached["size"] == sig["size"] and cached["mtime_ns"] == sig["mtime_ns"]:
+        return cached["sha256"]
+    h = hashlib.sha256()
+    with archives.open_binary(path) as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    digests[path] = {"size": sig["size"], "mtime_ns": sig["mtime_ns"], "sha256": h.hexdigest()}
+    return digests[path]["sha256"]
+
+def plain(value):
+    # Sets in any order hash alike
+    if isinstance(value, (set, frozenset)):
+        return sorted((plain(v) for v in value), key=repr)
+    if isinstance(value, dict):
+        return {str(k): plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain(v) for v in value]
+    return value
+
+def module_params(module):
+    """The module's settings: every UPPERCASE global that is plain data (WEIGHTS, priors, thresholds...)."""
+    params = {name: plain(value) for name, value in vars(module).items()
+              if name.isupper() and isinstance(value, (int, float, str, bool, list, tuple, dict, set, frozenset))}
+    return json.dumps(params, sort_keys=True, default=repr)
+
+def local_imports(names):
+    """Modules of scripts/ among names and all they import, directly or not, sorted."""
+    found, todo = set(), list(names)
+    while todo:
+        name = todo.pop()
+        path = os.path.join(SCRIPTS_DIR, name + ".py")
+        if name in found or not os.path.exists(path):
+            continue
+        found.add(name)
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                todo += [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                todo.append(node.module)
+    return sorted(found)
+
+def code_key(module):
+    """Hash of a stage module's source, its settings and the code it runs on."""
+    h = hashlib.sha256(str(PIPELINE_VERSION).encode())
+    for name in local_imports([module.__name__] + COMMON_MODULES):
+        with open(os.path.join(SCRIPTS_DIR, name + ".py"), "rb") as f:
+            h.update(f.read())
+    h.update(module_params(module).encode("utf-8"))
+    return h.hexdigest()
+
+def referenced_names(code):
+    """Global names a code object and the functions nested in it use."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= referenced_names(const)
+    return names
+
+def count_key(cls):
+    """Hash of what an accumulator's counts depend on.
+
+    That is the source of every method but write(), the module's functions
+    and settings those use and the code the module runs on, so editing
+    WEIGHTS or anything else only write() reads keeps the saved counts.
+    """
+    module = sys.modules[cls.__module__]
+    h = hashlib.sha256(str(PIPELINE_VERSION).encode())
+    for name in local_imports([module.__name__] + COMMON_MODULES):
+        if name != module.__name__:
+            with open(os.path.join(SCRIPTS_DIR, name + ".py"), "rb") as f:
+                h.update(f.read())
+    methods = [f for name, f in sorted(vars(cls).items()) if name != "write" and isinstance(f, types.FunctionType)]
+    names = set()
+    for f in methods:
+        h.update(inspect.getsource(f).encode("utf-8"))
+        names |= referenced_names(f.__code__)
+    done = set()
+    while names - done:
+        name = min(names - done)
+        done.add(name)
+        value = vars(module).get(name)
+        if isinstance(value, (types.ModuleType, type(None))):
+            continue
+        if isinstance(value, (types.FunctionType, type)):
+            # Helpers defined here; imported ones are covered by their module's source
+            if value.__module__ == module.__name__:
+                h.update(inspect.getsource(value).encode("utf-8"))
+                if isinstance(value, types.FunctionType):
+                    names |= referenced_names(value.__code__)
+            continue
+        h.update(f"{name}={json.dumps(plain(value), sort_keys=True, default=repr)}".encode("utf-8"))
+    return h.hexdigest()
+
+def stage_key(module, inputs):
+    """Key of one stage run: its code and settings plus the digests of its inputs."""
+    return hashlib.sha256(json.dumps([code_key(module), inputs]).encode("utf-8")).hexdigest()
+
+def load_pipeline_state(state_file=PIPELINE_STATE_FILE):
+    if os.path.exists(state_file):
+        try:
+            with open(state_file, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {"digests": {}, "stages": {}}
+
+def save_pipeline_state(state, state_file=PIPELINE_STATE_FILE):
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    with open(state_file + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(state_file + ".tmp", state_file)
+
+# === STAGES ===
+def _write_rating(args):
+    # Runs in a worker: write one rating module's CSV from its counts
+    acc, primary_position = args
+    mark = instrumentation.mark()
+    with instrumentation.stage(f"write_{type(acc).__module__}"):
+        acc.write(primary_position)
+    return instrumentation.collect(mark)
+
+def write_ratings(accumulators, primary_position, workers=None):
+    """Write the given rating modules, in parallel processes when there are several."""
+    workers = min(workers or WRITE_WORKERS, len(accumulators))
+    tasks = [(acc, primary_position) for acc in accumulators]
+    if workers <= 1:
+        results = [_write_rating(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_write_rating, tasks))
+    for records in results:
+        instrumentation.extend(records)
+
+def run(force=False, workers=None, plot_team=None, plot_names=None):
+    """Bring positions, primary positions and every rating up to date.
+
+    Stages run in dependency order: events and players.json -> positions ->
+    primary positions -> ratings (-> plots, when players to plot are
+    given). A stage is skipped while the content of its inputs, its code
+    and its settings hash to the key of its last run and its output still
+    exists, so changing one module's WEIGHTS rewrites only that module
+    from the saved counts.
+    """
+    state = load_pipeline_state()
+    digests = state["digests"]
+    ran = {}
+
+    players_digest = file_digest(event_scan.PLAYERS_FILE, digests)
+    events_digest = [(archives.name(p), file_digest(p, digests))
+                     for p in sorted(event_scan.list_event_files(event_scan.EVENTS_DIR))]
+    event_inputs = {"players": players_digest, "events": events_digest}
+
+    def stale(name, module, inputs, output_file):
+        key = stage_key(module, inputs)
+        ran[name] = key
+        return force or state["stages"].get(name) != key or not os.path.exists(output_file)
+
+    rating_modules = [sys.modules[cls.__module__] for cls in RATING_ACCUMULATORS]
+    players_table = None
+    accumulators = None
+
+    def players():
+        nonlocal players_table
+        if players_table is None:
+            print("Loading players...")
+            players_table = event_scan.load_players()
+        return players_table
+
+    def counts():
+        # Event counts for every stage, loaded (and brought up to date) once a stage needs them
+        nonlocal accumulators
+        if accumulators is None:
+            table = players()
+            with instrumentation.stage("count_events"):
+                accumulators, n_events = scan_state.refresh(
+                    [player_positions.PositionsAccumulator(table)] + [cls(table) for cls in RATING_ACCUMULATORS],
+                    workers=workers,
+                    count_keys=[count_key(player_positions.PositionsAccumulator)] + [count_key(cls) for cls in RATING_ACCUMULATORS],
+                )
+            print(f"Processed {n_events} events.")
+        return accumulators
+
+    positions = None
+    if stale("positions", player_positions, event_inputs, player_positions.OUTPUT_FILE):
+        positions = counts()[0]
+        with instrumentation.stage("positions"):
+            positions.write()
+        state["stages"]["positions"] = ran["positions"]
+    else:
+        print("positions: up to date, skipped.")
+
+    primary_file = assign_primary_position.OUTPUT_FILE
+    positions_digest = file_digest(player_positions.OUTPUT_FILE, digests)
+    if stale("primary", assign_primary_position, {"players": players_digest, "positions": positions_digest}, primary_file):
+        with instrumentation.stage("primary"):
+            # Straight from the in-memory role counts when they were just written
+            assign_primary_position.assign_primary_positions(players(), positions=positions)
+        state["stages"]["primary"] = ran["primary"]
+    else:
+        print("primary positions: up to date, skipped.")
+
+    # Ratings show the primary positions, so they depend on that file too
+    primary_digest = file_digest(primary_file, digests)
+    todo = []
+    for i, m in enumerate(rating_modules):
+        if stale(m.__name__, m, dict(event_inputs, primary=primary_digest), m.OUTPUT_FILE):
+            todo.append(i)
+        else:
+            print(f"{m.__name__}: up to date, skipped.")
+    if todo:
+        ratings = counts()[1:]
+        print(f"Writing {', '.join(rating_modules[i].__name__ for i in todo)}...")
+        write_ratings([ratings[i] for i in todo], event_scan.load_primary_positions(), workers)
+        for i in todo:
+            state["stages"][rating_modules[i].__name__] = ran[rating_modules[i].__name__]
+
+    save_pipeline_state(state)
+
+    if plot_team or plot_names:
+        # Plots keep their own per-figure cache, so unchanged figures are skipped there
+        import player_event_plotter
+        with instrumentation.stage("plots"):
+            player_event_plotter.plot_players(plot_names, plot_team, workers=workers)
+    print("Done.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run positions, primary positions and ratings, skipping up-to-date stages.")
+    parser.add_argument("--force", action="store_true", help="run every stage even if up to date")
+    parser.add_argument("--workers", type=int, help="processes for scanning, writing ratings and plotting (default: one per CPU)")
+    parser.add_argument("--plot-team", help="afterwards, plot every player of this team (name or wyId)")
+    parser.add_argument("--plot-names", nargs="+", help="afterwards, plot these players")
+    args = parser.parse_args()
+    run(args.force, args.workers, args.plot_team, args.plot_names)
+
+if __name__ == "__main__":
+    main()
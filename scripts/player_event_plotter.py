@@ -2,18 +2,48 @@ import os
 import math
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.collections import PolyCollection
 from mplsoccer import Pitch
 from scipy.stats import gaussian_kde
+from scipy.signal import fftconvolve
 import csv
+import argparse
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import event_reader
+import event_store
+import instrumentation
+import player_names
+import player_table
 
 DATA_DIR = "./"
 EVENTS_FOLDER = "player_events_output"
 SAVE_FOLDER = "player_event_data"
+PLAYERS_FILE = os.path.join(DATA_DIR, "data/players.json")
+EVENTS_DIR = os.path.join(DATA_DIR, "events")
+
+PLOT_BATCH_PLAYERS = 32  # Players whose events are held in memory and rendered together in batch mode
+
+PLOT_WORKERS = min(os.cpu_count() or 1, 8)  # Figures rendered at once; each process holds a figure in memory
+
+RENDER_MANIFEST = ".render_cache.json"  # Per output folder: PNG name -> hash of what it was drawn from
+RENDER_CACHE_VERSION = 1  # Bump when drawing code changes, to re-render everything
 
 COLORMAP = 'plasma'
+DPI = 300
+KDE_METHOD = 'binned'  # 'binned' (grid counts + FFT smoothing) or 'exact' (scipy gaussian_kde)
+KDE_GRID = (300, 200)  # Density grid points along the pitch length and width
+KDE_KERNEL_SIGMAS = 4  # Kernel is cut off this many standard deviations out
 SUCCESS_TAGS = {101, 703, 302, 1801}
 FAIL_TAGS = {1802, 701}
 
+# Arrow shape, matching ax.arrow(..., head_width=1.5, head_length=2, length_includes_head=True)
+ARROW_WIDTH = 0.001  # FancyArrow default stem width
+ARROW_HEAD_WIDTH = 1.5
+ARROW_HEAD_LENGTH = 2
+ARROW_LINE_WIDTH = 0.8
+
 def load_player_events(short_name):
     filepath = os.path.join(DATA_DIR, EVENTS_FOLDER, f"{short_name}_events.csv")
     if not os.path.exists(filepath):
@@ -36,12 +66,54 @@ def load_player_events(short_name):
                 'subEventName': row['subEventName'],
                 'startX': sx, 'startY': sy,
                 'endX': ex, 'endY': ey,
-                'tags': row['tags']
+                'tags': row['tags'],
+                'tagSet': parse_tags(row['tags'])
             })
     return events
 
-def arrow_color(tags_str):
-    tags = set(int(t.strip()) for t in tags_str.split(',') if t.strip().isdigit())
+def store_player_events(columns, meta, rows):
+    """The events load_player_events would read from an exported CSV, built
+    straight from event store rows (events without two full positions are left out)."""
+    rows = np.asarray(rows)
+    rows = rows[columns['n_positions'][rows] >= 2]
+    for name in ('start_x', 'start_y', 'end_x', 'end_y'):
+        rows = rows[columns[name][rows] != event_store.COORD_MISSING]
+    event_names = np.array(meta['event_names'], dtype=object)[columns['event_name'][rows]]
+    sub_event_names = np.array(meta['sub_event_names'], dtype=object)[columns['sub_event_name'][rows]]
+    sx = (columns['start_x'][rows] * 1.2).tolist()
+    sy = (columns['start_y'][rows] * 0.8).tolist()
+    ex = (columns['end_x'][rows] * 1.2).tolist()
+    ey = (columns['end_y'][rows] * 0.8).tolist()
+    tag_offsets, tag_ids = columns['tag_offsets'], columns['tag_ids']
+    starts, stops = tag_offsets[rows].tolist(), tag_offsets[rows + 1].tolist()
+
+    events = []
+    for i in range(len(rows)):
+        tags = tag_ids[starts[i]:stops[i]].tolist()
+        events.append({
+            'eventName': event_names[i],
+            'subEventName': sub_event_names[i],
+            'startX': sx[i], 'startY': sy[i],
+            'endX': ex[i], 'endY': ey[i],
+            'tags': ", ".join(map(str, tags)),
+            'tagSet': set(tags),
+        })
+    return events
+
+def group_events(events):
+    """eventName -> subEventName -> events, in order of first appearance."""
+    event_groups = {}
+    for ev in events:
+        event_groups.setdefault(ev['eventName'], {}).setdefault(ev['subEventName'], []).append(ev)
+    return event_groups
+
+def parse_tags(tags_str):
+    return set(int(t.strip()) for t in tags_str.split(',') if t.strip().isdigit())
+
+def arrow_color(tags):
+    """Colour for an event's tag set (a tag string is parsed first)."""
+    if isinstance(tags, str):
+        tags = parse_tags(tags)
     if tags & SUCCESS_TAGS:
         return 'green'
     if tags & FAIL_TAGS:
@@ -51,112 +123,385 @@ def arrow_color(tags_str):
 def is_corner_or_invalid(x, y):
     return (x, y) in [(0, 0), (0, 80), (120, 0), (120, 80)] or x < 0 or x > 120 or y < 0 or y > 80
 
-def plot_kde(ax, x, y, title):
+def kde_grid():
+    return np.meshgrid(np.linspace(0, 120, KDE_GRID[0]), np.linspace(0, 80, KDE_GRID[1]))
+
+def exact_density(x, y, xgrid, ygrid):
+    kde = gaussian_kde(np.vstack([x, y]))
+    return kde(np.vstack([xgrid.ravel(), ygrid.ravel()])).reshape(xgrid.shape)
+
+def binned_density(x, y, xgrid, ygrid):
+    """Fast approximation of exact_density, up to a constant factor.
+
+    Points are binned onto the grid nodes and the counts are convolved (via FFT) with the Gaussian kernel gaussian_kde would use:
+    the data covariance scaled by Scott's factor n ** (-1/6). The cost
+    depends on the grid size, not on the number of points.
+    """
+    xy = np.vstack([x, y]).astype(float)
+    n = xy.shape[1]
+    cov = np.cov(xy) * n ** (-2 / 6) if n > 1 else np.full((2, 2), np.nan)
+    if not np.all(np.isfinite(cov)) or np.linalg.det(cov) <= 0:
+        raise np.linalg.LinAlgError("Data covariance is singular")
+
+    # Linear binning: each point is shared between its four surrounding nodes
+    gx, gy = xgrid[0], ygrid[:, 0]
+    dx, dy = gx[1] - gx[0], gy[1] - gy[0]
+    fx = np.clip((xy[0] - gx[0]) / dx, 0, len(gx) - 1)
+    fy = np.clip((xy[1] - gy[0]) / dy, 0, len(gy) - 1)
+    ix = np.minimum(fx.astype(int), len(gx) - 2)
+    iy = np.minimum(fy.astype(int), len(gy) - 2)
+    wx, wy = fx - ix, fy - iy
+    counts = np.zeros(xgrid.size)
+    for off_y, w_y in ((0, 1 - wy), (1, wy)):
+        for off_x, w_x in ((0, 1 - wx), (1, wx)):
+            counts += np.bincount((iy + off_y) * len(gx) + ix + off_x, weights=w_y * w_x, minlength=xgrid.size)
+    counts = counts.reshape(xgrid.shape)
+
+    kx = min(int(np.ceil(KDE_KERNEL_SIGMAS * np.sqrt(cov[0, 0]) / dx)), len(gx) - 1)
+    ky = min(int(np.ceil(KDE_KERNEL_SIGMAS * np.sqrt(cov[1, 1]) / dy)), len(gy) - 1)
+    ox, oy = np.meshgrid(np.arange(-kx, kx + 1) * dx, np.arange(-ky, ky + 1) * dy)
+    inv = np.linalg.inv(cov)
+    kernel = np.exp(-0.5 * (inv[0, 0] * ox ** 2 + 2 * inv[0, 1] * ox * oy + inv[1, 1] * oy ** 2))
+
+    # FFT round-off can leave tiny negative values where there is no density
+    return np.clip(fftconvolve(counts, kernel, mode='same'), 0, None)
+
+def plot_kde(ax, x, y, title, method=None):
     if not x:
         ax.set_title(f"{title}\n(No data)", fontsize=10)
         return
     try:
-        xy = np.vstack([x, y])
-        kde = gaussian_kde(xy)
-        xgrid, ygrid = np.meshgrid(np.linspace(0, 120, 300), np.linspace(0, 80, 200))
-        z = kde(np.vstack([xgrid.ravel(), ygrid.ravel()])).reshape(xgrid.shape)
+        xgrid, ygrid = kde_grid()
+        if (method or KDE_METHOD) == 'exact':
+            z = exact_density(x, y, xgrid, ygrid)
+        else:
+            z = binned_density(x, y, xgrid, ygrid)
         z /= z.max()
         ax.pcolormesh(xgrid, ygrid, z, shading='gouraud', cmap=COLORMAP, alpha=0.7)
         ax.scatter(x, y, s=3, color='gray', alpha=0.1, zorder=10)
     except:
         ax.set_title(f"{title}\n(KDE failed)", fontsize=10)
 
+def arrow_polygons(sx, sy, ex, ey):
+    """Outlines of the FancyArrows ax.arrow would draw, as an (n, 8, 2) array.
+
+    Arrows must have nonzero length; plot_directions leaves the others out.
+    """
+    dx, dy = ex - sx, ey - sy
+    length = np.hypot(dx, dy)
+    hl, hw, lw = ARROW_HEAD_LENGTH, ARROW_HEAD_WIDTH / 2, ARROW_WIDTH / 2
+    zeros = np.zeros_like(length)
+
+    # Arrow along +x with its tip at (0, 0): tip, head, stem, tail, back up to the tip
+    u = np.stack([zeros, zeros - hl, zeros - hl, -length, -length, zeros - hl, zeros - hl, zeros], axis=1)
+    v = np.tile([0.0, -hw, -lw, -lw, lw, lw, hw, 0.0], (len(length), 1))
+
+    # Rotate onto (dx, dy) and move the tip to the end point
+    safe = np.where(length != 0, length, 1.0)
+    cos = np.where(length != 0, dx / safe, 0.0)[:, None]
+    sin = np.where(length != 0, dy / safe, 1.0)[:, None]
+    x = u * cos - v * sin + (sx + dx)[:, None]
+    y = u * sin + v * cos + (sy + dy)[:, None]
+    return np.stack([x, y], axis=2)
+
 def plot_directions(ax, events):
-    for ev in events:
-        sx, sy, ex, ey = ev['startX'], ev['startY'], ev['endX'], ev['endY']
-        color = arrow_color(ev['tags'])
-        if is_corner_or_invalid(ex, ey):
-            ax.scatter(sx, sy, color=color, s=15, alpha=1, zorder=10)
+    """Arrows for all events as one collection, plus one scatter of dots for
+    events whose end point is a corner or off the pitch."""
+    if not events:
+        return
+    colors = np.array([arrow_color(ev.get('tagSet', ev['tags'])) for ev in events])
+    dots = np.array([is_corner_or_invalid(ev['endX'], ev['endY']) for ev in events])
+    coords = np.array([(ev['startX'], ev['startY'], ev['endX'], ev['endY']) for ev in events], dtype=float)
+
+    # One collection keeps the per-event drawing order of overlapping arrows.
+    # An event ending where it starts has no direction, so it gets no arrow
+    moved = (coords[:, 0] != coords[:, 2]) | (coords[:, 1] != coords[:, 3])
+    arrows = ~dots & moved
+    if arrows.any():
+        sx, sy, ex, ey = coords[arrows].T
+        ax.add_collection(PolyCollection(
+            arrow_polygons(sx, sy, ex, ey), closed=True,
+            facecolors=colors[arrows], edgecolors=colors[arrows],
+            linewidths=ARROW_LINE_WIDTH, alpha=1, joinstyle="miter", capstyle="butt",
+        ))
+        ax.autoscale_view()
+    if dots.any():
+        ax.scatter(coords[dots, 0], coords[dots, 1], color=colors[dots], s=15, alpha=1, zorder=10)
+
+def render_event_figure(short_name, event_name, subev_dict, out_dir, kde_method=None):
+    subevents = sorted(subev_dict.keys())
+    n_rows = len(subevents)
+
+    fig, axs = plt.subplots(n_rows, 2, figsize=(8, 3 * n_rows))
+    if n_rows == 1:
+        axs = np.array([axs])  # keep 2D shape
+
+    pitch = Pitch(pitch_type='statsbomb', pitch_color='white', line_color='black')
+
+    for i, subev in enumerate(subevents):
+        evs = subev_dict[subev]
+        x = [e['startX'] for e in evs]
+        y = [e['startY'] for e in evs]
+
+        pitch.draw(ax=axs[i][0])
+        plot_kde(axs[i][0], x, y, "", kde_method)
+        axs[i][0].set_title(f"{subev} (heatmap)", fontsize=10)
+
+        pitch.draw(ax=axs[i][1])
+        plot_directions(axs[i][1], evs)
+        axs[i][1].set_title(f"{subev} (arrows/dots)", fontsize=10)
+
+    fig.suptitle(f"{event_name} - {short_name}", fontsize=14)
+    plt.tight_layout(rect=[0, 0, 1, 0.95])
+    save_path = os.path.join(out_dir, f"{event_name}_combined.png")
+    plt.savefig(save_path, dpi=DPI)
+    plt.close()
+    return f"Saved: {save_path}"
+
+def render_summary_plot(short_name, event_groups, mode, out_dir, kde_method=None):
+    n = len(event_groups)
+    n_cols = 3
+    n_rows = math.ceil(n / n_cols)
+    fig, axs = plt.subplots(n_rows, n_cols, figsize=(4*n_cols, 3*n_rows))
+    axs = axs.flatten()
+    pitch = Pitch(pitch_type='statsbomb', pitch_color='white', line_color='black')
+
+    for i, (event_name, subev_dict) in enumerate(event_groups.items()):
+        ax = axs[i]
+        pitch.draw(ax=ax)
+        events = [ev for evs in subev_dict.values() for ev in evs]
+        if mode == 'heatmap':
+            x = [ev['startX'] for ev in events]
+            y = [ev['startY'] for ev in events]
+            plot_kde(ax, x, y, "", kde_method)
         else:
-            ax.arrow(sx, sy, ex - sx, ey - sy, head_width=1.5, head_length=2,
-                     length_includes_head=True, color=color, alpha=1, lw=0.8)
+            plot_directions(ax, events)
+        ax.set_title(event_name, fontsize=10)
 
-def save_event_figures(short_name, event_groups):
-    out_dir = os.path.join(SAVE_FOLDER, f"{short_name}_data")
+    for j in range(i+1, len(axs)):
+        fig.delaxes(axs[j])
+
+    title = f"{short_name} - {'Start Heatmaps' if mode=='heatmap' else 'Arrows/Dots'}"
+    fig.suptitle(title, fontsize=16)
+    plt.tight_layout(rect=[0, 0, 1, 0.95])
+    fname = f"summary_{mode}.png"
+    plt.savefig(os.path.join(out_dir, fname), dpi=DPI)
+    plt.close()
+    return f"Saved summary: {fname}"
+
+def player_out_dir(stem):
+    # stem is the short name, with the wyId for players who share it (see player_names.file_stem)
+    out_dir = os.path.join(SAVE_FOLDER, f"{stem}_data")
     os.makedirs(out_dir, exist_ok=True)
+    return out_dir
+
+def events_digest(events):
+    """Hash of the event fields the figures are drawn from."""
+    h = hashlib.sha256()
+    for ev in events:
+        h.update(repr((ev['eventName'], ev['subEventName'], ev['startX'], ev['startY'],
+                       ev['endX'], ev['endY'], ev['tags'])).encode('utf-8'))
+    return h.hexdigest()
 
+def figure_key(kind, short_name, name, events, kde_method=None):
+    """Content address of one figure: its input events plus every plotting setting."""
+    settings = {
+        'version': RENDER_CACHE_VERSION,
+        'kind': kind,
+        'player': short_name,
+        'name': name,
+        'events': events_digest(events),
+        'colormap': COLORMAP,
+        'dpi': DPI,
+        'kde': [kde_method or KDE_METHOD, list(KDE_GRID), KDE_KERNEL_SIGMAS],
+        'tags': [sorted(SUCCESS_TAGS), sorted(FAIL_TAGS)],
+        'arrows': [ARROW_WIDTH, ARROW_HEAD_WIDTH, ARROW_HEAD_LENGTH, ARROW_LINE_WIDTH],
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+# A figure task is (render function, args, output path, cache key); each one draws and saves one PNG
+def event_figure_tasks(short_name, event_groups, kde_method=None, stem=None):
+    out_dir = player_out_dir(stem or short_name)
+    tasks = []
     for event_name, subev_dict in event_groups.items():
-        subevents = sorted(subev_dict.keys())
-        n_rows = len(subevents)
+        events = [ev for subev in sorted(subev_dict) for ev in subev_dict[subev]]
+        tasks.append((
+            render_event_figure, (short_name, event_name, subev_dict, out_dir, kde_method),
+            os.path.join(out_dir, f"{event_name}_combined.png"),
+            figure_key('event', short_name, event_name, events, kde_method),
+        ))
+    return tasks
 
-        fig, axs = plt.subplots(n_rows, 2, figsize=(8, 3 * n_rows))
-        if n_rows == 1:
-            axs = np.array([axs])  # keep 2D shape
+def summary_plot_tasks(short_name, event_groups, kde_method=None, stem=None):
+    out_dir = player_out_dir(stem or short_name)
+    events = [ev for subev_dict in event_groups.values() for evs in subev_dict.values() for ev in evs]
+    # Panel order and titles follow the event groups, so they are part of the key too
+    layout = ",".join(event_groups)
+    return [
+        (render_summary_plot, (short_name, event_groups, mode, out_dir, kde_method),
+         os.path.join(out_dir, f"summary_{mode}.png"),
+         figure_key('summary', short_name, f"{mode}:{layout}", events, kde_method))
+        for mode in ['heatmap', 'direction']
+    ]
 
-        pitch = Pitch(pitch_type='statsbomb', pitch_color='white', line_color='black')
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, RENDER_MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-        for i, subev in enumerate(subevents):
-            evs = subev_dict[subev]
-            x = [e['startX'] for e in evs]
-            y = [e['startY'] for e in evs]
+def save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, RENDER_MANIFEST)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
 
-            pitch.draw(ax=axs[i][0])
-            plot_kde(axs[i][0], x, y, "")
-            axs[i][0].set_title(f"{subev} (heatmap)", fontsize=10)
+def _use_agg():
+    plt.switch_backend('Agg')
 
-            pitch.draw(ax=axs[i][1])
-            plot_directions(axs[i][1], evs)
-            axs[i][1].set_title(f"{subev} (arrows/dots)", fontsize=10)
+def _run_task(task):
+    render, args = task[:2]
+    return render(*args)
 
-        fig.suptitle(f"{event_name} - {short_name}", fontsize=14)
-        plt.tight_layout(rect=[0, 0, 1, 0.95])
-        save_path = os.path.join(out_dir, f"{event_name}_combined.png")
-        plt.savefig(save_path, dpi=300)
-        plt.close()
-        print(f"Saved: {save_path}")
+def render_figures(tasks, workers=None, force=False):
+    """Render figure tasks, fanned out to a process pool when workers > 1.
 
-def save_summary_plots(short_name, event_groups):
-    out_dir = os.path.join(SAVE_FOLDER, f"{short_name}_data")
-    os.makedirs(out_dir, exist_ok=True)
+    A figure whose PNG exists and was drawn from the same cache key is
+    skipped unless force is set. Workers draw with the non-interactive Agg
+    backend. Progress is printed in task order as figures finish.
+    """
+    manifests = {}
+    todo = []
+    for task in tasks:
+        save_path, key = task[2], task[3]
+        out_dir, fname = os.path.split(save_path)
+        manifest = manifests.setdefault(out_dir, load_manifest(out_dir))
+        if not force and manifest.get(fname) == key and os.path.exists(save_path):
+            continue
+        todo.append(task)
+    stage = instrumentation.current()
+    stage.count("figures", len(todo))
+    if len(todo) < len(tasks):
+        stage.skip("unchanged", len(tasks) - len(todo))
+        print(f"{len(tasks) - len(todo)} of {len(tasks)} figures unchanged, skipped.")
+    if not todo:
+        return
+
+    def done(i, task, message):
+        print(f"[{i}/{len(todo)}] {message}")
+        out_dir, fname = os.path.split(task[2])
+        manifests[out_dir][fname] = task[3]
+        save_manifest(out_dir, manifests[out_dir])
+
+    workers = min(workers or PLOT_WORKERS, len(todo))
+    if workers <= 1:
+        for i, task in enumerate(todo, 1):
+            done(i, task, _run_task(task))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_use_agg) as pool:
+        for i, (task, message) in enumerate(zip(todo, pool.map(_run_task, todo)), 1):
+            done(i, task, message)
 
-    for mode in ['heatmap', 'direction']:
-        n = len(event_groups)
-        n_cols = 3
-        n_rows = math.ceil(n / n_cols)
-        fig, axs = plt.subplots(n_rows, n_cols, figsize=(4*n_cols, 3*n_rows))
-        axs = axs.flatten()
-        pitch = Pitch(pitch_type='statsbomb', pitch_color='white', line_color='black')
-
-        for i, (event_name, subev_dict) in enumerate(event_groups.items()):
-            ax = axs[i]
-            pitch.draw(ax=ax)
-            events = [ev for evs in subev_dict.values() for ev in evs]
-            if mode == 'heatmap':
-                x = [ev['startX'] for ev in events]
-                y = [ev['startY'] for ev in events]
-                plot_kde(ax, x, y, "")
-            else:
-                plot_directions(ax, events)
-            ax.set_title(event_name, fontsize=10)
-
-        for j in range(i+1, len(axs)):
-            fig.delaxes(axs[j])
-
-        title = f"{short_name} - {'Start Heatmaps' if mode=='heatmap' else 'Arrows/Dots'}"
-        fig.suptitle(title, fontsize=16)
-        plt.tight_layout(rect=[0, 0, 1, 0.95])
-        fname = f"summary_{mode}.png"
-        plt.savefig(os.path.join(out_dir, fname), dpi=300)
-        plt.close()
-        print(f"Saved summary: {fname}")
+def save_event_figures(short_name, event_groups, kde_method=None, workers=None, force=False):
+    render_figures(event_figure_tasks(short_name, event_groups, kde_method), workers, force)
+
+def save_summary_plots(short_name, event_groups, kde_method=None, workers=None, force=False):
+    render_figures(summary_plot_tasks(short_name, event_groups, kde_method), workers, force)
+
+def competition_rows(meta, competition):
+    """Store row range of events_<competition>.json, or None if there is no such file."""
+    wanted = f"events_{competition.strip().replace(' ', '_')}.json".lower()
+    for f in meta['files']:
+        if f['name'].lower() == wanted:
+            return f['start'], f['stop']
+    return None
+
+def player_store_rows(columns, player_id, row_range=None):
+    """A player's store rows, optionally limited to a (start, stop) row range."""
+    rows = event_store.player_rows(columns, player_id)
+    if row_range is not None:
+        rows = rows[(rows >= row_range[0]) & (rows < row_range[1])]
+    return rows
+
+def plot_players(short_names=None, team=None, role=None, competition=None, kde_method=None, workers=None, force=False):
+    """Plot every selected player from the indexed event store in one run.
+
+    Players are selected as in event_reader (names, team, role) and can be
+    limited to one competition. Their events come straight from the store's
+    player index, are grouped like single-player plots and all figures are
+    rendered through render_figures, PLOT_BATCH_PLAYERS players at a time.
+    """
+    players = player_table.load_players(PLAYERS_FILE)
+    columns, meta = event_reader.open_indexed_store(EVENTS_DIR)
+
+    team_id = None
+    if team is not None:
+        team_id = event_reader.find_team_id(team)
+        if team_id is None:
+            print(f"Team '{team}' not found in {event_reader.TEAMS_FILE}")
+            return
+
+    row_range = None
+    if competition is not None:
+        row_range = competition_rows(meta, competition)
+        if row_range is None:
+            print(f"Competition '{competition}' not found in {EVENTS_DIR}")
+            return
+
+    index = player_names.load_index(PLAYERS_FILE)
+    selected = event_reader.select_players(players, columns, index, short_names, team_id, role)
+
+    batch, n_players = [], 0
+    for n, player_id in enumerate(sorted(selected), 1):
+        rows = player_store_rows(columns, player_id, row_range)
+        if len(rows):
+            short_name = selected[player_id]
+            stem = player_names.file_stem(index, player_id)
+            event_groups = group_events(store_player_events(columns, meta, rows))
+            if event_groups:
+                batch += event_figure_tasks(short_name, event_groups, kde_method, stem)
+                batch += summary_plot_tasks(short_name, event_groups, kde_method, stem)
+                n_players += 1
+        if batch and (n_players % PLOT_BATCH_PLAYERS == 0 or n == len(selected)):
+            render_figures(batch, workers, force)
+            batch = []
+
+    print(f"Plotted {n_players} of {len(selected)} selected players.")
 
 def main():
+    parser = argparse.ArgumentParser(description="Plot event heatmaps and directions for players.")
+    parser.add_argument('--names', nargs='+', help="player short names to plot")
+    parser.add_argument('--team', help="plot every player of this team (name or wyId)")
+    parser.add_argument('--role', help="only players with this role (e.g. GK, DF, MD, FW)")
+    parser.add_argument('--competition', help="only events of this competition (e.g. England, European Championship)")
+    parser.add_argument('--kde', choices=['binned', 'exact'], help=f"density method (default: {KDE_METHOD})")
+    parser.add_argument('--workers', type=int, help=f"figures rendered in parallel (default: {PLOT_WORKERS})")
+    parser.add_argument('--force', action='store_true', help="re-render figures even if unchanged")
+    args = parser.parse_args()
+
+    if args.names or args.team or args.role or args.competition:
+        with instrumentation.stage("plot_players"):
+            plot_players(args.names, args.team, args.role, args.competition, args.kde, args.workers, args.force)
+        return
+
     short_name = input("Enter player short name (exact): ").strip()
     events = load_player_events(short_name)
     if not events:
         return
 
-    event_groups = {}
-    for ev in events:
-        event_groups.setdefault(ev['eventName'], {}).setdefault(ev['subEventName'], []).append(ev)
+    event_groups = group_events(events)
 
-    save_event_figures(short_name, event_groups)
-    save_summary_plots(short_name, event_groups)
+    # Every figure is independent, so all of them share one worker pool
+    with instrumentation.stage("plot_player"):
+        render_figures(
+            event_figure_tasks(short_name, event_groups, args.kde) + summary_plot_tasks(short_name, event_groups, args.kde),
+            args.workers, args.force,
+        )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,229 @@
+import os
+import codecs
+import pickle
+import bisect
+import unicodedata
+import archives
+import player_table
+
+# === SETTINGS ===
+DATA_DIR = "./"
+PLAYERS_FILE = os.path.join(DATA_DIR, "data/players.json")
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+INDEX_CACHE_FILE = os.path.join(CACHE_DIR, "player_names.pickle")
+INDEX_VERSION = 3
+
+MAX_EDIT_DISTANCE = 2  # Fuzzy matches further away than this are not suggested
+
+def fold(name):
+    """Accent- and case-insensitive form of a name used for matching."""
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return " ".join(name.casefold().split())
+
+def fold_query(query):
+    # Typed queries hold real characters, so only decode explicit \u escapes
+    if "\\u" in query:
+        try:
+            query = codecs.decode(query, "unicode_escape")
+        except Exception:
+            pass
+    return fold(query)
+
+def letter_mask(text):
+    # One bit per character (folded into 64), so letters missing from a key can be counted at once
+    mask = 0
+    for c in text:
+        mask |= 1 << (ord(c) & 63)
+    return mask
+
+def build_index(players):
+    names = player_table.name_map(players)    # playerId -> display name
+    exact = {}    # folded name -> [playerId, ...]
+    for pid, name in names.items():
+        exact.setdefault(fold(name), []).append(pid)
+
+    # Every folded name and each of its words, sorted for prefix search
+    keys = set()
+    for folded, pids in exact.items():
+        for key in [folded] + folded.split():
+            for pid in pids:
+                keys.add((key, pid))
+
+    # Full names and surnames bucketed by length, so fuzzy search only
+    # compares strings that can be within MAX_EDIT_DISTANCE
+    fuzzy_keys = {}
+    for folded, pids in exact.items():
+        words = folded.split()
+        candidates = {folded, words[-1]} if words else {folded}
+        for key in candidates:
+            fuzzy_keys.setdefault(len(key), []).append((key, letter_mask(key), pids))
+
+    return {
+        "names": names,
+        "teams": dict(zip(players["wy_id"].tolist(), players["team_id"].tolist())),
+        "exact": exact,
+        "prefix_keys": sorted(keys),
+        "fuzzy_keys": fuzzy_keys,
+    }
+
+def signature(path):
+    return (INDEX_VERSION, repr(archives.signature(path)))
+
+_loaded = {}
+
+def load_index(players_file=PLAYERS_FILE, cache_file=INDEX_CACHE_FILE):
+    """Name index for players_file, built once per players.json version.
+
+    The index is pickled next to other caches and memoized per process.
+    """
+    sig = signature(players_file)
+    cached = _loaded.get(players_file)
+    if cached and cached[0] == sig:
+        return cached[1]
+
+    index = None
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, "rb") as f:
+                stored_sig, stored_file, stored_index = pickle.load(f)
+            if stored_sig == sig and stored_file == os.path.abspath(players_file):
+                index = stored_index
+        except Exception:
+            index = None
+
+    if index is None:
+        index = build_index(player_table.load_players(players_file))
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(cache_file, "wb") as f:
+            pickle.dump((sig, os.path.abspath(players_file), index), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    _loaded[players_file] = (sig, index)
+    return index
+
+def find_exact(index, query):
+    return list(index["exact"].get(fold_query(query), []))
+
+def find_prefix(index, query, limit=10):
+    """Players whose name, or any word of it, starts with query."""
+    q = fold_query(query)
+    if not q:
+        return []
+    keys = index["prefix_keys"]
+    found = []
+    i = bisect.bisect_left(keys, (q,))
+    while i < len(keys) and keys[i][0].startswith(q):
+        pid = keys[i][1]
+        if pid not in found:
+            found.append(pid)
+            if len(found) >= limit:
+                break
+        i += 1
+    return found
+
+def edit_distance(a, b, max_distance):
+    """Levenshtein distance, or max_distance + 1 once it is certainly larger.
+
+    Only the diagonal band of width max_distance is filled in.
+    """
+    too_far = max_distance + 1
+    if abs(len(a) - len(b)) > max_distance:
+        return too_far
+    if len(a) > len(b):
+        a, b = b, a
+    previous = [j if j <= max_distance else too_far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        ca = a[i - 1]
+        lo = max(1, i - max_distance)
+        hi = min(len(b), i + max_distance)
+        current = [too_far] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        row_min = current[lo - 1]
+        for j in range(lo, hi + 1):
+            d = previous[j - 1] + (ca != b[j - 1])
+            if previous[j] + 1 < d:
+                d = previous[j] + 1
+            if current[j - 1] + 1 < d:
+                d = current[j - 1] + 1
+            current[j] = d
+            if d < row_min:
+                row_min = d
+        if row_min > max_distance:
+            return too_far
+        previous = current
+    return min(previous[-1], too_far)
+
+def find_fuzzy(index, query, max_distance=MAX_EDIT_DISTANCE, limit=5):
+    """Closest players by edit distance to the full name or its last word.
+
+    Only keys within max_distance in length are looked at, and keys
+    missing more than max_distance of the query's letters are skipped
+    before the banded edit distance. With the full players.json this
+    still takes up to a few milliseconds per query (about 4 ms for short
+    ones such as "Nymar"), against microseconds for exact and prefix
+    lookups, so it only runs once those find nothing.
+    """
+    q = fold_query(query)
+    q_mask = letter_mask(q)
+    q_counts = {c: q.count(c) for c in set(q)}
+    best = {}
+    for length in range(len(q) - max_distance, len(q) + max_distance + 1):
+        for key, key_mask, pids in index["fuzzy_keys"].get(length, ()):
+            # Each character of q missing from key costs at least one edit
+            if (q_mask & ~key_mask).bit_count() > max_distance:
+                continue
+            missing = 0
+            for c, n in q_counts.items():
+                if n > key.count(c):
+                    missing += n - key.count(c)
+            if missing > max_distance:
+                continue
+            d = edit_distance(q, key, max_distance)
+            if d <= max_distance:
+                for pid in pids:
+                    if pid not in best or d < best[pid][0]:
+                        best[pid] = (d, key)
+    ranked = sorted(best.items(), key=lambda item: (item[1], item[0]))
+    return [pid for pid, _ in ranked[:limit]]
+
+def resolve(index, query, limit=5):
+    """Return (playerId or None, suggested playerIds) for a typed name.
+
+    A wyId picks that player. A name several players share picks none of
+    them and suggests them all; see ambiguous().
+    """
+    query = query.strip()
+    if query.isdigit() and int(query) in index["names"]:
+        return int(query), []
+    matches = find_exact(index, query)
+    if len(matches) == 1:
+        return matches[0], []
+    if matches:
+        return None, matches
+    suggestions = find_prefix(index, query, limit)
+    for pid in find_fuzzy(index, query, limit=limit):
+        if pid not in suggestions:
+            suggestions.append(pid)
+    return None, suggestions[:limit]
+
+def ambiguous(index, query, pids):
+    """Whether resolve() found no player because pids all share the name query."""
+    return len(pids) > 1 and pids == find_exact(index, query)
+
+def file_stem(index, player_id):
+    """Name of a player's output files: the short name, plus the wyId when
+    other players' names fold to the same one (so their files stay apart)."""
+    name = index["names"][player_id]
+    if len(index["exact"].get(fold(name), ())) > 1:
+        return f"{name}_{player_id}"
+    return name
+
+def ambiguity_text(index, query, pids):
+    return f"'{query}' is the name of {len(pids)} players: {suggestion_text(index, pids)}. Give the wyId to pick one"
+
+def suggestion_text(index, pids):
+    names = [index["names"][pid] for pid in pids]
+    # Players sharing a name are told apart by wyId and team
+    return ", ".join(f"'{name}' (wyId {pid}, teamId {index['teams'][pid]})" if names.count(name) > 1 else f"'{name}'"
+                     for pid, name in zip(pids, names))
@@ -1,16 +1,22 @@
-import json
+import numpy as np
 import pandas as pd
-from collections import defaultdict
 import os
-import re
+from array import array
 from math import dist
-import codecs
+import event_scan
+import event_store
+import instrumentation
+import player_table
 
 # File paths
 EVENTS_DIR = "./events"
 PLAYERS_FILE = "./data/players.json"
 OUTPUT_FILE = "./positions/player_positions.csv"
 
+GRID_SIZE = 101  # Wyscout coordinates are whole numbers from 0 to 100
+FLUSH_EVENTS = 65536  # Buffered positions turned into role counts at a time
+NEVER = np.iinfo(np.int64).max
+
 ROLE_CENTERS = {
     "gk": (5, 50),        # Goalkeeper
 
@@ -46,80 +52,184 @@ EXCLUDE_EVENTS = {
     "Offside", "Goal Kick", "Substitution", "Injury", "Whistle"
 }
 
-# Decode and clean name
-def clean_name(name):
-    if not isinstance(name, str):
-        return ""
-    try:
-        name = codecs.decode(name, "unicode_escape")
-    except:
-        pass
-    name = re.sub(r'[\uE000-\uF8FF\u200B-\u200F\u2060-\u206F]', '', name)
-    return name.strip()
-
 # Closest role to (x, y)
 def get_closest_role(x, y):
     return min(ROLE_CENTERS.items(), key=lambda item: dist((x, y), item[1]))[0]
 
-# Load players
-with open(PLAYERS_FILE, "r", encoding="utf-8") as f:
-    player_data = json.load(f)
-
-player_id_to_name = {
-    player["wyId"]: clean_name(
-        player.get("shortName") or f"{player.get('firstName', '')} {player.get('lastName', '')}".strip()
-    )
-    for player in player_data
-}
-
-# Initialize role counts
-player_roles = defaultdict(lambda: defaultdict(int))
-included = excluded = missing_xy = skipped_no_player = 0
-
-# Process all event files
-event_files = [f for f in os.listdir(EVENTS_DIR) if f.startswith("events_") and f.endswith(".json")]
-
-for filename in event_files:
-    filepath = os.path.join(EVENTS_DIR, filename)
-    with open(filepath, "r", encoding="utf-8") as f:
-        events = json.load(f)
-
-    for event in events:
+_lookups = {}
+
+def role_lookup():
+    """Role names and nearest-role lookup table for the current ROLE_CENTERS.
+
+    lookup[x * GRID_SIZE + y] is the code (index into the names) of the
+    role closest to the pitch point (x, y). The GRID_SIZE**2 + code entries
+    map each code to itself, for positions resolved by get_closest_role.
+    The table is rebuilt whenever ROLE_CENTERS changes.
+    """
+    key = tuple(ROLE_CENTERS.items())
+    if key not in _lookups:
+        names = list(ROLE_CENTERS)
+        centers = np.array([ROLE_CENTERS[r] for r in names], dtype=np.float64)
+        coords = np.arange(GRID_SIZE, dtype=np.float64)
+        dx = coords[:, None, None] - centers[:, 0]
+        dy = coords[None, :, None] - centers[:, 1]
+        # argmin keeps the first of equally close roles, like min() does
+        grid = np.argmin(dx ** 2 + dy ** 2, axis=2)
+        lookup = np.concatenate([grid.ravel(), np.arange(len(names))]).astype(np.uint8)
+        _lookups[key] = (names, lookup)
+    return _lookups[key]
+
+class PositionsAccumulator:
+    def __init__(self, players):
+        self.player_id_to_name = player_table.name_map(players)
+
+        # Role counts: counts[code, role] with players coded in first-seen order.
+        # first_seen holds the included-event number that first counted each
+        # (player, role), so rows keep the order of the original per-event loop.
+        self.role_names, self.role_lookup = role_lookup()
+        self.player_codes = {}
+        self.counts = np.zeros((0, len(self.role_names)), dtype=np.int64)
+        self.first_seen = np.zeros((0, len(self.role_names)), dtype=np.int64)
+        self._codes, self._cells = array("i"), array("i")
+        self.included = self.excluded = self.missing_xy = self.skipped_no_player = 0
+
+    def _grow(self):
+        missing = len(self.player_codes) - len(self.counts)
+        if missing > 0:
+            n_roles = len(self.role_names)
+            self.counts = np.vstack([self.counts, np.zeros((missing, n_roles), dtype=np.int64)])
+            self.first_seen = np.vstack([self.first_seen, np.full((missing, n_roles), NEVER, dtype=np.int64)])
+
+    def flush(self):
+        """Count the buffered positions: one table lookup and one bincount."""
+        if not self._cells:
+            return
+        self._grow()
+        n_roles = len(self.role_names)
+        roles = self.role_lookup[np.frombuffer(self._cells, dtype=np.int32)]
+        keys = np.frombuffer(self._codes, dtype=np.int32).astype(np.int64) * n_roles + roles
+        self.counts += np.bincount(keys, minlength=self.counts.size).reshape(self.counts.shape)
+
+        first_seen = self.first_seen.reshape(-1)
+        pairs, first = np.unique(keys, return_index=True)
+        base = self.included - len(self._cells)
+        first_seen[pairs] = np.minimum(first_seen[pairs], base + first)
+        self._codes, self._cells = array("i"), array("i")
+
+    def merge(self, other):
+        if other.role_names != self.role_names:
+            raise ValueError("Cannot merge role counts built from different ROLE_CENTERS")
+        self.flush()
+        other.flush()
+        codes = np.array(
+            [self.player_codes.setdefault(pid, len(self.player_codes)) for pid in other.player_codes],
+            dtype=np.int64,
+        )
+        self._grow()
+        if len(codes):
+            self.counts[codes] += other.counts
+            # other's events come after all of ours
+            other_first = np.where(other.first_seen == NEVER, NEVER, other.first_seen + self.included)
+            self.first_seen[codes] = np.minimum(self.first_seen[codes], other_first)
+        self.included += other.included
+        self.excluded += other.excluded
+        self.missing_xy += other.missing_xy
+        self.skipped_no_player += other.skipped_no_player
+
+    def add(self, event):
         player_id = event.get("playerId")
         if not player_id:
-            skipped_no_player += 1
-            continue
+            self.skipped_no_player += 1
+            return
 
         if event.get("eventName") in EXCLUDE_EVENTS:
-            excluded += 1
-            continue
+            self.excluded += 1
+            return
 
         positions = event.get("positions")
         if not positions or "x" not in positions[0] or "y" not in positions[0]:
-            missing_xy += 1
-            continue
+            self.missing_xy += 1
+            return
 
         x, y = positions[0]["x"], positions[0]["y"]
-        role = get_closest_role(x, y)
-        player_roles[player_id][role] += 1
-        included += 1
-
-# Write output
-records = []
-for player_id, roles in player_roles.items():
-    name = player_id_to_name.get(player_id, f"Unknown ({player_id})")
-    for role, count in roles.items():
-        records.append({
-            "playerId": player_id,
-            "name": name,
-            "role": role,
-            "count": count
-        })
-
-df = pd.DataFrame(records)
-df = df.sort_values(by=["name", "count"], ascending=[True, False])
-os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-df.to_csv(OUTPUT_FILE, index=False, encoding="utf-8-sig")
-
-print(f"Saved player role frequencies to {OUTPUT_FILE}")
-print(f"Included: {included}, Excluded: {excluded}, No XY: {missing_xy}, No playerId: {skipped_no_player}")
+        if type(x) is int and type(y) is int and 0 <= x < GRID_SIZE and 0 <= y < GRID_SIZE:
+            cell = x * GRID_SIZE + y
+        else:
+            cell = GRID_SIZE * GRID_SIZE + self.role_names.index(get_closest_role(x, y))
+        self._codes.append(self.player_codes.setdefault(player_id, len(self.player_codes)))
+        self._cells.append(cell)
+        self.included += 1
+        if len(self._cells) >= FLUSH_EVENTS:
+            self.flush()
+
+    def add_columns(self, chunk):
+        """add() for a chunk of store rows (see event_store.EventChunk)."""
+        no_player = ~chunk.has_player | (chunk.player_id == 0)
+        excluded = ~no_player & chunk.is_event(*EXCLUDE_EVENTS)
+        rows = np.flatnonzero(~no_player & ~excluded)
+        x, y = chunk.start_x[rows], chunk.start_y[rows]
+        has_xy = (chunk.n_positions[rows] > 0) & (x != event_store.COORD_MISSING) & (y != event_store.COORD_MISSING)
+        rows, x, y = rows[has_xy], x[has_xy].astype(np.int32), y[has_xy].astype(np.int32)
+
+        cells = x * GRID_SIZE + y
+        off_grid = np.flatnonzero((x >= GRID_SIZE) | (y >= GRID_SIZE))
+        for i, xi, yi in zip(off_grid.tolist(), x[off_grid].tolist(), y[off_grid].tolist()):
+            cells[i] = GRID_SIZE * GRID_SIZE + self.role_names.index(get_closest_role(xi, yi))
+        codes = self.player_codes
+        self._codes.extend([codes.setdefault(pid, len(codes)) for pid in chunk.player_id[rows].tolist()])
+        self._cells.extend(cells.tolist())
+
+        self.skipped_no_player += int(no_player.sum())
+        self.excluded += int(excluded.sum())
+        self.missing_xy += len(has_xy) - len(rows)
+        self.included += len(rows)
+        if len(self._cells) >= FLUSH_EVENTS:
+            self.flush()
+
+    def skip_counts(self):
+        """Events left out of the role counts, by reason."""
+        return {"no_player": self.skipped_no_player, "excluded_event": self.excluded, "missing_xy": self.missing_xy}
+
+    def role_counts(self):
+        """Nonzero (playerId, role, count) rows as arrays.
+
+        Players come in first-seen order and each player's roles in the
+        order they were first counted.
+        """
+        self.flush()
+        codes, roles = np.nonzero(self.counts)
+        order = np.lexsort((self.first_seen[codes, roles], codes))
+        codes, roles = codes[order], roles[order]
+        player_ids = np.array(list(self.player_codes), dtype=np.int64)
+        return player_ids[codes], np.array(self.role_names, dtype=object)[roles], self.counts[codes, roles]
+
+    def write(self, output_file=OUTPUT_FILE):
+        player_ids, roles, counts = self.role_counts()
+        records = {
+            "playerId": player_ids,
+            "name": [self.player_id_to_name.get(pid, f"Unknown ({pid})") for pid in player_ids.tolist()],
+            "role": roles,
+            "count": counts,
+        }
+
+        df = pd.DataFrame(records)
+        df = df.sort_values(by=["name", "count"], ascending=[True, False])
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        df.to_csv(output_file, index=False, encoding="utf-8-sig")
+
+        print(f"Saved player role frequencies to {output_file}")
+        print(f"Included: {self.included}, Excluded: {self.excluded}, No XY: {self.missing_xy}, No playerId: {self.skipped_no_player}")
+
+def main():
+    # Load players
+    acc = PositionsAccumulator(event_scan.load_players(PLAYERS_FILE))
+
+    # Process all event files
+    event_scan.scan_events([acc], EVENTS_DIR)
+
+    # Write output
+    with instrumentation.stage("write"):
+        acc.write()
+
+if __name__ == "__main__":
+    main()
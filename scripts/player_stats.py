@@ -0,0 +1,169 @@
+import numpy as np
+from array import array
+
+class PlayerStats:
+    """Per-player counters of a rating module, held in typed arrays.
+
+    Players get a compact index in first-seen order and every counter is
+    an array indexed by it. Per-match counters live in sparse (player,
+    match) rows, created on first use and chained per player; the matches
+    a player appeared in are a bitmap over match indices. Compared with a
+    dict, a set and defaultdicts per player this is a few bytes per value.
+    """
+
+    def __init__(self, counters=(), match_counters=(), float_counters=()):
+        self.codes = {}  # playerId -> compact player index
+        self.player_ids = array("q")
+        self.match_codes = {}  # matchId -> match index
+        self.match_ids = array("q")
+        self.counts = {name: array("q") for name in counters}
+        self.counts.update({name: array("d") for name in float_counters})
+        self.match_bits = []  # Per player: bytearray bitmap of match indices
+        self.last_match = array("i")  # Per player: match index marked last, so repeats skip the bitmap
+
+        # (player, match) rows; last_pair heads each player's chain, newest first
+        self.pair_player = array("i")
+        self.pair_match = array("i")
+        self.pair_next = array("i")
+        self.last_pair = array("i")
+        self.match_counts = {name: array("q") for name in match_counters}
+
+    def __len__(self):
+        return len(self.player_ids)
+
+    def player(self, pid):
+        """Compact index of a player, added with zeroed counters on first sight."""
+        code = self.codes.get(pid)
+        if code is None:
+            code = self.codes[pid] = len(self.player_ids)
+            self.player_ids.append(pid)
+            for column in self.counts.values():
+                column.append(0)
+            self.match_bits.append(bytearray())
+            self.last_match.append(-1)
+            self.last_pair.append(-1)
+        return code
+
+    def match(self, mid):
+        m = self.match_codes.get(mid)
+        if m is None:
+            m = self.match_codes[mid] = len(self.match_ids)
+            self.match_ids.append(mid)
+        return m
+
+    def mark(self, code, m):
+        bits = self.match_bits[code]
+        byte = m >> 3
+        if byte >= len(bits):
+            bits.extend(bytes(byte + 1 - len(bits)))
+        bits[byte] |= 1 << (m & 7)
+
+    def see(self, code, mid):
+        """Record that the player appeared in match mid; returns its match index."""
+        m = self.match_codes.get(mid)
+        if m is None:
+            m = self.match(mid)
+        if self.last_match[code] != m:
+            self.last_match[code] = m
+            self.mark(code, m)
+        return m
+
+    def pair(self, code, m):
+        """Row of the player's counters for match index m, created on first use."""
+        row = self.last_pair[code]
+        # Events of a match come together, so this is almost always the head
+        while row != -1 and self.pair_match[row] != m:
+            row = self.pair_next[row]
+        if row == -1:
+            row = len(self.pair_player)
+            self.pair_player.append(code)
+            self.pair_match.append(m)
+            self.pair_next.append(self.last_pair[code])
+            self.last_pair[code] = row
+            for column in self.match_counts.values():
+                column.append(0)
+        return row
+
+    # Bulk forms of the above, for a chunk of events read column-wise. They
+    # take the events in order, so players, matches and rows get the same
+    # indices as feeding the events one by one.
+
+    def players(self, pids):
+        """Compact index of each playerId, as an array."""
+        codes = self.codes
+        return np.array([codes[pid] if pid in codes else self.player(pid) for pid in pids], dtype=np.int64)
+
+    def see_all(self, codes, mids):
+        """see() for each (player index, matchId); returns the match indices."""
+        match_codes, last_match = self.match_codes, self.last_match
+        ms = []
+        for code, mid in zip(codes.tolist(), mids):
+            m = match_codes.get(mid)
+            if m is None:
+                m = self.match(mid)
+            if last_match[code] != m:
+                last_match[code] = m
+                self.mark(code, m)
+            ms.append(m)
+        return np.array(ms, dtype=np.int64)
+
+    def pairs(self, codes, ms):
+        """pair() for each (player index, match index); returns the rows."""
+        return np.array([self.pair(c, m) for c, m in zip(codes.tolist(), ms.tolist())], dtype=np.int64)
+
+    def count(self, name, index, values=None):
+        """Add values (1 each by default) to a counter at each index.
+
+        index holds player indices for player counters and rows for
+        per-match counters. Float counters are added to one value at a
+        time, so they round exactly as when counted event by event.
+        """
+        column = self.counts[name] if name in self.counts else self.match_counts[name]
+        if not len(index):
+            return
+        if column.typecode == "d":
+            for i, value in zip(index.tolist(), values.tolist()):
+                column[i] += value
+            return
+        view = np.frombuffer(column, dtype=np.int64)
+        np.add.at(view, index, 1 if values is None else values)
+
+    def games(self):
+        """Number of matches per player, by compact index."""
+        return [int.from_bytes(bits, "little").bit_count() for bits in self.match_bits]
+
+    def merge(self, other):
+        """Add another scan's counts. Players and matches new here are
+        appended in other's order, so merging partial results in file
+        order gives the same layout as one serial scan."""
+        match_map = [self.match(mid) for mid in other.match_ids]
+        for q, pid in enumerate(other.player_ids):
+            p = self.player(pid)
+            for name, column in other.counts.items():
+                self.counts[name][p] += column[q]
+            for byte, value in enumerate(other.match_bits[q]):
+                for bit in range(8):
+                    if value >> bit & 1:
+                        self.mark(p, match_map[byte * 8 + bit])
+        for r, q in enumerate(other.pair_player):
+            row = self.pair(self.codes[other.player_ids[q]], match_map[other.pair_match[r]])
+            for name, column in other.match_counts.items():
+                self.match_counts[name][row] += column[r]
+
+    def items(self):
+        """(playerId, stats) per player in first-seen order, for writing ratings.
+
+        stats maps every counter to the player's total, "games" to the
+        number of matches played and every per-match counter to a
+        {matchId: count} dict in the order the matches were first counted.
+        """
+        games = self.games()
+        rows = [[] for _ in self.player_ids]
+        for r, code in enumerate(self.pair_player):
+            rows[code].append(r)
+        for code, pid in enumerate(self.player_ids):
+            s = {name: column[code] for name, column in self.counts.items()}
+            s["games"] = games[code]
+            for name, column in self.match_counts.items():
+                s[name] = {self.match_ids[self.pair_match[r]]: column[r] for r in rows[code]}
+            yield pid, s
@@ -0,0 +1,131 @@
+import os
+import re
+import json
+import codecs
+import numpy as np
+import archives
+
+# === SETTINGS ===
+DATA_DIR = "./"
+PLAYERS_FILE = os.path.join(DATA_DIR, "data/players.json")
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+TABLE_CACHE_FILE = os.path.join(CACHE_DIR, "players_table.npz")
+TABLE_VERSION = 1  # Bump when the table's fields or name cleaning change
+
+# Role categories, by position in the table's "role" column
+ROLE_CATEGORIES = ["Unknown", "GK", "DF", "MD", "FW"]
+ROLE_MAP = {
+    "GK": "GK", "GKP": "GK",
+    "DF": "DF", "DEF": "DF",
+    "MD": "MD", "MID": "MD",
+    "FW": "FW", "FWD": "FW",
+}
+# Also accepted when a role is typed in (e.g. --role Goalkeeper)
+ROLE_NAMES = {"GOALKEEPER": "GK", "DEFENDER": "DF", "MIDFIELDER": "MD", "FORWARD": "FW"}
+
+# Decode and clean name
+def clean_name(name):
+    if not isinstance(name, str):
+        return ""
+    try:
+        name = codecs.decode(name, "unicode_escape")
+    except:
+        pass
+    name = re.sub(r'[\uE000-\uF8FF\u200B-\u200F\u2060-\u206F]', '', name)
+    return name.strip()
+
+def role_category(code):
+    """Role category (GK, DF, MD, FW or Unknown) of a role code such as "GKP" or "md"."""
+    code = str(code or "").strip().upper()
+    return ROLE_MAP.get(code) or ROLE_NAMES.get(code) or "Unknown"
+
+def as_id(value):
+    # Wyscout writes a missing team as null or the string "null"
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+def build_table(players_raw):
+    """Typed columns of players.json; a player's dense index is its row."""
+    n = len(players_raw)
+    wy_id = np.empty(n, dtype=np.int64)
+    team_id = np.zeros(n, dtype=np.int64)
+    role = np.zeros(n, dtype=np.int8)
+    nationality = np.zeros(n, dtype=np.int16)
+    names = []
+    nationalities = {"": 0}
+    for i, p in enumerate(players_raw):
+        wy_id[i] = p["wyId"]
+        names.append(clean_name(p.get("shortName") or f"{p.get('firstName', '')} {p.get('lastName', '')}".strip()))
+        role_obj = p.get("role") or {}
+        role[i] = ROLE_CATEGORIES.index(role_category(role_obj.get("code3") or role_obj.get("code2")))
+        team_id[i] = as_id(p.get("currentTeamId"))
+        country = clean_name((p.get("passportArea") or {}).get("name", ""))
+        nationality[i] = nationalities.setdefault(country, len(nationalities))
+
+    order = np.argsort(wy_id, kind="stable")
+    return {
+        "wy_id": wy_id,
+        "name": np.array(names, dtype=str),
+        "role": role,
+        "team_id": team_id,
+        "nationality": nationality,
+        "nationalities": np.array(list(nationalities), dtype=str),
+        "sorted_ids": wy_id[order],
+        "sorted_rows": order.astype(np.int32),
+    }
+
+def signature(path):
+    return json.dumps([TABLE_VERSION, os.path.abspath(path), archives.signature(path)])
+
+_loaded = {}
+
+def load_players(players_file=PLAYERS_FILE, cache_file=TABLE_CACHE_FILE):
+    """Compiled players table for players_file, built once per players.json version.
+
+    The columns are saved as an uncompressed npz next to other caches, so
+    later runs load them in milliseconds, and memoized per process.
+    """
+    sig = signature(players_file)
+    cached = _loaded.get(players_file)
+    if cached and cached[0] == sig:
+        return cached[1]
+
+    table = None
+    if os.path.exists(cache_file):
+        try:
+            with np.load(cache_file) as stored:
+                if str(stored["signature"]) == sig:
+                    table = {name: stored[name] for name in stored.files if name != "signature"}
+        except Exception:
+            table = None
+
+    if table is None:
+        with archives.open_text(players_file) as f:
+            table = build_table(json.load(f))
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_file = cache_file + ".tmp.npz"
+        np.savez(tmp_file, signature=sig, **table)
+        os.replace(tmp_file, cache_file)
+
+    _loaded[players_file] = (sig, table)
+    return table
+
+def dense_index(table, wy_ids):
+    """Dense index (table row) of each wyId, -1 for players not in the table."""
+    wy_ids = np.asarray(wy_ids, dtype=np.int64)
+    sorted_ids = table["sorted_ids"]
+    if not len(sorted_ids):
+        return np.full(wy_ids.shape, -1, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(sorted_ids, wy_ids), len(sorted_ids) - 1)
+    return np.where(sorted_ids[pos] == wy_ids, table["sorted_rows"][pos], -1)
+
+def name_map(table):
+    """playerId -> cleaned name, in players.json order."""
+    return dict(zip(table["wy_id"].tolist(), table["name"].tolist()))
+
+def role_map(table):
+    """playerId -> role category (GK, DF, MD, FW or Unknown)."""
+    categories = np.array(ROLE_CATEGORIES)
+    return dict(zip(table["wy_id"].tolist(), categories[table["role"]].tolist()))
@@ -0,0 +1,70 @@
+import argparse
+import event_scan
+import instrumentation
+import scan_state
+from player_positions import PositionsAccumulator
+from assign_primary_position import assign_primary_positions
+from passing_rating import PassingAccumulator
+from long_passing_rating import LongPassingAccumulator
+from crossing_rating import CrossingAccumulator
+from tackling_rating import TacklingAccumulator
+from creativity_rating import CreativityAccumulator
+from pace_rating import PaceAccumulator
+
+# Every rating module fed by the shared scan, in output order
+RATING_ACCUMULATORS = [
+    PassingAccumulator,
+    LongPassingAccumulator,
+    CrossingAccumulator,
+    TacklingAccumulator,
+    CreativityAccumulator,
+    PaceAccumulator,
+]
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh positions and every rating in one pass.")
+    parser.add_argument("--workers", type=int, default=event_scan.SCAN_WORKERS,
+                        help="processes scanning event files in parallel (default: one per CPU)")
+    parser.add_argument("--refresh", action="store_true",
+                        help="only count matches not seen by the previous run, then re-rate everyone")
+    parser.add_argument("--no-positions-csv", action="store_true",
+                        help="skip writing the per-role positions/player_positions.csv")
+    args = parser.parse_args()
+
+    print("Loading players...")
+    with instrumentation.stage("load_players"):
+        players = event_scan.load_players()
+
+    positions = PositionsAccumulator(players)
+    ratings = [cls(players) for cls in RATING_ACCUMULATORS]
+
+    # One pass over the events for positions and every rating module,
+    # split across worker processes by event file. The counts are saved so
+    # that a --refresh run only has to scan newly added matches.
+    print("Processing event files...")
+    accumulators, total_events = scan_state.refresh(
+        [positions] + ratings, workers=args.workers, full=not args.refresh
+    )
+    positions, ratings = accumulators[0], accumulators[1:]
+    print(f"Processed {total_events} events.")
+
+    # Ratings only use primary positions for display, so they can be
+    # assigned after the scan and before the rating files are written.
+    # Primary positions come straight from the in-memory role counts.
+    if not args.no_positions_csv:
+        with instrumentation.stage("write_positions"):
+            positions.write()
+    with instrumentation.stage("assign_primary_positions"):
+        assign_primary_positions(players, positions=positions)
+
+    print("Loading primary positions...")
+    primary_position = event_scan.load_primary_positions()
+
+    for acc in ratings:
+        with instrumentation.stage(f"write_{type(acc).__module__}"):
+            acc.write(primary_position)
+
+    print("Done.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os
+import pickle
+import event_scan
+import event_store
+
+# === SETTINGS ===
+CACHE_DIR = os.path.join(event_scan.DATA_DIR, "cache")
+STATE_FILE = os.path.join(CACHE_DIR, "ratings_state.pickle")
+STATE_VERSION = 4  # Bump when an accumulator changes what it counts
+
+class SeenMatches:
+    """Accumulator recording the matchId of every event it is fed."""
+
+    def __init__(self):
+        self.matches = set()
+
+    def add(self, e):
+        self.matches.add(e.get("matchId"))
+
+    def add_columns(self, chunk):
+        has_match = chunk.has_match
+        self.matches.update(chunk.match_id[has_match].tolist())
+        if not has_match.all():
+            self.matches.add(None)
+
+    def merge(self, other):
+        self.matches |= other.matches
+
+def state_key(accumulators, players_file):
+    # Saved counts are only valid for the same accumulators and players.json
+    sig = event_store.file_signature(players_file)
+    return (
+        STATE_VERSION,
+        [f"{type(acc).__module__}.{type(acc).__qualname__}" for acc in accumulators],
+        (sig["size"], sig["mtime_ns"]),
+    )
+
+def load_state(key, state_file=STATE_FILE):
+    if not os.path.exists(state_file):
+        return None
+    try:
+        with open(state_file, "rb") as f:
+            stored_key, state = pickle.load(f)
+    except Exception:
+        return None
+    return state if stored_key == key else None
+
+def save_state(key, state, state_file=STATE_FILE):
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    tmp_file = state_file + ".tmp"
+    with open(tmp_file, "wb") as f:
+        pickle.dump((key, state), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, state_file)
+
+def refresh(accumulators, players_file=event_scan.PLAYERS_FILE, events_dir=event_scan.EVENTS_DIR,
+            store_dir=event_scan.EVENT_STORE_DIR, workers=None, full=False, state_file=STATE_FILE,
+            count_keys=None):
+    """Bring the counts of all accumulators up to date with the event files.
+
+    The accumulators' per-player and per-match counts are saved together
+    with the matchIds and file versions already ingested. Later calls skip
+    unchanged files and matches seen before, scan only new matches into
+    the given (empty) accumulators and merge them onto the saved counts.
+    A match is taken to arrive complete. With full=True, or when the saved
+    state does not fit, everything is scanned again.
+
+    count_keys, one per accumulator, name what its counts depend on (such
+    as a hash of its code). An accumulator whose key differs from the saved
+    one is counted again from scratch while the others keep their counts.
+
+    Returns (accumulators holding every match, number of events scanned).
+    """
+    key = state_key(accumulators, players_file)
+    event_files = event_scan.list_event_files(events_dir)
+    signatures = [event_store.file_signature(p) for p in event_files]
+    units = event_scan.list_scan_units(events_dir, store_dir)
+
+    state = None if full else load_state(key, state_file)
+    names = {sig["name"] for sig in signatures}
+    if state is not None and not {sig["name"] for sig in state["signatures"]} <= names:
+        # A file that was ingested has gone away, so its counts cannot be taken back out
+        state = None
+
+    seen = SeenMatches()
+    if state is None:
+        print("Scanning all matches...")
+        n_events = event_scan.scan_units(accumulators + [seen], units, workers)
+        state = {"accumulators": accumulators, "matches": seen.matches}
+    else:
+        n_events = 0
+        saved_keys = state.get("count_keys") or [None] * len(accumulators)
+        recount = [] if count_keys is None else [i for i, k in enumerate(count_keys) if k != saved_keys[i]]
+        if recount:
+            # Counted differently now: scan every match again, for these accumulators only
+            print(f"Recounting {', '.join(type(accumulators[i]).__name__ for i in recount)} over all matches...")
+            n_events += event_scan.scan_units([accumulators[i] for i in recount], units, workers)
+            for i in recount:
+                state["accumulators"][i] = accumulators[i]
+
+        new_units = [u for u, sig in zip(units, signatures) if sig not in state["signatures"]]
+        keep = [i for i in range(len(accumulators)) if i not in recount]
+        print(f"Refreshing from {len(new_units)} changed event files ({len(state['matches'])} matches already counted)...")
+        # Recounted accumulators already hold the new matches; the seen set still has to learn them
+        n_events += event_scan.scan_units([accumulators[i] for i in keep] + [seen], new_units, workers,
+                                          skip_matches=state["matches"])
+        for i in keep:
+            state["accumulators"][i].merge(accumulators[i])
+        state["matches"] |= seen.matches
+        print(f"Added {len(seen.matches)} new matches.")
+
+    state["signatures"] = signatures
+    state["count_keys"] = count_keys
+    save_state(key, state, state_file)
+    return state["accumulators"], n_events
@@ -0,0 +1,300 @@
+import os
+import csv
+import json
+import hashlib
+import argparse
+import numpy as np
+import archives
+import event_reader
+import instrumentation
+import player_names
+import player_table
+import wyscout_tags
+
+# === SETTINGS ===
+DATA_DIR = "./"
+PLAYERS_FILE = os.path.join(DATA_DIR, "data/players.json")
+EVENTS_DIR = os.path.join(DATA_DIR, "events")
+OUTPUT_DIR = os.path.join(DATA_DIR, "shot_placement")
+CACHE_FILE = os.path.join(DATA_DIR, "cache/shot_placement.npz")
+TABLE_VERSION = 1  # Bump when the shot table changes, to rebuild the cache
+
+# Sub-events collected, and the kind each one is filed under
+SHOT_KINDS = {"Shot": "shot", "Penalty": "penalty"}
+MIN_SHOTS = 10  # Fewer shots than this and a player is left out of --top rankings
+
+# Goal size in metres, for drawing goal maps
+GOAL_WIDTH = 7.32
+GOAL_HEIGHT = 2.44
+DPI = 300
+
+# Tag-to-location mapping
+goal_zones = {
+    "1201": (0.5, 0.1), "1202": (0.9, 0.1), "1203": (0.5, 0.5),
+    "1204": (0.3, 0.5), "1205": (0.1, 0.1), "1206": (0.7, 0.5),
+    "1207": (0.5, 0.9), "1208": (0.1, 0.9), "1209": (0.9, 0.9),
+    "1210": (1.0, 0.1), "1211": (0.2, 0.5), "1212": (0.0, 0.1),
+    "1213": (0.8, 0.5), "1214": (0.5, 1.0), "1215": (0.1, 1.0),
+    "1216": (0.9, 1.0), "1217": (1.0, 0.2), "1218": (0.2, 0.6),
+    "1219": (0.0, 0.2), "1220": (0.8, 0.6), "1221": (0.5, 0.8),
+    "1222": (0.1, 0.8), "1223": (0.9, 0.8),
+}
+
+# Human-readable tag descriptions
+tag_descriptions = {str(tag_id): wyscout_tags.TAG_NAMES[int(tag_id)] for tag_id in goal_zones}
+
+goal_tags = {str(i) for i in range(1201, 1210)}
+miss_tags = set(goal_zones.keys()) - goal_tags
+
+# Histogram columns: one per zone tag, in tag order
+ZONE_TAGS = sorted(goal_zones)
+ZONE_IS_GOAL = np.array([tag in goal_tags for tag in ZONE_TAGS])
+
+def competition_name(file_name):
+    """'events_European_Championship.json' -> 'European Championship'."""
+    return file_name[len("events_"):-len(".json")].replace("_", " ")
+
+def build_shot_table(columns, meta):
+    """Every collected shot with a goal-zone tag, from one pass over the store columns.
+
+    Returns a dict of equal-length arrays: player_id, team_id, competition
+    (index into competitions), kind (index into kinds) and zone (index into
+    ZONE_TAGS). Shots without a zone tag are left out; a shot with several
+    is filed under the last of them in tag order.
+    """
+    kinds = sorted(set(SHOT_KINDS.values()))
+    sub_event_kind = np.full(max(len(meta["sub_event_names"]), 1), -1, dtype=np.int8)
+    for code, name in enumerate(meta["sub_event_names"]):
+        if name in SHOT_KINDS:
+            sub_event_kind[code] = kinds.index(SHOT_KINDS[name])
+
+    rows = np.flatnonzero(sub_event_kind[columns["sub_event_name"]] >= 0)
+    masks = columns["tag_mask"][rows]
+    zone = np.full(len(rows), -1, dtype=np.int8)
+    for k, tag in enumerate(ZONE_TAGS):
+        zone[wyscout_tags.has_tag(masks, int(tag))] = k
+    rows, zone = rows[zone >= 0], zone[zone >= 0]
+
+    starts = np.array([f["start"] for f in meta["files"]], dtype=np.int64)
+    return {
+        "player_id": columns["player_id"][rows],
+        "team_id": columns["team_id"][rows],
+        "competition": (np.searchsorted(starts, rows, side="right") - 1).astype(np.int16),
+        "kind": sub_event_kind[columns["sub_event_name"][rows]],
+        "zone": zone,
+        "competitions": np.array([competition_name(f["name"]) for f in meta["files"]]),
+        "kinds": np.array(kinds),
+    }
+
+def table_key(meta):
+    settings = [TABLE_VERSION, SHOT_KINDS, ZONE_TAGS, meta["files"]]
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+def load_shot_table(events_dir=EVENTS_DIR, cache_file=CACHE_FILE):
+    """Shot table of the current event files, cached until they change."""
+    columns, meta = event_reader.open_indexed_store(events_dir)
+    key = table_key(meta)
+    if os.path.exists(cache_file):
+        try:
+            with np.load(cache_file) as cached:
+                if str(cached["key"]) == key:
+                    return {name: cached[name] for name in cached.files if name != "key"}
+        except Exception:
+            pass
+
+    table = build_shot_table(columns, meta)
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = cache_file + ".tmp.npz"
+    np.savez(tmp_file, key=key, **table)
+    os.replace(tmp_file, cache_file)
+    return table
+
+def select_shots(table, kind=None, competition=None):
+    """Boolean row mask of the table's shots of one kind and/or competition."""
+    keep = np.ones(len(table["zone"]), dtype=bool)
+    if kind is not None:
+        keep &= table["kind"] == list(table["kinds"]).index(kind)
+    if competition is not None:
+        keep &= table["competition"] == list(table["competitions"]).index(competition)
+    return keep
+
+def placement_histograms(keys, zones):
+    """Zone counts per key: (sorted unique keys, keys x zones count matrix)."""
+    ids, group = np.unique(keys, return_inverse=True)
+    counts = np.bincount(group * len(ZONE_TAGS) + zones, minlength=len(ids) * len(ZONE_TAGS))
+    return ids, counts.reshape(len(ids), len(ZONE_TAGS))
+
+def group_histograms(table, by, keep):
+    """(ids, counts) per player, team or competition for the kept shots."""
+    column = {"player": "player_id", "team": "team_id", "competition": "competition"}[by]
+    if by == "player":
+        keep = keep & (table["player_id"] != 0)  # playerId 0: no player attached
+    return placement_histograms(table[column][keep], table["zone"][keep])
+
+def group_names(table, by, ids):
+    if by == "player":
+        names = player_names.load_index(PLAYERS_FILE)["names"]
+        return [names.get(int(i), str(i)) for i in ids]
+    if by == "team":
+        with archives.open_text(event_reader.TEAMS_FILE) as f:
+            teams = {t["wyId"]: player_table.clean_name(t.get("name", "")) for t in json.load(f)}
+        return [teams.get(int(i), str(i)) for i in ids]
+    return [str(table["competitions"][i]) for i in ids]
+
+def write_histograms(table, output_dir=OUTPUT_DIR):
+    """One CSV per group (player, team, competition) and kind of shot."""
+    os.makedirs(output_dir, exist_ok=True)
+    header = ["id", "name", "shots", "on_target"] + [tag_descriptions[tag] for tag in ZONE_TAGS]
+    for kind in table["kinds"]:
+        keep = select_shots(table, kind=str(kind))
+        for by in ("player", "team", "competition"):
+            ids, counts = group_histograms(table, by, keep)
+            names = group_names(table, by, ids)
+            # Competitions have no wyId of their own, so they are keyed by name
+            keys = names if by == "competition" else ids.tolist()
+            output_file = os.path.join(output_dir, f"{by}_{kind}_placement.csv")
+            with open(output_file, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                for key, name, row in zip(keys, names, counts.tolist()):
+                    writer.writerow([key, name, sum(row), int(np.dot(row, ZONE_IS_GOAL))] + row)
+            print(f"Wrote {len(ids)} {by} histograms to {output_file}")
+
+def match_zones(query):
+    """Histogram columns whose tag id or description matches query, e.g. '1205' or 'low left'."""
+    q = " ".join(query.lower().split())
+    return [k for k, tag in enumerate(ZONE_TAGS) if q == tag or q in tag_descriptions[tag].lower()]
+
+def top_shooters(table, zone_query, by="player", kind=None, competition=None, min_shots=MIN_SHOTS, limit=10):
+    """Groups with the highest share of their shots in the matching zones.
+
+    Returns [(id, name, zone shots, all shots, share)], best first; ties
+    go to the group with more shots in the zones.
+    """
+    zones = match_zones(zone_query)
+    if not zones:
+        return []
+    ids, counts = group_histograms(table, by, select_shots(table, kind, competition))
+    totals = counts.sum(axis=1)
+    hits = counts[:, zones].sum(axis=1)
+    eligible = np.flatnonzero(totals >= min_shots)
+    share = hits[eligible] / totals[eligible]
+    order = eligible[np.lexsort((-hits[eligible], -share))][:limit]
+    names = group_names(table, by, ids[order])
+    return [(int(ids[k]), name, int(hits[k]), int(totals[k]), hits[k] / totals[k]) for k, name in zip(order, names)]
+
+# === GOAL MAPS ===
+# matplotlib and player_event_plotter are imported where maps are drawn, so
+# building the table and answering queries does not pay for loading them.
+
+def render_goal_map(title, zone_counts, save_path):
+    """Draw one goal map: a dot per zone, sized by shots, green on target and red off it."""
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(10, 4))
+    ax.add_patch(plt.Rectangle((0, 0), GOAL_WIDTH, GOAL_HEIGHT, edgecolor='black', facecolor='none', lw=2))
+    most = max(zone_counts) or 1
+    for tag, n in zip(ZONE_TAGS, zone_counts):
+        if n == 0:
+            continue
+        x, y = goal_zones[tag]
+        color = "green" if tag in goal_tags else "red"
+        ax.plot(x * GOAL_WIDTH, y * GOAL_HEIGHT, 'o', color=color, alpha=0.7, markersize=8 + 22 * (n / most) ** 0.5)
+        ax.annotate(str(n), (x * GOAL_WIDTH, y * GOAL_HEIGHT), ha='center', va='center', fontsize=8, color='white')
+    ax.set_xlim(-0.5, GOAL_WIDTH + 0.5)
+    ax.set_ylim(-0.1, GOAL_HEIGHT + 0.1)
+    ax.set_aspect('equal')
+    ax.set_xticks([])
+    ax.set_yticks([])
+    ax.set_title(title)
+    fig.savefig(save_path, dpi=DPI, bbox_inches='tight')
+    plt.close(fig)
+    return f"Saved {save_path}"
+
+def goal_map_key(title, zone_counts):
+    settings = [TABLE_VERSION, title, zone_counts, DPI, GOAL_WIDTH, GOAL_HEIGHT]
+    return hashlib.sha256(json.dumps(settings).encode("utf-8")).hexdigest()
+
+def goal_map_tasks(short_name, kind, zone_counts, stem=None):
+    import player_event_plotter
+    out_dir = player_event_plotter.player_out_dir(stem or short_name)
+    title = f"{kind.capitalize()} Map: {short_name} (Green = On Target, Red = Off Target)"
+    save_path = os.path.join(out_dir, f"{kind.capitalize()}_goal_map.png")
+    return [(render_goal_map, (title, zone_counts, save_path), save_path, goal_map_key(title, zone_counts))]
+
+def plot_goal_maps(table, short_names=None, team=None, role=None, competition=None, workers=None, force=False):
+    """Goal maps of every selected player with shots, one per kind of shot.
+
+    Players are selected as in player_event_plotter's batch mode and the
+    maps are rendered through its cached, parallel render_figures.
+    """
+    import player_event_plotter
+    players = player_table.load_players(PLAYERS_FILE)
+    columns, _ = event_reader.open_indexed_store(EVENTS_DIR)
+
+    team_id = None
+    if team is not None:
+        team_id = event_reader.find_team_id(team)
+        if team_id is None:
+            print(f"Team '{team}' not found in {event_reader.TEAMS_FILE}")
+            return
+
+    index = player_names.load_index(PLAYERS_FILE)
+    selected = event_reader.select_players(players, columns, index, short_names, team_id, role)
+
+    tasks = []
+    for kind in table["kinds"]:
+        ids, counts = group_histograms(table, "player", select_shots(table, str(kind), competition))
+        for player_id, zone_counts in zip(ids.tolist(), counts.tolist()):
+            if player_id in selected:
+                tasks += goal_map_tasks(selected[player_id], str(kind), zone_counts, player_names.file_stem(index, player_id))
+    if not tasks:
+        print("No selected player has shots with a goal zone.")
+        return
+    player_event_plotter.render_figures(tasks, workers, force)
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate shot and penalty placement over the 23 goal zones.")
+    parser.add_argument('--top', metavar='ZONE', help="rank by share of shots in a zone, by tag id or description (e.g. 'low left')")
+    parser.add_argument('--by', choices=['player', 'team', 'competition'], default='player', help="group for --top (default: player)")
+    parser.add_argument('--kind', choices=sorted(set(SHOT_KINDS.values())), help="only this kind of shot")
+    parser.add_argument('--competition', help="only shots in this competition (e.g. England)")
+    parser.add_argument('--min-shots', type=int, default=MIN_SHOTS, help=f"smallest sample ranked by --top (default: {MIN_SHOTS})")
+    parser.add_argument('--limit', type=int, default=10, help="rows listed by --top")
+    parser.add_argument('--maps', action='store_true', help="draw goal maps for the selected players")
+    parser.add_argument('--names', nargs='+', help="with --maps: player short names")
+    parser.add_argument('--team', help="with --maps: every player of this team (name or wyId)")
+    parser.add_argument('--role', help="with --maps: only players with this role (e.g. GK, DF, MD, FW)")
+    parser.add_argument('--workers', type=int, help="with --maps: figures rendered in parallel")
+    parser.add_argument('--force', action='store_true', help="with --maps: re-render maps even if unchanged")
+    args = parser.parse_args()
+
+    with instrumentation.stage("shot_table") as stage:
+        table = load_shot_table()
+        stage.count("kept", len(table["zone"]))
+    competition = args.competition
+    if competition is not None:
+        known = {c.lower(): str(c) for c in table["competitions"]}
+        competition = known.get(" ".join(competition.replace("_", " ").split()).lower())
+        if competition is None:
+            print(f"Competition '{args.competition}' not found in {EVENTS_DIR}")
+            return
+
+    if args.top:
+        if not match_zones(args.top):
+            print(f"No goal zone matches '{args.top}'. Zones: {', '.join(tag_descriptions[t] for t in ZONE_TAGS)}")
+            return
+        ranked = top_shooters(table, args.top, args.by, args.kind, competition, args.min_shots, args.limit)
+        if not ranked:
+            print(f"No {args.by} has {args.min_shots} or more shots.")
+        for i, (_, name, hits, total, share) in enumerate(ranked, 1):
+            print(f"{i:>3}. {name:<30} {hits:>4} of {total:>4} ({share:.0%})")
+    elif args.maps:
+        with instrumentation.stage("goal_maps"):
+            plot_goal_maps(table, args.names, args.team, args.role, competition, args.workers, args.force)
+    else:
+        print(f"Collected {len(table['zone'])} shots with a goal zone.")
+        with instrumentation.stage("write_histograms"):
+            write_histograms(table)
+
+if __name__ == "__main__":
+    main()
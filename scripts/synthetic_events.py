@@ -0,0 +1,367 @@
+import os
+import json
+import argparse
+import numpy as np
+import instrumentation
+from concurrent.futures import ProcessPoolExecutor
+
+# === SETTINGS ===
+OUTPUT_DIR = "./synthetic"  # Gets events/events_*.json, data/players.json and data/teams.json
+SEED = 0
+COMPETITIONS = 7
+TEAMS_PER_COMPETITION = 20
+MATCHES_PER_COMPETITION = None  # None: a full double round robin, TEAMS * (TEAMS - 1)
+EVENTS_PER_MATCH = 1700  # Mean; each match varies by about 8%
+GENERATOR_WORKERS = os.cpu_count() or 1  # Competitions written in parallel; the output does not depend on it
+
+COMPETITION_NAMES = ["England", "France", "Germany", "Italy", "Spain", "European_Championship", "World_Cup"]
+SQUAD_ROLES = ["GK"] * 3 + ["DF"] * 9 + ["MD"] * 9 + ["FW"] * 5
+LINEUP_ROLES = {"GK": 1, "DF": 4, "MD": 4, "FW": 2}
+SUBSTITUTES = 3
+ROLE_INFO = {
+    "GK": {"code3": "GKP", "name": "Goalkeeper"},
+    "DF": {"code3": "DEF", "name": "Defender"},
+    "MD": {"code3": "MID", "name": "Midfielder"},
+    "FW": {"code3": "FWD", "name": "Forward"},
+}
+# Where on the pitch each role acts (mean x, stdev x) and how often it is on the ball
+ROLE_X = {"GK": (6, 4), "DF": (32, 14), "MD": (52, 16), "FW": (70, 14)}
+ROLE_ACTIVITY = {"GK": 0.35, "DF": 1.0, "MD": 1.25, "FW": 0.85}
+POSSESSION_CHAIN = 4.5  # Mean events a team has in a row
+HALF_SECONDS = 2820  # Length of a half, stoppage time included
+
+# (eventId, eventName, subEventId, subEventName, relative frequency), after
+# the frequencies in the public Wyscout dataset
+EVENT_TYPES = [
+    (8, "Pass", 85, "Simple pass", 420),
+    (8, "Pass", 83, "High pass", 40),
+    (8, "Pass", 82, "Head pass", 35),
+    (8, "Pass", 80, "Cross", 18),
+    (8, "Pass", 84, "Launch", 14),
+    (8, "Pass", 86, "Smart pass", 8),
+    (8, "Pass", 81, "Hand pass", 5),
+    (1, "Duel", 11, "Ground attacking duel", 75),
+    (1, "Duel", 12, "Ground defending duel", 75),
+    (1, "Duel", 13, "Ground loose ball duel", 40),
+    (1, "Duel", 10, "Air duel", 80),
+    (7, "Others on the ball", 72, "Touch", 45),
+    (7, "Others on the ball", 71, "Clearance", 17),
+    (7, "Others on the ball", 70, "Acceleration", 8),
+    (3, "Free Kick", 31, "Free Kick", 12),
+    (3, "Free Kick", 36, "Throw in", 18),
+    (3, "Free Kick", 34, "Goal kick", 5),
+    (3, "Free Kick", 30, "Corner", 3.5),
+    (3, "Free Kick", 32, "Free kick cross", 1),
+    (3, "Free Kick", 33, "Free kick shot", 0.5),
+    (3, "Free Kick", 35, "Penalty", 0.12),
+    (5, "Interruption", 50, "Ball out of the field", 25),
+    (5, "Interruption", 51, "Whistle", 5),
+    (2, "Foul", 20, "Foul", 12),
+    (2, "Foul", 21, "Hand foul", 0.5),
+    (2, "Foul", 22, "Late card foul", 0.2),
+    (2, "Foul", 23, "Out of game foul", 0.2),
+    (2, "Foul", 24, "Protest", 0.1),
+    (2, "Foul", 25, "Simulation", 0.1),
+    (2, "Foul", 26, "Time lost foul", 0.1),
+    (2, "Foul", 27, "Violent Foul", 0.1),
+    (10, "Shot", 100, "Shot", 9),
+    (9, "Save attempt", 90, "Reflexes", 3),
+    (9, "Save attempt", 91, "Save attempt", 5),
+    (4, "Goalkeeper leaving line", 40, "Goalkeeper leaving line", 2),
+    (6, "Offside", "", "", 1.5),
+]
+# Chance that an event of the sub-event is accurate (1801, else 1802)
+ACCURACY = {
+    "Simple pass": 0.86, "High pass": 0.55, "Head pass": 0.5, "Cross": 0.33, "Launch": 0.45,
+    "Smart pass": 0.55, "Hand pass": 0.95, "Touch": 0.7, "Clearance": 0.6, "Acceleration": 0.8,
+    "Free Kick": 0.85, "Throw in": 0.8, "Goal kick": 0.6, "Corner": 0.3, "Free kick cross": 0.35,
+    "Shot": 0.35, "Free kick shot": 0.3, "Penalty": 0.8, "Reflexes": 0.6, "Save attempt": 0.7,
+    "Goalkeeper leaving line": 0.8,
+}
+SHOTS = {"Shot", "Free kick shot", "Penalty"}
+GOAL_SHARE = {"Shot": 0.3, "Free kick shot": 0.25, "Penalty": 0.9}  # Of shots on target
+ON_TARGET_ZONES = list(range(1201, 1210))
+OFF_TARGET_ZONES = list(range(1210, 1224))
+
+FIRST_NAMES = ["Adam", "Bruno", "Carlos", "Dani", "Emil", "Felipe", "Gabriel", "Hugo", "Ivan", "Jonas",
+               "Karim", "Luca", "Marco", "Nico", "Omar", "Pablo", "Rafael", "Sergio", "Tomas", "Victor"]
+SURNAME_PARTS = ["al", "ber", "cas", "dor", "el", "fer", "gan", "har", "ino", "kov", "lan", "mar",
+                 "nez", "ols", "par", "ros", "san", "tor", "vic", "zen"]
+# Escaped the way the real players.json writes them, to exercise name decoding
+ACCENTED = ["\\u00e9", "\\u00f3", "\\u00e1", "\\u00fc", "\\u00f1", "\\u00e7"]
+ACCENTED_SHARE = 0.1
+
+def competition_names(n):
+    return [COMPETITION_NAMES[i] if i < len(COMPETITION_NAMES) else f"League_{i + 1}" for i in range(n)]
+
+def make_name(rng):
+    surname = "".join(rng.choice(SURNAME_PARTS, size=rng.integers(2, 4)))
+    if rng.random() < ACCENTED_SHARE:
+        k = int(rng.integers(1, len(surname)))
+        surname = surname[:k] + str(rng.choice(ACCENTED)) + surname[k + 1:]
+    return str(rng.choice(FIRST_NAMES)), surname.capitalize()
+
+def make_teams_and_players(n_competitions, n_teams, seed=SEED):
+    """teams.json and players.json entries; squads list each team's players."""
+    rng = np.random.default_rng([seed, 0])
+    teams, players, squads = [], [], {}
+    player_id = 1000
+    for c, competition in enumerate(competition_names(n_competitions)):
+        area = {"name": competition.replace("_", " "), "id": str(c), "alpha3code": "", "alpha2code": ""}
+        for t in range(n_teams):
+            team_id = 1600 + c * n_teams + t
+            name = f"{competition.replace('_', ' ')} Club {t + 1}"
+            teams.append({"city": name, "name": name, "wyId": team_id, "officialName": f"{name} FC",
+                          "area": area, "type": "club"})
+            squads[team_id] = []
+            for role in SQUAD_ROLES:
+                first, last = make_name(rng)
+                player_id += 1
+                birth = f"{int(rng.integers(1982, 2001))}-{int(rng.integers(1, 13)):02d}-{int(rng.integers(1, 29)):02d}"
+                players.append({
+                    "passportArea": area, "weight": int(rng.normal(76, 6)), "firstName": first,
+                    "middleName": "", "lastName": last, "currentTeamId": team_id, "birthDate": birth,
+                    "height": int(rng.normal(182, 7)), "role": {"code2": role, **ROLE_INFO[role]},
+                    "birthArea": area, "wyId": player_id, "foot": str(rng.choice(["right", "left"], p=[0.76, 0.24])),
+                    "shortName": f"{first[0]}. {last}", "currentNationalTeamId": "null",
+                })
+                # Each player keeps a lateral lane across matches
+                squads[team_id].append((player_id, role, float(rng.uniform(10, 90))))
+    return teams, players, squads
+
+def fixtures(team_ids, n_matches):
+    """Double round robin pairings, repeated until n_matches."""
+    pairs = [(h, a) for h in team_ids for a in team_ids if h != a]
+    return [pairs[i % len(pairs)] for i in range(n_matches)]
+
+def pick_lineup(rng, squad):
+    """Starters by LINEUP_ROLES and substitutes from the rest of the squad."""
+    starters = []
+    for role, n in LINEUP_ROLES.items():
+        options = [p for p in squad if p[1] == role]
+        starters += [options[i] for i in rng.choice(len(options), size=n, replace=False)]
+    bench = [p for p in squad if p not in starters and p[1] != "GK"]
+    subs = [bench[i] for i in rng.choice(len(bench), size=SUBSTITUTES, replace=False)]
+    return starters, subs
+
+def on_field(starters, subs, swaps, t):
+    """The eleven on the pitch t seconds into the match."""
+    players = list(starters)
+    for (out_index, sub), minute in zip(zip(swaps, subs), (60, 70, 80)):
+        if t >= minute * 60:
+            players[out_index] = sub
+    return players
+
+def make_tags(rng, sub_event, accurate):
+    tags = [1801 if accurate else 1802]
+    if sub_event in SHOTS:
+        tags = [int(rng.choice([401, 402, 403], p=[0.3, 0.55, 0.15]))] + tags
+        if sub_event == "Shot" and rng.random() < 0.5:
+            tags.insert(0, 201)
+        if accurate:
+            zone = int(rng.choice(ON_TARGET_ZONES))
+            if rng.random() < GOAL_SHARE[sub_event]:
+                tags.insert(0, 101)
+        else:
+            zone = int(rng.choice(OFF_TARGET_ZONES))
+            if sub_event == "Shot" and rng.random() < 0.3:
+                tags.insert(0, 2101)
+        tags.insert(-1, zone)
+    elif sub_event.endswith("pass") or sub_event in ("Cross", "Launch"):
+        if accurate and rng.random() < 0.02:
+            tags.insert(0, 302)
+            if rng.random() < 0.15:
+                tags.insert(0, 301)
+        if sub_event == "Smart pass" and rng.random() < 0.6:
+            tags.insert(0, 901)
+        if sub_event == "Cross":
+            tags.insert(0, int(rng.choice([401, 402])))
+            tags.insert(1, int(rng.choice([801, 802], p=[0.8, 0.2])))
+        if not accurate and rng.random() < 0.03:
+            tags.append(2001)
+    elif "duel" in sub_event.lower():
+        tags.insert(0, 703 if accurate else int(rng.choice([701, 702], p=[0.8, 0.2])))
+        if sub_event == "Ground attacking duel" and rng.random() < 0.3:
+            tags.insert(0, int(rng.choice([503, 504])))
+        if sub_event == "Ground attacking duel" and rng.random() < 0.1:
+            tags.insert(0, 1301)
+        if sub_event == "Ground defending duel" and rng.random() < 0.08:
+            tags.insert(1, 1601)
+        # The player who reads the ball first gets Anticipation, the one beaten to it Anticipated
+        if sub_event in ("Ground defending duel", "Ground loose ball duel") and rng.random() < 0.06:
+            tags.insert(0, 602 if accurate else 601)
+    elif sub_event in ("Touch", "Clearance") and rng.random() < 0.1:
+        tags.insert(0, 1401)
+    elif sub_event in ("Foul", "Late card foul", "Violent Foul", "Hand foul"):
+        card = rng.random()
+        tags = [1702] if card < 0.12 else [1701] if card < 0.125 else []
+    elif sub_event not in ACCURACY:
+        tags = []
+    if rng.random() < 0.01 and sub_event not in ("", "Whistle", "Ball out of the field"):
+        tags.append(1901)
+    return [{"id": t} for t in tags]
+
+def clip(v):
+    return int(min(max(round(v), 0), 100))
+
+def make_positions(rng, sub_event, role, lane, accurate, goal):
+    """Wyscout-style positions: 0-100 from the acting team's point of view."""
+    if sub_event in ("", "Whistle"):
+        return [{"y": clip(rng.uniform(0, 100)), "x": clip(rng.uniform(30, 100))}]
+    if sub_event == "Corner":
+        start = {"y": int(rng.choice([0, 100])), "x": 100}
+    elif sub_event == "Throw in":
+        start = {"y": int(rng.choice([0, 100])), "x": clip(rng.uniform(5, 95))}
+    elif sub_event == "Goal kick":
+        start = {"y": 50, "x": 5}
+    elif sub_event == "Penalty":
+        start = {"y": 50, "x": 89}
+    elif sub_event in SHOTS:
+        start = {"y": clip(rng.normal(50, 12)), "x": clip(rng.normal(84, 7))}
+    elif sub_event == "Cross":
+        start = {"y": clip(rng.choice([rng.uniform(2, 20), rng.uniform(80, 98)])), "x": clip(rng.uniform(70, 97))}
+    else:
+        mean_x, sd_x = ROLE_X[role]
+        start = {"y": clip(rng.normal(lane, 14)), "x": clip(rng.normal(mean_x, sd_x))}
+
+    if sub_event in SHOTS:
+        end = {"y": 100, "x": 100} if goal else {"y": 0, "x": 0}
+    elif sub_event in ("Reflexes", "Save attempt"):
+        end = {"y": 100, "x": 100} if not accurate else {"y": 0, "x": 0}
+    elif sub_event in ("Cross", "Corner", "Free kick cross"):
+        end = {"y": clip(rng.normal(50, 12)), "x": clip(rng.uniform(84, 99))}
+    elif sub_event in ("High pass", "Launch", "Goal kick", "Clearance"):
+        end = {"y": clip(start["y"] + rng.normal(0, 22)), "x": clip(start["x"] + rng.normal(25, 15))}
+    elif "duel" in sub_event.lower() or sub_event == "Ball out of the field":
+        end = {"y": clip(start["y"] + rng.normal(0, 3)), "x": clip(start["x"] + rng.normal(0, 3))}
+    elif sub_event == "Acceleration":
+        end = {"y": clip(start["y"] + rng.normal(0, 10)), "x": clip(start["x"] + rng.normal(15, 7))}
+    else:
+        end = {"y": clip(start["y"] + rng.normal(0, 18)), "x": clip(start["x"] + rng.normal(6, 14))}
+    return [start, end]
+
+def match_events(rng, match_id, home, away, squads, first_event_id):
+    """One match's events in time order, as the Wyscout event dicts."""
+    n = max(int(rng.normal(EVENTS_PER_MATCH, EVENTS_PER_MATCH * 0.08)), 100)
+    weights = np.array([t[4] for t in EVENT_TYPES], dtype=np.float64)
+    kinds = rng.choice(len(EVENT_TYPES), size=n, p=weights / weights.sum())
+
+    # Possession chains of geometric length alternate between the teams
+    chains = rng.geometric(1 / POSSESSION_CHAIN, size=n)
+    team_side = np.repeat((np.arange(n) + rng.integers(2)) % 2, chains)[:n]
+
+    half_split = n // 2
+    seconds = np.concatenate([
+        np.sort(rng.uniform(0, HALF_SECONDS, size=half_split)),
+        np.sort(rng.uniform(0, HALF_SECONDS, size=n - half_split)),
+    ])
+
+    lineups = {}
+    for team_id in (home, away):
+        starters, subs = pick_lineup(rng, squads[team_id])
+        swaps = rng.choice(range(1, 11), size=SUBSTITUTES, replace=False).tolist()
+        lineups[team_id] = (starters, subs, swaps)
+
+    events = []
+    for i in range(n):
+        event_id, event_name, sub_event_id, sub_event, _ = EVENT_TYPES[kinds[i]]
+        team_id = (home, away)[team_side[i]]
+        period = "1H" if i < half_split else "2H"
+        match_second = seconds[i] + (0 if period == "1H" else 45 * 60)
+        starters, subs, swaps = lineups[team_id]
+        players = on_field(starters, subs, swaps, match_second)
+        if event_name in ("Save attempt", "Goalkeeper leaving line") or sub_event == "Goal kick":
+            player_id, role, lane = players[0]
+        elif event_name == "Interruption":
+            player_id, role, lane = 0, "MD", 50.0
+        else:
+            activity = np.array([ROLE_ACTIVITY[p[1]] for p in players])
+            player_id, role, lane = players[rng.choice(len(players), p=activity / activity.sum())]
+
+        accurate = rng.random() < ACCURACY.get(sub_event, 0.5)
+        tags = make_tags(rng, sub_event, accurate)
+        goal = any(t["id"] == 101 for t in tags)
+        events.append({
+            "eventId": event_id,
+            "subEventName": sub_event,
+            "tags": tags,
+            "playerId": player_id,
+            "positions": make_positions(rng, sub_event, role, lane, accurate, goal),
+            "matchId": match_id,
+            "eventName": event_name,
+            "teamId": team_id,
+            "matchPeriod": period,
+            "eventSec": float(seconds[i]),
+            "subEventId": sub_event_id,
+            "id": first_event_id + i,
+        })
+    return events
+
+def write_competition(args):
+    """Write events_<competition>.json. Runs in a worker; returns (file, matches, events, stage records)."""
+    index, competition, team_ids, squads, n_matches, seed, events_dir = args
+    rng = np.random.default_rng([seed, 1, index])
+    path = os.path.join(events_dir, f"events_{competition}.json")
+    # Ids are unique across competitions whatever the other competitions' sizes
+    match_id = 2500000 + index * 100000
+    event_id = (index + 1) * 10 ** 9
+    n_events = 0
+    mark = instrumentation.mark()
+    with instrumentation.stage("write_competition", os.path.basename(path)) as stage, open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for k, (home, away) in enumerate(fixtures(team_ids, n_matches)):
+            events = match_events(rng, match_id + k, home, away, squads, event_id + n_events)
+            f.write(("," if k else "") + ",".join(json.dumps(e) for e in events))
+            n_events += len(events)
+        f.write("]")
+        stage.count("kept", n_events)
+    return path, n_matches, n_events, instrumentation.collect(mark)
+
+def generate(output_dir=OUTPUT_DIR, n_competitions=COMPETITIONS, n_teams=TEAMS_PER_COMPETITION,
+             n_matches=MATCHES_PER_COMPETITION, seed=SEED, workers=None):
+    """Write a synthetic dataset: events/events_*.json plus data/players.json and data/teams.json.
+
+    The same settings and seed always give the same files, however many
+    workers write them.
+    """
+    if n_matches is None:
+        n_matches = n_teams * (n_teams - 1)
+    teams, players, squads = make_teams_and_players(n_competitions, n_teams, seed)
+    os.makedirs(os.path.join(output_dir, "data"), exist_ok=True)
+    events_dir = os.path.join(output_dir, "events")
+    os.makedirs(events_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "data/players.json"), "w", encoding="utf-8") as f:
+        json.dump(players, f)
+    with open(os.path.join(output_dir, "data/teams.json"), "w", encoding="utf-8") as f:
+        json.dump(teams, f)
+    print(f"Wrote {len(players)} players and {len(teams)} teams to {output_dir}/data")
+
+    tasks = []
+    for c, competition in enumerate(competition_names(n_competitions)):
+        team_ids = [t["wyId"] for t in teams[c * n_teams:(c + 1) * n_teams]]
+        tasks.append((c, competition, team_ids, {t: squads[t] for t in team_ids}, n_matches, seed, events_dir))
+
+    workers = min(workers or GENERATOR_WORKERS, len(tasks))
+    if workers <= 1:
+        results = [write_competition(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(write_competition, tasks))
+    for path, matches, n_events, records in results:
+        instrumentation.extend(records)
+        print(f"Wrote {path}: {matches} matches, {n_events} events")
+    print(f"Generated {sum(r[2] for r in results)} events.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Wyscout-style dataset for scale testing.")
+    parser.add_argument("--out", default=OUTPUT_DIR, help=f"output folder (default: {OUTPUT_DIR})")
+    parser.add_argument("--competitions", type=int, default=COMPETITIONS, help=f"event files to write (default: {COMPETITIONS})")
+    parser.add_argument("--teams", type=int, default=TEAMS_PER_COMPETITION, help=f"teams per competition (default: {TEAMS_PER_COMPETITION})")
+    parser.add_argument("--matches", type=int, default=MATCHES_PER_COMPETITION, help="matches per competition (default: a double round robin)")
+    parser.add_argument("--seed", type=int, default=SEED, help=f"random seed (default: {SEED})")
+    parser.add_argument("--workers", type=int, help="competitions written in parallel (default: one per CPU)")
+    args = parser.parse_args()
+    generate(args.out, args.competitions, args.teams, args.matches, args.seed, args.workers)
+
+if __name__ == "__main__":
+    main()
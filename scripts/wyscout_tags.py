@@ -0,0 +1,133 @@
+import numpy as np
+
+# Every Wyscout event tag id, in bit order. Each id maps to one bit of a
+# 64-bit mask, so an event's tags fit in a single integer.
+TAG_NAMES = {
+    101: "Goal",
+    102: "Own goal",
+    201: "Opportunity",
+    301: "Assist",
+    302: "Key pass",
+    401: "Left foot",
+    402: "Right foot",
+    403: "Head/body",
+    501: "Free space right",
+    502: "Free space left",
+    503: "Take on left",
+    504: "Take on right",
+    601: "Anticipated",
+    602: "Anticipation",
+    701: "Lost",
+    702: "Neutral",
+    703: "Won",
+    801: "High",
+    802: "Low",
+    901: "Through",
+    1001: "Fairplay",
+    1101: "Direct",
+    1102: "Indirect",
+    1201: "Goal low center",
+    1202: "Goal low right",
+    1203: "Goal center",
+    1204: "Goal center left",
+    1205: "Goal low left",
+    1206: "Goal center right",
+    1207: "Goal high center",
+    1208: "Goal high left",
+    1209: "Goal high right",
+    1210: "Out low right",
+    1211: "Out center left",
+    1212: "Out low left",
+    1213: "Out center right",
+    1214: "Out high center",
+    1215: "Out high left",
+    1216: "Out high right",
+    1217: "Post low right",
+    1218: "Post center left",
+    1219: "Post low left",
+    1220: "Post center right",
+    1221: "Post high center",
+    1222: "Post high left",
+    1223: "Post high right",
+    1301: "Feint",
+    1302: "Missed ball",
+    1401: "Interception",
+    1501: "Clearance",
+    1601: "Sliding tackle",
+    1701: "Red card",
+    1702: "Yellow card",
+    1703: "Second yellow card",
+    1801: "Accurate",
+    1802: "Not accurate",
+    1901: "Counter attack",
+    2001: "Dangerous ball lost",
+    2101: "Blocked",
+}
+
+TAG_BITS = {tag_id: i for i, tag_id in enumerate(TAG_NAMES)}
+assert len(TAG_BITS) <= 64, "Tag registry no longer fits a 64-bit mask"
+
+# tag id -> mask bit, for vectorized encoding (unknown ids map to 0)
+_BIT_LOOKUP = np.zeros(max(TAG_NAMES) + 1, dtype=np.uint64)
+for _tag_id, _bit in TAG_BITS.items():
+    _BIT_LOOKUP[_tag_id] = np.uint64(1) << np.uint64(_bit)
+
+def bit(tag_id):
+    """Mask with only the bit for tag_id set."""
+    return 1 << TAG_BITS[tag_id]
+
+def mask_of(tag_ids):
+    """Mask with the bits of all given tag ids set."""
+    mask = 0
+    for tag_id in tag_ids:
+        mask |= bit(tag_id)
+    return mask
+
+def encode_tags(tags):
+    """Encode an event's ``tags`` list ([{"id": ...}, ...]) as a mask.
+
+    Tag ids outside the registry are ignored.
+    """
+    mask = 0
+    for t in tags:
+        b = TAG_BITS.get(t.get("id"))
+        if b is not None:
+            mask |= 1 << b
+    return mask
+
+def event_tag_mask(e):
+    """Tag mask of an event, encoded on first use and cached on the event."""
+    mask = e.get("tagMask")
+    if mask is None:
+        mask = e["tagMask"] = encode_tags(e.get("tags", []))
+    return mask
+
+def decode_mask(mask):
+    """Tag ids set in a mask, in registry order."""
+    return [tag_id for tag_id, b in TAG_BITS.items() if mask >> b & 1]
+
+def encode_tag_column(tag_offsets, tag_ids):
+    """Vectorized encoding of CSR tag lists into one uint64 mask per row.
+
+    Row i owns tag_ids[tag_offsets[i]:tag_offsets[i + 1]].
+    """
+    tag_offsets = np.asarray(tag_offsets)
+    tag_ids = np.asarray(tag_ids)
+    n_rows = len(tag_offsets) - 1
+    masks = np.zeros(n_rows, dtype=np.uint64)
+    if len(tag_ids) == 0:
+        return masks
+
+    bits = np.zeros(len(tag_ids), dtype=np.uint64)
+    known = tag_ids < len(_BIT_LOOKUP)
+    bits[known] = _BIT_LOOKUP[tag_ids[known]]
+
+    # reduceat needs non-empty segments, so only reduce rows that have tags
+    starts = tag_offsets[:-1]
+    has_tags = tag_offsets[1:] > starts
+    masks[has_tags] = np.bitwise_or.reduceat(bits, starts[has_tags])
+    return masks
+
+def has_tag(masks, tag_id):
+    """Boolean array: which masks have tag_id set."""
+    return (np.asarray(masks, dtype=np.uint64) & np.uint64(bit(tag_id))) != 0
@@ -0,0 +1,46 @@
+import csv
+import json
+import event_reader
+
+TEAM_ID = 10
+
+def event(event_id, player_id, match_id=100):
+    return {
+        "id": event_id, "eventId": 8, "eventName": "Pass", "subEventId": 85, "subEventName": "Simple pass",
+        "playerId": player_id, "teamId": TEAM_ID, "matchId": match_id, "matchPeriod": "1H", "eventSec": float(event_id),
+        "positions": [{"x": 40, "y": 50}, {"x": 60, "y": 45}], "tags": [{"id": 1801}],
+    }
+
+def player(wy_id, short_name):
+    return {"wyId": wy_id, "shortName": short_name, "firstName": "", "lastName": "",
+            "role": {"code2": "MD", "code3": "MID", "name": "Midfielder"}, "currentTeamId": TEAM_ID,
+            "passportArea": {"name": "Portugal"}}
+
+def write_dataset(root, players, events):
+    (root / "data").mkdir()
+    (root / "events").mkdir()
+    (root / "data" / "players.json").write_text(json.dumps(players), encoding="utf-8")
+    (root / "data" / "teams.json").write_text(json.dumps([{"wyId": TEAM_ID, "name": "Test FC", "officialName": "Test FC"}]), encoding="utf-8")
+    (root / "events" / "events_Test.json").write_text(json.dumps(events), encoding="utf-8")
+
+def read_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+def test_players_sharing_a_short_name_get_separate_files(tmp_path, monkeypatch):
+    write_dataset(
+        tmp_path,
+        [player(1, "J. Silva"), player(2, "J. Silva"), player(3, "A. Costa")],
+        [event(1, 1), event(2, 2), event(3, 2), event(4, 3)],
+    )
+    monkeypatch.chdir(tmp_path)
+
+    event_reader.extract_players_events_csv(team=str(TEAM_ID))
+
+    output = tmp_path / "player_events_output"
+    assert sorted(p.name for p in output.iterdir()) == [
+        "A. Costa_events.csv", "J. Silva_1_events.csv", "J. Silva_2_events.csv",
+    ]
+    assert len(read_rows(output / "J. Silva_1_events.csv")) == 1
+    assert len(read_rows(output / "J. Silva_2_events.csv")) == 2
+    assert len(read_rows(output / "A. Costa_events.csv")) == 1
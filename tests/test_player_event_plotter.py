@@ -0,0 +1,20 @@
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from matplotlib.collections import PolyCollection
+import player_event_plotter
+
+def event(sx, sy, ex, ey):
+    return {"startX": sx, "startY": sy, "endX": ex, "endY": ey, "tags": "1801"}
+
+def arrows_drawn(events):
+    fig, ax = plt.subplots()
+    try:
+        player_event_plotter.plot_directions(ax, events)
+        return sum(len(c.get_paths()) for c in ax.collections if isinstance(c, PolyCollection))
+    finally:
+        plt.close(fig)
+
+def test_zero_length_event_draws_no_arrow():
+    assert arrows_drawn([event(60, 40, 60, 40)]) == 0
+    assert arrows_drawn([event(30, 40, 60, 40), event(60, 40, 60, 40), event(60, 40, 60, 20)]) == 2